@@ -0,0 +1,175 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from bs4 import BeautifulSoup
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from cdw_scraper import CDWScraper
+from database import dispose_all
+from direct_dial_scraper import DirectDialScraper
+from html_cache import HtmlCache
+from html_tags import DIRECT_DIAL_SPECS, CDW_SPECS
+from products import ProductManager, Product, Base
+from spec_fields import SpecFieldMap
+
+def listing_rows(count):
+    today = datetime.now().strftime("%m/%d/%Y")
+    return [dict(sku=f"SKU{index:05d}", stock=index % 40, price=999.99 + index, msrp=1199.99 + index, rebate=0,
+                 sale=0, brand="Lenovo", type="notebook", url=f"https://www.directdial.com/ca/item/{index}",
+                 updated=today, discovered=today) for index in range(count)]
+
+def legacy_add(db_url, row):
+    # The listing path before bulk upserts: one engine, one lookup and one commit per SKU
+    engine = create_engine(db_url, echo=False)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        product = session.query(Product).filter_by(sku=row['sku']).first()
+        if product:
+            for key, value in row.items():
+                setattr(product, key, value)
+        else:
+            session.add(Product(**row))
+        session.commit()
+    finally:
+        session.close()
+        engine.dispose()
+
+def bench_upsert(rows=1000):
+    """Times storing one listing of `rows` products row by row and in bulk."""
+    products = listing_rows(rows)
+    with tempfile.TemporaryDirectory() as directory:
+        legacy_url = f"sqlite:///{os.path.join(directory, 'legacy.db')}"
+        bulk_url = f"sqlite:///{os.path.join(directory, 'bulk.db')}"
+        results = {}
+        for label in ("insert", "update"):
+            start = time.perf_counter()
+            for row in products:
+                legacy_add(legacy_url, row)
+            legacy = time.perf_counter() - start
+
+            start = time.perf_counter()
+            product_manager = ProductManager(bulk_url)
+            product_manager.upsert_products(products)
+            bulk = time.perf_counter() - start
+            results[label] = (legacy, bulk)
+            print(f"upsert {rows} rows ({label}): per-row {legacy:.3f}s, bulk {bulk:.3f}s, {legacy / bulk:.0f}x faster")
+        dispose_all()
+    return results
+
+SPEC_ROWS = {
+    "Product Line": "ThinkPad", "Product Series": "T14 Gen 4", "Processor Manufacturer": "Intel",
+    "Processor Type": "Core i7", "Processor Model": "i7-1355U", "Graphics Memory Accessibility": "Shared",
+    "Total Solid State Drive Capacity": "512 GB", "Standard Memory": "16 GB", "System Memory Technology": "DDR5 SDRAM",
+    "Operating System Platform": "Windows 11 Pro", "Wireless LAN": "IEEE 802.11ax", "Screen Size": '14"',
+    "Keyboard Localization": "English (US) &amp; French", "Limited Warranty": "3 Year",
+}
+
+# Markup found around real spec values: wrappers, comments, entities, inline scripts, block elements inside inline ones
+SPEC_VALUE_WRAPPERS = ("{}", "<b>{}</b>", "{}<!-- sku note -->", " {} &nbsp;",
+                       "{}<script>track('spec');</script><style>.note {{ color: red }}</style>",
+                       "<div>{}</div> more", "<a href='#'>{}</a>")
+
+# How BeautifulSoup found the same rows before the lxml parser, kept as the reference
+SOUP_ROWS = {"directdial": ("tr", {}), "cdw": ("div", {"class_": "panel-row"})}
+
+def spec_pages(count, retailer="directdial", irregular=False):
+    tables = []
+    for index in range(count):
+        values = SPEC_ROWS.items()
+        if irregular:
+            values = [(label, SPEC_VALUE_WRAPPERS[(index + position) % len(SPEC_VALUE_WRAPPERS)].format(value))
+                      for position, (label, value) in enumerate(values)]
+        if retailer == "cdw":
+            rows = "".join(f'<div class="panel-row clearfix"><span class="label">{label}</span>\n<span>{value}</span></div>'
+                           for label, value in values)
+            tables.append(f'<div class="panel"><div class="panel-heading">Model {index}</div>{rows}</div>')
+        else:
+            rows = "".join(f'<tr><td class="label"><b>{label}</b>:</td>\n<td> <span>{value}</span> </td></tr>'
+                           for label, value in values)
+            tables.append(f'<table><tbody><tr><th colspan="2">Model {index}</th></tr>{rows}</tbody></table>')
+    return tables
+
+def soup_rows(field_map, retailer, specs_html):
+    name, attrs = SOUP_ROWS[retailer]
+    data = {}
+    for row in BeautifulSoup(specs_html, 'html.parser').find_all(name, **attrs):
+        columns = row.find_all(field_map.cell_tag)
+        if len(columns) == 2:
+            label = columns[0].get_text(strip=True)
+            if field_map.label_strip:
+                label = label.replace(field_map.label_strip, "")
+            data[label] = columns[1].get_text(strip=True)
+    return data
+
+def bench_spec_parse(pages=500):
+    """Times reading the spec rows of `pages` irregular spec tabs with BeautifulSoup and with lxml."""
+    results = {}
+    for label, config in (("directdial", DIRECT_DIAL_SPECS), ("cdw", CDW_SPECS)):
+        # Only the row pass is timed here, so the extract_* fields are left out
+        field_map = SpecFieldMap(dict(config, fields={}), None)
+        tables = spec_pages(pages, label, irregular=True)
+        start = time.perf_counter()
+        reference = [soup_rows(field_map, label, table) for table in tables]
+        soup = time.perf_counter() - start
+
+        start = time.perf_counter()
+        parsed = [field_map.rows(table) for table in tables]
+        lxml_time = time.perf_counter() - start
+        assert reference == parsed, f"{label}: lxml rows differ from BeautifulSoup"
+        results[label] = (soup, lxml_time)
+        print(f"spec rows {pages} pages ({label}): BeautifulSoup {soup:.3f}s, lxml {lxml_time:.3f}s, {soup / lxml_time:.0f}x faster")
+    return results
+
+def spec_corpus(pages, cache_directory="html_cache"):
+    """Spec pages from the HTML cache as (parse, payload) pairs, topped up with generated ones."""
+    corpus = []
+    if os.path.exists(os.path.join(cache_directory, "index.db")):
+        cache = HtmlCache(cache_directory)
+        for url, specs_html in cache.pages(pages):
+            # The cache doesn't keep the product type; it only decides the form factor rule
+            if "cdw.ca" in url:
+                corpus.append((CDWScraper.parse_spec_payload, (specs_html, "notebook")))
+            elif "directdial.com" in url:
+                corpus.append((DirectDialScraper.parse_spec_payload, (specs_html, "notebook", url)))
+        cache.close()
+    cached = len(corpus)
+    for index, table in enumerate(spec_pages(pages - cached)):
+        corpus.append((DirectDialScraper.parse_spec_payload, (table, "notebook", f"SKU{index:05d}")))
+    return corpus, cached
+
+def parse_spec_item(item):
+    parse, payload = item
+    return parse(payload)
+
+def bench_spec_scaling(pages=5000, cache_directory="html_cache", max_workers=None):
+    """Spec pages parsed per second inline and on process pools of 1, 2, 4... workers."""
+    corpus, cached = spec_corpus(pages, cache_directory)
+    max_workers = max_workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    expected = [parse_spec_item(item) for item in corpus]
+    inline = len(corpus) / (time.perf_counter() - start)
+    print(f"spec parse {len(corpus)} pages ({cached} cached): inline {inline:.0f} pages/s")
+    results = {0: inline}
+    workers = 1
+    while workers <= max_workers:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Start the workers before timing so only the parsing is measured
+            list(executor.map(parse_spec_item, corpus[:workers]))
+            start = time.perf_counter()
+            parsed = list(executor.map(parse_spec_item, corpus, chunksize=max(1, len(corpus) // (workers * 8))))
+            rate = len(corpus) / (time.perf_counter() - start)
+        assert parsed == expected, f"{workers} workers: results differ from the inline parse"
+        results[workers] = rate
+        print(f"spec parse {len(corpus)} pages: {workers} workers {rate:.0f} pages/s, {rate / inline:.1f}x inline")
+        workers *= 2
+    return results
+
+if __name__ == "__main__":
+    bench_upsert()
+    bench_spec_parse()
+    bench_spec_scaling()
@@ -2,210 +2,225 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
-from selenium.webdriver.support.ui import Select
-import undetected_chromedriver as uc
-import time
 from datetime import datetime
-from products import ProductManager, Product
+from products import ProductManager, Product, ScanWorkList
 from bs4 import BeautifulSoup
-from hardware import HardwareManager, CPU, GPU
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
-from selenium_stealth import stealth
-import random
+from database import get_session_factory
+from driver_manager import DriverManager
+from html_cache import HtmlCache
+from pacing import get_pacer
+from pipeline import ScanPipeline, Ready
+from metrics import run_metrics
+from html_tags import CDW_SPECS
+from spec_fields import SpecFieldMap
 import re
 import traceback
 import logging
+from contextlib import contextmanager
 
 class CDWScraper:
-    def __init__(self, url, db):
+    def __init__(self, url, db, pool=None, html_cache=None, lean=False, profile="desktop"):
         self.url = url
+        self.lean = lean
+        self.profile = profile
         self.db = db
+        self.pool = pool
+        self.html_cache = html_cache or HtmlCache()
+        self.pacer = get_pacer("cdw")
+        self.product_manager = ProductManager(db)
 
     def scrape_product_page(self):
         print('Scraping product page')
-        driver = self.setup_driver()
-        self.navigate_to_page(driver)
-        item = '.search-results'
-        self.wait_for_elements(driver, item, timeout=5)
-        products_html = self.extract_html(driver)
-        driver.quit()
+        with DriverManager(self.pool, profile=self.profile, site="cdw", lean=self.lean) as driver:
+            self.navigate_to_page(driver)
+            item = '.search-results'
+            self.wait_for_elements(driver, item, timeout=5)
+            products_html = self.extract_html(driver)
         self.extract_product_info(products_html)
 
-    def setup_driver(self):
-        options = uc.ChromeOptions()
-        options.headless = False
-        driver = uc.Chrome(use_subprocess=True, options=options)
-        stealth(driver,
-            languages=["en-US", "en"],
-            vendor="Google Inc.",
-            platform="Win32",
-            webgl_vendor="Intel Inc.",
-            renderer="Intel Iris OpenGL Engine",
-            fix_hairline=True)
-        return driver
-    
     def navigate_to_page(self, driver):
-        driver.get(self.url)
+        if not self.pacer.get(driver, self.url):
+            logging.warning(f"Challenge page at {self.url}")
 
     def extract_html(self, driver):
         self.wait_for_elements(driver, '.search-results', timeout=5)
-        container = driver.find_element(By.CLASS_NAME, "search-results")
-        return container.get_attribute("innerHTML")
+        with run_metrics.timer("extract", "cdw"):
+            container = driver.find_element(By.CLASS_NAME, "search-results")
+            return container.get_attribute("innerHTML")
     
     def extract_product_info(self, products_html):
         soup = BeautifulSoup(products_html, 'lxml')
         products = soup.find_all('div', class_='search-result')
-        for product in products:
-            sku = self.extract_sku(product)
-            price = self.extract_price(product)
-            url = self.extract_url(product)
-            updated = datetime.now().strftime("%m/%d/%Y")
-            discovered = datetime.now().strftime("%m/%d/%Y")
-            product_manager = ProductManager(self.db)
-            if "notebook" in self.url or "laptop" in self.url:
-                type = "notebook"
-            elif "desktop" in self.url:
-                type = "desktop"
-            elif 'workstation' in self.url:
-                type = "workstation"
-            else:
-                type = "N/A"
-            product_manager.add_cdw_product(sku, price, type, url, updated, discovered)
+        updated = datetime.now().strftime("%m/%d/%Y")
+        discovered = datetime.now().strftime("%m/%d/%Y")
+        if "notebook" in self.url or "laptop" in self.url:
+            type = "notebook"
+        elif "desktop" in self.url:
+            type = "desktop"
+        elif 'workstation' in self.url:
+            type = "workstation"
+        else:
+            type = "N/A"
+        rows = [{
+            'sku': self.extract_sku(product),
+            'price': self.extract_price(product),
+            'type': type,
+            'url': self.extract_url(product),
+            'updated': updated,
+            'discovered': discovered,
+        } for product in products]
+        with run_metrics.timer("commit", "cdw", items=len(rows)):
+            self.product_manager.upsert_products(rows)
 
     def wait_for_elements(self, driver, item_class, timeout):
         wait = WebDriverWait(driver, timeout)
-        wait.until(lambda driver: driver.execute_script("return document.readyState") == "complete")
-        wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, item_class)))
-        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, item_class)))
+        with run_metrics.timer("wait", "cdw"):
+            wait.until(lambda driver: driver.execute_script("return document.readyState") == "complete")
+            wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, item_class)))
+            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, item_class)))
 
-    def scrape_individual_products(self):
-        engine = create_engine(self.db)
-        session = sessionmaker(bind=engine)()
-        driver = self.setup_driver()
+    def scrape_individual_products(self, workers=1, batch_size=10, parse_workers=2):
+        work_list = ScanWorkList(self.db)
         while True:
-            num_products = session.query(Product).filter_by(scanned=False).count()
+            num_products = work_list.remaining()
             if num_products == 0:
                 print("All products have been scanned.")
                 break
             print(f"Remaining products to scan: {num_products}")
-            products = session.query(Product).filter_by(scanned=False).yield_per(1)
-            for product in products:
-                print(f"Scanning product {product.sku}")
-                self.scan_product(driver, product, session)
-        driver.quit()
-        session.close()
+            # Each fetch thread drives its own browser off the shared queue, so no SKU
+            # is handed to two browsers; parsing and saving happen in later stages
+            pipeline = ScanPipeline("cdw", self.spec_fetcher, self.parse_spec_payload,
+                                    lambda results: self.save_scanned(work_list, results),
+                                    fetchers=workers, parse_workers=parse_workers)
+            pipeline.run(work_list.jobs(batch_size))
+            pipeline.report()
+            if work_list.remaining() == num_products:
+                logging.warning(f"No progress scanning the last {num_products} products, stopping")
+                break
+            work_list.restart()
+        self.html_cache.evict()
         logging.info("Scanning complete")
 
-    def scan_product(self, driver, product, session):
+    def reparse_from_cache(self):
+        """Rebuilds the specs of every product with a cached spec page, without a browser."""
+        Session = get_session_factory(self.db)
+        rows = []
+        with Session() as session:
+            for product in session.query(Product).all():
+                specs_html = self.html_cache.get(product.url)
+                if specs_html is None:
+                    continue
+                specs = self.parse_product_specs(specs_html, product.type)
+                rows.append(self.scanned_row(product.sku, specs))
+        # One bulk update for the whole catalogue instead of a commit per product
+        self.product_manager.update_products(rows)
+        reparsed = len(rows)
+        logging.info(f"Re-parsed {reparsed} products from the HTML cache")
+        return reparsed
+
+    @contextmanager
+    def spec_fetcher(self):
+        with DriverManager(self.pool, profile=self.profile, site="cdw", lean=self.lean) as driver:
+            yield lambda job: self.fetch_specs(driver, job)
+
+    def fetch_specs(self, driver, job):
+        """Loads a product page and returns (specs_html, type) for parse_spec_payload.
+
+        Returns Ready(specs) when there's nothing to parse (None marks the scan
+        failed), or None to leave the product unscanned for the next pass.
+        """
+        sku, url, type = job
+        print(f"Scanning product {sku}")
         try:
-            url = product.url
-            specs = {}
-            driver.get(url)
+            if not self.pacer.get(driver, url):
+                logging.warning(f"Challenge page for product {sku}, leaving it for the next pass")
+                return None
             item_class = ".accordion-wrapper"
             try:
                 self.wait_for_elements(driver, item_class, timeout=5)
             except TimeoutException:
-                logging.info(f"First attempt failed for product {product.sku}, refreshing page...")
-                driver.refresh()
+                logging.info(f"First attempt failed for product {sku}, refreshing page...")
+                self.pacer.refresh(driver)
                 try:
                     self.wait_for_elements(driver, item_class, timeout=5)
                 except TimeoutException:
-                    logging.error(f"Second attempt failed for product {product.sku}, moving on...")
-                    product.scanned = True
-                    product.error = True
-                    session.commit()
-                    return
-            self.extract_product_specs(driver, specs, product.type)
-            self.update_product_in_db(product, specs, session)
-        
+                    logging.error(f"Second attempt failed for product {sku}, moving on...")
+                    return Ready(None)
+            try:
+                with run_metrics.timer("extract", "cdw"):
+                    container = driver.find_element(By.ID, 'TS')
+                    specs_html = container.get_attribute("innerHTML")
+            except NoSuchElementException as e:
+                logging.error(f"Error extracting product specs: {traceback.format_exc()}")
+                specs = {}
+                self.fill_missing_specs(specs)
+                return Ready(specs)
         except (TimeoutException, NoSuchElementException) as e:
-            logging.error(f"Error scanning product {product.sku}: {traceback.format_exc()}")
-            product.scanned = True
-            product.error = True
-            session.commit()
+            logging.error(f"Error scanning product {sku}: {traceback.format_exc()}")
+            return Ready(None)
+        self.html_cache.put(url, specs_html)
+        return specs_html, type
 
-    def extract_product_specs(self, driver, specs, type):
-        """Extracts the product specs using Selenium and BeautifulSoup."""
-        unrefined_data = {}
-        try:
-            container = driver.find_element(By.ID, 'TS')
-            specs_html = container.get_attribute("innerHTML")
-            soup = BeautifulSoup(specs_html, 'html.parser')
-            rows = soup.find_all('div', class_="panel-row")
-            for row in rows:
-                columns = row.find_all('span')
-                if len(columns) == 2:
-                    label = columns[0].get_text(strip=True)
-                    value = columns[1].get_text(strip=True)
-                    unrefined_data[label] = value
-            specs['brand'] = self.extract_brand(unrefined_data)
-            specs['name'] = self.extract_name(unrefined_data, specs['brand'])
-            specs['form_factor'] = self.extract_form_factor(unrefined_data, type)
-            specs['cpu'] = self.extract_cpu(unrefined_data)
-            specs['gpu'] = self.extract_gpu(unrefined_data)
-            specs['storage'] = self.extract_storage(unrefined_data)
-            specs['ram'] = self.extract_ram(unrefined_data)
-            specs['keyboard'] = self.extract_keyboard(unrefined_data)
-            specs['warranty'] = self.extract_warranty(unrefined_data)
-            specs['ddr'] = self.extract_ddr(unrefined_data)
-            specs['os'] = self.extract_os(unrefined_data)
-            specs['ethernet'] = self.extract_ethernet(unrefined_data)
-            specs['wifi'] = self.extract_wifi(unrefined_data)
-            specs['screen_resolution'] = self.extract_screen_res(unrefined_data)          
-            specs['screen_type'] = self.extract_screen_type(unrefined_data)
-            specs['screen_size'] = self.extract_screen_size(unrefined_data)
-            specs['touch'] = self.extract_touch(unrefined_data)
+    @classmethod
+    def parse_spec_payload(cls, payload):
+        return cls.parse_product_specs(*payload)
 
-        except NoSuchElementException as e:
-            logging.error(f"Error extracting product specs: {traceback.format_exc()}")
-            specs['brand'] = specs.get('brand', 'N/A')
-            specs['name'] = specs.get('name', 'N/A')
-            specs['form_factor'] = specs.get('form_factor', 'N/A')
-            specs['cpu'] = specs.get('cpu', 'N/A')
-            specs['gpu'] = specs.get('gpu', 'N/A')
-            specs['storage'] = specs.get('storage', 0)
-            specs['ram'] = specs.get('ram', 0)
-            specs['warranty'] = specs.get('warranty', 'N/A')
-            specs['ddr'] = specs.get('ddr', 'N/A')
-            specs['os'] = specs.get('os', 'N/A')
-            specs['ethernet'] = specs.get('ethernet', 'N/A')
-            specs['wifi'] = specs.get('wifi', 'N/A')
-            specs['keyboard'] = specs.get('keyboard', 'N/A')
-            specs['screen_resolution'] = specs.get('screen_resolution', 'N/A')
-            specs['screen_size'] = specs.get('screen_size', 'N/A')
-            specs['screen_type'] = specs.get('screen_type', 'N/A')
-            specs['touch'] = specs.get('touch', 'N/A')
+    def save_scanned(self, work_list, results):
+        work_list.finish([self.scanned_row(sku, specs) for (sku, url, type), specs in results])
 
-    def update_product_in_db(self, product, specs, session):
-        try:
-            product.brand = specs.get('brand', 'N/A')
-            product.name = specs.get('name', 'N/A')
-            product.form_factor = specs.get('form_factor', 'N/A')
-            product.cpu = specs.get('cpu', 'N/A')
-            product.gpu = specs.get('gpu', 'N/A')
-            product.storage = specs.get('storage', 0)
-            product.ram = specs.get('ram', 0)
-            product.keyboard = specs.get('keyboard', 'N/A')
-            product.warranty = specs.get('warranty', 'N/A')
-            product.ddr = specs.get('ddr', 'N/A')
-            product.os = specs.get('os', 'N/A')
-            product.ethernet = specs.get('ethernet', 'N/A')
-            product.wifi = specs.get('wifi', 'N/A')
-            product.screen_resolution = specs.get('screen_resolution', 'N/A')
-            product.screen_size = specs.get('screen_size', 'N/A')
-            product.screen_type = specs.get('screen_type', 'N/A')
-            product.touch = specs.get('touch', 'N/A')
+    @classmethod
+    def parse_product_specs(cls, specs_html, type):
+        """Turns the innerHTML of a product's spec table into a specs dict."""
+        return SpecFieldMap.for_scraper(cls, CDW_SPECS).parse(specs_html, type=type)
 
-            product.scanned = True
-            if product.cpu == "N/A" or product.gpu == "N/A" or product.storage == 0 or product.ram == 0:
-                product.error = True
-            session.commit()
-        except Exception as e:
-            logging.error(f"Error updating product {product.sku} in the database: {traceback.format_exc()}")
-            session.rollback()  
+    @classmethod
+    def fill_missing_specs(cls, specs):
+        specs['brand'] = specs.get('brand', 'N/A')
+        specs['name'] = specs.get('name', 'N/A')
+        specs['form_factor'] = specs.get('form_factor', 'N/A')
+        specs['cpu'] = specs.get('cpu', 'N/A')
+        specs['gpu'] = specs.get('gpu', 'N/A')
+        specs['storage'] = specs.get('storage', 0)
+        specs['ram'] = specs.get('ram', 0)
+        specs['warranty'] = specs.get('warranty', 'N/A')
+        specs['ddr'] = specs.get('ddr', 'N/A')
+        specs['os'] = specs.get('os', 'N/A')
+        specs['ethernet'] = specs.get('ethernet', 'N/A')
+        specs['wifi'] = specs.get('wifi', 'N/A')
+        specs['keyboard'] = specs.get('keyboard', 'N/A')
+        specs['screen_resolution'] = specs.get('screen_resolution', 'N/A')
+        specs['screen_size'] = specs.get('screen_size', 'N/A')
+        specs['screen_type'] = specs.get('screen_type', 'N/A')
+        specs['touch'] = specs.get('touch', 'N/A')
+
+    @classmethod
+    def scanned_row(cls, sku, specs):
+        """The ScanWorkList row finishing a product's scan. Specs of None mark the scan as failed."""
+        if specs is None:
+            return ScanWorkList.failed(sku)
+        row = {
+            'brand': specs.get('brand', 'N/A'),
+            'name': specs.get('name', 'N/A'),
+            'form_factor': specs.get('form_factor', 'N/A'),
+            'cpu': specs.get('cpu', 'N/A'),
+            'gpu': specs.get('gpu', 'N/A'),
+            'storage': specs.get('storage', 0),
+            'ram': specs.get('ram', 0),
+            'keyboard': specs.get('keyboard', 'N/A'),
+            'warranty': specs.get('warranty', 'N/A'),
+            'ddr': specs.get('ddr', 'N/A'),
+            'os': specs.get('os', 'N/A'),
+            'ethernet': specs.get('ethernet', 'N/A'),
+            'wifi': specs.get('wifi', 'N/A'),
+            'screen_res': specs.get('screen_resolution', 'N/A'),
+            'screen_size': specs.get('screen_size', 'N/A'),
+            'screen_type': specs.get('screen_type', 'N/A'),
+            'touch': specs.get('touch', 'N/A'),
+        }
+        # Set either way, so a re-parse that now finds every field clears an earlier error
+        row['error'] = row['cpu'] == "N/A" or row['gpu'] == "N/A" or row['storage'] == 0 or row['ram'] == 0
+        return ScanWorkList.done(sku, row)
 
-        
     @classmethod
     def extract_sku(cls, product):
         return product.find('span',class_="mfg-code").find(text=True).strip().replace('MFG#: ', '') if product.find('span',class_="mfg-code") else "N/A"
@@ -376,22 +391,6 @@ class CDWScraper:
                 return "N/A"
         except:
             return "N/A"
-        
-    @classmethod
-    def extract_storage(cls, product):
-        storage = product.get('Hard Drive Capacity').upper() if product.get('Hard Drive Capacity') else None
-        if storage:
-            if "GB" in storage:
-                storage = int(storage.replace("GB", "").strip())
-            elif "TB" in storage:
-                storage = int(storage.replace("TB", "").strip())*1000
-            return storage
-        else:
-            return 0
-
-    @classmethod
-    def extract_os(cls, product):
-        return product.get('Operating System') if product.get('Operating System') else "N/A"
 
     @classmethod
     def extract_gpu(cls, product):
@@ -416,21 +415,6 @@ class CDWScraper:
         else:
             return "N/A"
 
-    @classmethod
-    def extract_screen_res(cls, product):
-        screen_resolution_abv = product.get('Display Resolution Abbreviation', None)
-        screen_resolution = product.get('Native Resolution', None)
-        if screen_resolution_abv:
-            return screen_resolution_abv
-        elif screen_resolution:
-            return screen_resolution
-        else:
-            return "N/A"
-    
-    @classmethod
-    def extract_screen_type(cls, product):
-        return product.get('TFT Technology', "N/A")
-    
     @classmethod
     def extract_screen_size(cls, product):
         screen_size = product.get('Screen Size', None)
@@ -439,36 +423,6 @@ class CDWScraper:
         else:
             return "N/A"
 
-    @classmethod
-    def extract_wifi(cls, product):
-        wifi = product.get('Wireless LAN', "N/A").lower()
-        if "802" in wifi or 'yes' in wifi:
-            wifi = "Yes"
-        else:
-            wifi = "No"
-        return wifi
-
-    @classmethod
-    def extract_keyboard(cls, product):
-        return product.get('Keyboard Localization', "N/A")
-
-    @classmethod
-    def extract_touch(cls, product):
-        touch = product.get('Touchscreen', None)
-        if touch:
-            return touch
-        else:
-            return "N/A"
-
-    @classmethod
-    def extract_ethernet(cls, product):
-        ethernet = product.get('Data Link Protocols', "N/A").lower()
-        if "ethernet" in ethernet:
-            ethernet = "Yes"
-        else:
-            ethernet = "No"
-        return ethernet
-    
     @classmethod
     def extract_warranty(cls, product):
         warranty = product.get('Limited Warranty', product.get('Bundled Services', None))
@@ -0,0 +1,57 @@
+import logging
+import threading
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, scoped_session
+
+# Applied to every new SQLite connection. WAL lets scanners keep reading while
+# a writer commits, and NORMAL sync is safe under WAL without an fsync per commit.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 268435456,
+    "cache_size": -65536,
+    "busy_timeout": 30000,
+}
+
+engines = {}
+sessions = {}
+lock = threading.Lock()
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+    finally:
+        cursor.close()
+
+def get_engine(db_url):
+    """Returns the one engine (and connection pool) for a database URL in this process."""
+    with lock:
+        engine = engines.get(db_url)
+        if engine is None:
+            engine = create_engine(db_url, echo=False)
+            if engine.dialect.name == "sqlite":
+                event.listen(engine, "connect", set_sqlite_pragmas)
+            engines[db_url] = engine
+            logging.debug(f"Created engine for {db_url}")
+        return engine
+
+def get_session_factory(db_url):
+    """Returns a thread-local scoped session factory bound to the shared engine."""
+    engine = get_engine(db_url)
+    with lock:
+        factory = sessions.get(db_url)
+        if factory is None:
+            factory = scoped_session(sessionmaker(bind=engine))
+            sessions[db_url] = factory
+        return factory
+
+def dispose_all():
+    with lock:
+        for factory in sessions.values():
+            factory.remove()
+        for engine in engines.values():
+            engine.dispose()
+        sessions.clear()
+        engines.clear()
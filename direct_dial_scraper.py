@@ -1,9 +1,9 @@
 # Standard Library Imports
-import time
 import re
 import traceback
 import logging
 import math
+from contextlib import contextmanager
 from datetime import datetime
 
 # Third-party Libraries
@@ -12,64 +12,133 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait, Select
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
-import undetected_chromedriver as uc
-from selenium_stealth import stealth
+import requests
 
 # Local Modules
-from products import ProductManager, Product
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from products import ProductManager, Product, ScanWorkList, CrawlStateManager
+from database import get_session_factory
 from driver_manager import DriverManager
-from html_tags import DIRECT_DIAL
+from html_cache import HtmlCache
+from html_tags import DIRECT_DIAL, DIRECT_DIAL_SPECS
+from spec_fields import SpecFieldMap
+from direct_dial_search import DirectDialSearch
+from pacing import get_pacer
+from pipeline import ScanPipeline, Ready
+from metrics import run_metrics
 
 class DirectDialScraper:
-    def __init__(self, url):
+    def __init__(self, url, pool=None, html_cache=None, lean=False, profile="desktop", fresh_hours=12):
         self.url = url
+        self.lean = lean
+        self.profile = profile
         self.db = 'sqlite:///direct_dial_ca.db'
-
-    def scrape_product_page(self):
+        self.pool = pool
+        self.html_cache = html_cache or HtmlCache()
+        self.pacer = get_pacer("directdial")
+        self.product_manager = ProductManager(self.db)
+        # Listing pages fetched within this many hours are not fetched again
+        self.fresh_hours = fresh_hours
+        self.crawl_state = CrawlStateManager(self.db)
+
+    def scrape_product_page(self, use_http=False):
         logging.info('Scraping product page')
-        with DriverManager() as driver:
+        # Opt-in until the search hit fields (html_tags.DIRECT_DIAL_SEARCH) are confirmed on the live index
+        if use_http:
+            try:
+                products = DirectDialSearch(self.url).fetch_products()
+                if products:
+                    logging.info(f"Listed {len(products)} products through the search API")
+                    self.save_product_info(products)
+                    return
+                logging.warning("Search API returned no products, falling back to the browser")
+            except (requests.RequestException, ValueError) as e:
+                logging.warning(f"Search API listing failed, falling back to the browser: {e}")
+        with DriverManager(self.pool, profile=self.profile, site="directdial", lean=self.lean) as driver:
+            # Each page is parsed and saved before the next one loads, so only
+            # one page of HTML is held and a failure keeps the pages already saved
+            saved = 0
+            for page, products_html in self.listing_pages(driver, skip=self.crawl_state.fresh_pages(self.url, self.fresh_hours)):
+                products = self.parse_product_info(products_html)
+                self.save_product_info(products)
+                self.crawl_state.mark(self.url, page, CrawlStateManager.DONE, len(products))
+                saved += len(products)
+                logging.info(f"Page {page}: saved {len(products)} products")
+            logging.info(f"Listing complete: {saved} products")
+
+    def listing_pages(self, driver, skip=()):
+        """Yields (page number, innerHTML) for each page of the listing not in `skip`.
+
+        Page 1 is always loaded, since it sets up the view and gives the page
+        count. A page that times out is recorded as failed and the crawl moves on.
+        """
+        if skip:
+            logging.info(f"Skipping {len(skip)} listing pages fetched in the last {self.fresh_hours} hours")
+        try:
             self.navigate_to_page(driver, self.url)
             self.page_setup(driver)
             self.wait_for_elements(driver, DIRECT_DIAL['product_tab_content'], timeout=5)
             products_html = self.extract_html(driver)
-            num_pages = self.pagination(driver)
-            logging.info(f"Number of pages: {num_pages}")
-            while num_pages > 1:
-                url_parts = self.url.split('?')
-                base_url = url_parts[0]
-                query_params = '&' + url_parts[1]
-                paginated_url = base_url + f'?page={num_pages}' + query_params
-                self.navigate_to_page(driver, paginated_url)
+        except TimeoutException:
+            self.crawl_state.mark(self.url, 1, CrawlStateManager.FAILED)
+            raise
+        if 1 not in skip:
+            yield 1, products_html
+        num_pages = self.pagination(driver) or 1
+        logging.info(f"Number of pages: {num_pages}")
+        for page in range(2, num_pages + 1):
+            if page in skip:
+                continue
+            try:
+                self.navigate_to_page(driver, self.page_url(page))
                 self.wait_for_elements(driver, DIRECT_DIAL['product_tab_content'], timeout=5)
-                products_html += self.extract_html(driver)
-                num_pages -= 1
-            self.extract_product_info(products_html)
+                products_html = self.extract_html(driver)
+            except TimeoutException:
+                logging.warning(f"Page {page} of {self.url} timed out, it will be retried on the next run")
+                self.crawl_state.mark(self.url, page, CrawlStateManager.FAILED)
+                continue
+            yield page, products_html
+
+    def page_url(self, page):
+        url_parts = self.url.split('?')
+        base_url = url_parts[0]
+        query_params = '&' + url_parts[1]
+        return base_url + f'?page={page}' + query_params
 
     def navigate_to_page(self, driver, url):
-        driver.get(url)
+        if not self.pacer.get(driver, url):
+            logging.warning(f"Challenge page at {url}")
 
     def page_setup(self, driver):
         self.wait_for_elements(driver, DIRECT_DIAL['gridlist_button'], timeout=5)
         driver.find_element(By.XPATH, DIRECT_DIAL['list_view_button_xpath']).click()
         self.wait_for_elements(driver, DIRECT_DIAL['hits_per_page_element'], timeout=5)
-        time.sleep(2)
+        WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.XPATH, DIRECT_DIAL['hits_per_page_xpath'])))
+        products = driver.find_element(By.CSS_SELECTOR, DIRECT_DIAL['products_container'])
         dropdown = Select(driver.find_element(By.XPATH, DIRECT_DIAL['hits_per_page_xpath']))
         dropdown.select_by_value("60")
-        self.wait_for_elements(driver, DIRECT_DIAL['products_container'], timeout=5)
-        time.sleep(2)
+        self.wait_for_rerender(driver, products, DIRECT_DIAL['products_container'])
+
+    def wait_for_rerender(self, driver, old_element, item_class, timeout=5):
+        """Waits for InstantSearch to replace `old_element` and for its replacement to show."""
+        try:
+            WebDriverWait(driver, timeout).until(EC.staleness_of(old_element))
+        except TimeoutException:
+            # Some widgets update the list in place instead of replacing it
+            logging.debug(f"{item_class} was not replaced, continuing")
+        self.wait_for_elements(driver, item_class, timeout)
 
     def wait_for_elements(self, driver, item_class, timeout):
         wait = WebDriverWait(driver, timeout)
-        wait.until(lambda driver: driver.execute_script("return document.readyState") == "complete")
-        wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, item_class)))
-        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, item_class)))
+        with run_metrics.timer("wait", "directdial"):
+            wait.until(lambda driver: driver.execute_script("return document.readyState") == "complete")
+            wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, item_class)))
+            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, item_class)))
 
     def extract_html(self, driver):
         self.wait_for_elements(driver, DIRECT_DIAL['tab_content_css'], timeout=5)
-        container = driver.find_element(By.CLASS_NAME, DIRECT_DIAL["tab_content_class"])
-        return container.get_attribute("innerHTML")
+        with run_metrics.timer("extract", "directdial"):
+            container = driver.find_element(By.CLASS_NAME, DIRECT_DIAL["tab_content_class"])
+            return container.get_attribute("innerHTML")
     
     def pagination(self, driver):
         self.wait_for_elements(driver, ".ais-Stats", timeout=5)
@@ -87,164 +156,178 @@ class DirectDialScraper:
             logging.info("No results found")
     
     def extract_product_info(self, products_html):
+        self.save_product_info(self.parse_product_info(products_html))
+
+    def parse_product_info(self, products_html):
         soup = BeautifulSoup(products_html, 'lxml')
         products = soup.find_all('li', class_=DIRECT_DIAL["product_list_view_class"])
-        for product in products:
-            sku = self.extract_sku(product)
-            price = self.extract_price(product)
-            msrp = self.extract_msrp(product)
-            stock = self.extract_stock(product)
-            rebate = self.extract_rebate(product)
-            sale = self.extract_sale(product)
-            brand = self.extract_brand(product)
-            url = self.extract_url(product)
-            updated = datetime.now().strftime("%m/%d/%Y")
-            discovered = datetime.now().strftime("%m/%d/%Y")
-            if "notebook" in self.url.lower() or "laptop" in self.url.lower():
-                type = "notebook"
-            elif "desktop" in self.url.lower():
-                type = "desktop"
-            elif 'workstation' in self.url.lower():
-                type = "workstation"
-            else:
-                type = "N/A"
-            product_manager = ProductManager(self.db)
-            product_manager.add_direct_dial_product(sku, stock, price, msrp, rebate, sale, brand, type, url, updated, discovered)
+        return [{
+            'sku': self.extract_sku(product),
+            'stock': self.extract_stock(product),
+            'price': self.extract_price(product),
+            'msrp': self.extract_msrp(product),
+            'rebate': self.extract_rebate(product),
+            'sale': self.extract_sale(product),
+            'brand': self.extract_brand(product),
+            'url': self.extract_url(product),
+        } for product in products]
+
+    def save_product_info(self, products):
+        updated = datetime.now().strftime("%m/%d/%Y")
+        discovered = datetime.now().strftime("%m/%d/%Y")
+        type = self.product_type()
+        with run_metrics.timer("commit", "directdial", items=len(products)):
+            self.product_manager.upsert_products([dict(product, type=type, updated=updated, discovered=discovered) for product in products])
+
+    def product_type(self):
+        if "notebook" in self.url.lower() or "laptop" in self.url.lower():
+            return "notebook"
+        elif "desktop" in self.url.lower():
+            return "desktop"
+        elif 'workstation' in self.url.lower():
+            return "workstation"
+        else:
+            return "N/A"
 
-    def scrape_individual_products(self):
-        engine = create_engine(self.db)
-        Session = sessionmaker(bind=engine)
-        with Session() as session:
-            with DriverManager() as driver: 
-                while True:
-                    num_products = session.query(Product).filter_by(scanned=False).count()
-                    if num_products == 0:
-                        logging.info("All products have been scanned.")
-                        break
-                    logging.info(f"Remaining products to scan: {num_products}")
-                    products = session.query(Product).filter_by(scanned=False).yield_per(1)
-                    for product in products:
-                        logging.info(f"Scanning product {product.sku}")
-                        self.scan_product(driver, product, session)
+    def scrape_individual_products(self, batch_size=10, workers=1, parse_workers=2):
+        work_list = ScanWorkList(self.db)
+        while True:
+            num_products = work_list.remaining()
+            if num_products == 0:
+                logging.info("All products have been scanned.")
+                break
+            logging.info(f"Remaining products to scan: {num_products}")
+            # Browsers only load pages; a process pool parses and one writer saves in batches
+            pipeline = ScanPipeline("directdial", self.spec_fetcher, self.parse_spec_payload,
+                                    lambda results: self.save_scanned(work_list, results),
+                                    fetchers=workers, parse_workers=parse_workers)
+            pipeline.run(work_list.jobs(batch_size))
+            pipeline.report()
+            # Products whose page never loaded stay unscanned and get another pass
+            if work_list.remaining() == num_products:
+                logging.warning(f"No progress scanning the last {num_products} products, stopping")
+                break
+            work_list.restart()
+        self.html_cache.evict()
         logging.info("Scanning complete")
 
-    def scan_product(self, driver, product, session):
+    def reparse_from_cache(self):
+        """Rebuilds the specs of every product with a cached spec page, without a browser."""
+        Session = get_session_factory(self.db)
+        rows = []
+        with Session() as session:
+            for product in session.query(Product).all():
+                specs_html = self.html_cache.get(product.url)
+                if specs_html is None:
+                    continue
+                specs = self.parse_product_specs(specs_html, product.type, product.sku)
+                rows.append(self.scanned_row(product.sku, specs))
+        # One bulk update for the whole catalogue instead of a commit per product
+        self.product_manager.update_products(rows)
+        reparsed = len(rows)
+        logging.info(f"Re-parsed {reparsed} products from the HTML cache")
+        return reparsed
+
+    @contextmanager
+    def spec_fetcher(self):
+        with DriverManager(self.pool, profile=self.profile, site="directdial", lean=self.lean) as driver:
+            yield lambda job: self.fetch_specs(driver, job)
+
+    def fetch_specs(self, driver, job):
+        """Loads a product page and returns (specs_html, type, sku) for parse_spec_payload.
+
+        Returns Ready(specs) when there's nothing to parse, or None to leave the
+        product unscanned for the next pass.
+        """
+        sku, url, type = job
+        logging.info(f"Scanning product {sku}")
         try:
-            url = product.url
-            specs = {}
-            driver.get(url)
-            time.sleep(2)
+            if not self.pacer.get(driver, url):
+                logging.warning(f"Challenge page for product {sku}, leaving it for the next pass")
+                return None
             item_class=".site-content"
             try:
                 self.wait_for_elements(driver, item_class, timeout=5)
             except TimeoutException:
-                logging.info(f"First attempt failed for product {product.sku}, refreshing page...")
-                driver.refresh()
+                logging.info(f"First attempt failed for product {sku}, refreshing page...")
+                self.pacer.refresh(driver)
                 try:
-                    time.sleep(1)
                     self.wait_for_elements(driver, item_class, timeout=5)
                 except TimeoutException:
-                    logging.error(f"Second attempt failed for product {product.sku}, moving on...")
-                    #product.scanned = True
-                    #product.error = True
-                    session.commit()
-                    return
-            self.extract_product_specs(driver, specs, product.type, product.sku)
-            self.update_product_in_db(product, specs, session)
-        
+                    logging.error(f"Second attempt failed for product {sku}, moving on...")
+                    return None
+            try:
+                with run_metrics.timer("extract", "directdial"):
+                    container = WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.ID, DIRECT_DIAL["specification_tab"])))
+                    specs_html = container.get_attribute("innerHTML")
+            except (NoSuchElementException, TimeoutException) as e:
+                logging.error(f"Error extracting product specs: {traceback.format_exc()}")
+                specs = {}
+                self.fill_missing_specs(specs)
+                return Ready(specs)
         except (TimeoutException, NoSuchElementException) as e:
-            logging.error(f"Error scanning product {product.sku}: {traceback.format_exc()}")
-            product.scanned = True
-            product.error = True
-            session.commit()
-
-    def extract_product_specs(self, driver, specs, type, sku):
-        """Extracts the product specs using Selenium and BeautifulSoup."""
-        unrefined_data = {}
-        try:
-            container = driver.find_element(By.ID, DIRECT_DIAL["specification_tab"])
-            specs_html = container.get_attribute("innerHTML")
-            soup = BeautifulSoup(specs_html, 'html.parser')
-            #for element in soup(["script", "style"]):
-            #    element.extract()
-            #for comment in soup.findAll(text=lambda text: isinstance(text, str) and text.startswith("<!--")):
-            #    comment.extract()
-            #text = soup.get_text(separator=" ")
-            #cleaned_text = re.sub(r'\s+', ' ', text).strip()
-            #cleaned_text = re.sub(r'[^\w\s.,!?]', '', cleaned_text)
-            #print(cleaned_text)
-            rows = soup.find_all('tr')
-            for row in rows:
-                columns = row.find_all('td')
-                if len(columns) == 2:
-                    label = columns[0].get_text(strip=True).replace(':', '')
-                    value = columns[1].get_text(strip=True)
-                    unrefined_data[label] = value
-            specs['name'] = self.extract_name(unrefined_data, sku)
-            specs['form_factor'] = self.extract_form_factor(unrefined_data, type)
-            specs['cpu'] = self.extract_cpu(unrefined_data)
-            specs['gpu'] = self.extract_gpu(unrefined_data)
-            specs['storage'] = self.extract_storage(unrefined_data)
-            specs['ram'] = self.extract_ram(unrefined_data)
-            specs['keyboard'] = self.extract_keyboard(unrefined_data)
-            specs['warranty'] = self.extract_warranty(unrefined_data)
-            specs['ddr'] = self.extract_ddr(unrefined_data)
-            specs['os'] = self.extract_os(unrefined_data)
-            specs['ethernet'] = self.extract_ethernet(unrefined_data)
-            specs['wifi'] = self.extract_wifi(unrefined_data)
-            specs['screen_resolution'] = self.extract_screen_res(unrefined_data)          
-            specs['screen_type'] = self.extract_screen_type(unrefined_data)
-            specs['screen_size'] = self.extract_screen_size(unrefined_data)
-            specs['touch'] = self.extract_touch(unrefined_data)
-            time.sleep(3)
-
-        except NoSuchElementException as e:
-            logging.error(f"Error extracting product specs: {traceback.format_exc()}")
-            specs['name'] = specs.get('name', 'N/A')
-            specs['form_factor'] = specs.get('form_factor', 'N/A')
-            specs['cpu'] = specs.get('cpu', 'N/A')
-            specs['gpu'] = specs.get('gpu', 'N/A')
-            specs['storage'] = specs.get('storage', 0)
-            specs['ram'] = specs.get('ram', 0)
-            specs['warranty'] = specs.get('warranty', 'N/A')
-            specs['ddr'] = specs.get('ddr', 'N/A')
-            specs['os'] = specs.get('os', 'N/A')
-            specs['ethernet'] = specs.get('ethernet', 'N/A')
-            specs['wifi'] = specs.get('wifi', 'N/A')
-            specs['keyboard'] = specs.get('keyboard', 'N/A')
-            specs['screen_resolution'] = specs.get('screen_resolution', 'N/A')
-            specs['screen_size'] = specs.get('screen_size', 'N/A')
-            specs['screen_type'] = specs.get('screen_type', 'N/A')
-            specs['touch'] = specs.get('touch', 'N/A')
-            time.sleep(1)
-
-    def update_product_in_db(self, product, specs, session):
-        try:
-            #product.brand = specs.get('brand', 'N/A')
-            product.name = specs.get('name', 'N/A')
-            product.form_factor = specs.get('form_factor', 'N/A')
-            product.cpu = specs.get('cpu', 'N/A')
-            product.gpu = specs.get('gpu', 'N/A')
-            product.storage = specs.get('storage', 0)
-            product.ram = specs.get('ram', 0)
-            product.keyboard = specs.get('keyboard', 'N/A')
-            product.warranty = specs.get('warranty', 'N/A')
-            product.ddr = specs.get('ddr', 'N/A')
-            product.os = specs.get('os', 'N/A')
-            product.ethernet = specs.get('ethernet', 'N/A')
-            product.wifi = specs.get('wifi', 'N/A')
-            product.screen_resolution = specs.get('screen_resolution', 'N/A')
-            product.screen_size = specs.get('screen_size', 'N/A')
-            product.screen_type = specs.get('screen_type', 'N/A')
-            product.touch = specs.get('touch', 'N/A')
-
-            product.scanned = True
-            if product.cpu == "N/A" or product.gpu == "N/A" or product.storage == 0 or product.ram == 0 or product.form_factor == "N/A":
-                product.error = True
-            session.commit()
-        except Exception as e:
-            logging.error(f"Error updating product {product.sku} in the database: {traceback.format_exc()}")
-            session.rollback()  
+            logging.error(f"Error scanning product {sku}: {traceback.format_exc()}")
+            return Ready(None)
+        self.html_cache.put(url, specs_html)
+        return specs_html, type, sku
+
+    @classmethod
+    def parse_spec_payload(cls, payload):
+        return cls.parse_product_specs(*payload)
+
+    def save_scanned(self, work_list, results):
+        work_list.finish([self.scanned_row(sku, specs) for (sku, url, type), specs in results])
+
+    @classmethod
+    def parse_product_specs(cls, specs_html, type, sku):
+        """Turns the innerHTML of a product's spec table into a specs dict."""
+        return SpecFieldMap.for_scraper(cls, DIRECT_DIAL_SPECS).parse(specs_html, type=type, sku=sku)
+
+    @classmethod
+    def fill_missing_specs(cls, specs):
+        specs['name'] = specs.get('name', 'N/A')
+        specs['form_factor'] = specs.get('form_factor', 'N/A')
+        specs['cpu'] = specs.get('cpu', 'N/A')
+        specs['gpu'] = specs.get('gpu', 'N/A')
+        specs['storage'] = specs.get('storage', 0)
+        specs['ram'] = specs.get('ram', 0)
+        specs['warranty'] = specs.get('warranty', 'N/A')
+        specs['ddr'] = specs.get('ddr', 'N/A')
+        specs['os'] = specs.get('os', 'N/A')
+        specs['ethernet'] = specs.get('ethernet', 'N/A')
+        specs['wifi'] = specs.get('wifi', 'N/A')
+        specs['keyboard'] = specs.get('keyboard', 'N/A')
+        specs['screen_resolution'] = specs.get('screen_resolution', 'N/A')
+        specs['screen_size'] = specs.get('screen_size', 'N/A')
+        specs['screen_type'] = specs.get('screen_type', 'N/A')
+        specs['touch'] = specs.get('touch', 'N/A')
+
+    @classmethod
+    def scanned_row(cls, sku, specs):
+        """The ScanWorkList row finishing a product's scan. Specs of None mark the scan as failed."""
+        if specs is None:
+            return ScanWorkList.failed(sku)
+        row = {
+            'name': specs.get('name', 'N/A'),
+            'form_factor': specs.get('form_factor', 'N/A'),
+            'cpu': specs.get('cpu', 'N/A'),
+            'gpu': specs.get('gpu', 'N/A'),
+            'storage': specs.get('storage', 0),
+            'ram': specs.get('ram', 0),
+            'keyboard': specs.get('keyboard', 'N/A'),
+            'warranty': specs.get('warranty', 'N/A'),
+            'ddr': specs.get('ddr', 'N/A'),
+            'os': specs.get('os', 'N/A'),
+            'ethernet': specs.get('ethernet', 'N/A'),
+            'wifi': specs.get('wifi', 'N/A'),
+            'screen_res': specs.get('screen_resolution', 'N/A'),
+            'screen_size': specs.get('screen_size', 'N/A'),
+            'screen_type': specs.get('screen_type', 'N/A'),
+            'touch': specs.get('touch', 'N/A'),
+        }
+        # Set either way, so a re-parse that now finds every field clears an earlier error
+        row['error'] = row['cpu'] == "N/A" or row['gpu'] == "N/A" or row['storage'] == 0 or row['ram'] == 0 or row['form_factor'] == "N/A"
+        return ScanWorkList.done(sku, row)
 
     @classmethod
     def extract_sku(cls, product):
@@ -455,54 +538,6 @@ class DirectDialScraper:
         else:
             return "N/A"
 
-    @classmethod
-    def extract_storage(cls, product):
-        storage = "N/A"
-        if (product.get('Total Solid State Drive Capacity')):
-            storage = product.get('Total Solid State Drive Capacity').upper()
-        elif (product.get('Flash Memory Capacity')):
-            storage = product.get('Flash Memory Capacity').upper()
-        if storage != "N/A":
-            if "GB" in storage:
-                storage = int(storage.replace("GB", "").strip())
-            elif "TB" in storage:
-                storage = int(storage.replace("TB", "").strip())*1000
-            return storage
-        else:
-            return 0
-
-    @classmethod
-    def extract_os(cls, product):
-        return product.get('Operating System Platform', "N/A")
-
-    @classmethod
-    def extract_screen_res(cls, product):
-        return product.get('Screen Mode', "N/A")
-    
-    @classmethod
-    def extract_screen_type(cls, product):
-        return product.get('Display Screen Type', "N/A")
-    
-    @classmethod
-    def extract_screen_size(cls, product):
-        return product.get('Screen Size', "N/A")
-
-    @classmethod
-    def extract_wifi(cls, product):
-        return product.get('Wireless LAN', "N/A")
-
-    @classmethod
-    def extract_keyboard(cls, product):
-        return product.get('Keyboard Localization', "N/A")
-
-    @classmethod
-    def extract_touch(cls, product):
-        return product.get('Touchscreen', "N/A")
-        
-    @classmethod
-    def extract_ethernet(cls, product):
-        return product.get('Ethernet Technology', "N/A") 
-
     @classmethod
     def extract_release_year(cls, product):
         return product.get('Release Year', "N/A")
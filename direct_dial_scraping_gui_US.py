@@ -4,54 +4,68 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import Select
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException
-import undetected_chromedriver as uc
-import time
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
 from datetime import datetime
 import os
 import re
-from difflib import get_close_matches
+from difflib import get_close_matches, SequenceMatcher
 import customtkinter
 import threading
 import queue
-
-#scrape the website and return the html of the products
-def scrape_website(url):
+from driver_manager import DriverPool
+from hardware import HardwareManager
+from products import PriceHistoryManager
+from pacing import get_pacer
+from pfv import competitors, merge_listing
+
+# Bump when get_cpu_score/get_gpu_score change so cached matches are recomputed
+GUI_MATCHER_VERSION = "gui-difflib-2"
+
+# Column holding the date a product's specifications were last scanned
+SPECS_UPDATED = 41
+ROW_LENGTH = 42
+
+# driver_manager.BROWSER_PROFILES entry; "server" runs headless without a display
+BROWSER_PROFILE = "desktop"
+
+# Block trackers, fonts and media while scraping (driver_manager.LEAN_BLOCKED_URLS); opt-in
+LEAN_MODE = False
+
+def wait_for_new_products(driver, old_products):
+    # The listing re-renders the product container after every view, size or page change
+    try:
+        WebDriverWait(driver, 10).until(EC.staleness_of(old_products))
+    except TimeoutException:
+        pass
+    return WebDriverWait(driver, 10).until(EC.visibility_of_element_located((By.CLASS_NAME, "products")))
+
+#scrape the website and yield the html lines of each page of products as it loads
+def scrape_website(url, pool):
     msg_queue.put("STEP 1: Scraping Product Page for SKU, PRICE and STOCK\n")
-    time.sleep(1)
     msg_queue.put("   Scanning Page 1\n")
-    options = uc.ChromeOptions() 
-    options.headless = False
-    driver = uc.Chrome(use_subprocess=True, options=options) 
-    driver.get(url)
-    driver.set_window_size(1050, 750) 
-    time.sleep(2)
-    driver.find_element(By.XPATH, '//*[@id="list-btn-top"]').click()
-    time.sleep(2)
-    dropdown = Select(driver.find_element(By.XPATH, '//*[@id="hits-per-page"]/div/select'))
-    dropdown.select_by_value("240")
-    time.sleep(2)
-    container = driver.find_element(By.CLASS_NAME, "products")
-    products_html = container.get_attribute("innerHTML")
-    time.sleep(2)
-    number_of_pages = driver.find_element(By.XPATH, '//*[@id="pagination"]/div/ul')
-    number_of_pages_html = number_of_pages.get_attribute("innerHTML")
-    count_number_of_pages = number_of_pages_html.count('href')
-    operation_count = 4
-    if count_number_of_pages >= 4:
-        while operation_count <= count_number_of_pages:
-            msg_queue.put("   Scanning Page "+str(operation_count-2)+"\n")
-            page_xpath = '//*[@id="pagination"]/div/ul/li['+str(operation_count)+']/a'
-            driver.find_element(By.XPATH, page_xpath).click()
-            time.sleep(2)    
-            products = driver.find_element(By.CLASS_NAME, "products")
-            products_html = products_html+products.get_attribute("innerHTML")
-            operation_count = operation_count +1
-
-    driver.close()
-    cleaned_list = [line.strip() for line in products_html.splitlines()]
+    with pool.driver(site="directdial", lean=LEAN_MODE) as driver:
+        get_pacer("directdial").get(driver, url)
+        driver.set_window_size(1050, 750) 
+        WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, '//*[@id="list-btn-top"]'))).click()
+        dropdown = Select(WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, '//*[@id="hits-per-page"]/div/select'))))
+        products = driver.find_element(By.CLASS_NAME, "products")
+        dropdown.select_by_value("240")
+        container = wait_for_new_products(driver, products)
+        yield [line.strip() for line in container.get_attribute("innerHTML").splitlines()]
+        number_of_pages = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, '//*[@id="pagination"]/div/ul')))
+        number_of_pages_html = number_of_pages.get_attribute("innerHTML")
+        count_number_of_pages = number_of_pages_html.count('href')
+        operation_count = 4
+        if count_number_of_pages >= 4:
+            while operation_count <= count_number_of_pages:
+                msg_queue.put("   Scanning Page "+str(operation_count-2)+"\n")
+                page_xpath = '//*[@id="pagination"]/div/ul/li['+str(operation_count)+']/a'
+                products = driver.find_element(By.CLASS_NAME, "products")
+                driver.find_element(By.XPATH, page_xpath).click()
+                products = wait_for_new_products(driver, products)
+                yield [line.strip() for line in products.get_attribute("innerHTML").splitlines()]
+                operation_count = operation_count +1
     msg_queue.put("STEP 1 COMPLETED: Scraped Product Pages\n\n")
-    return(cleaned_list)
 
 # Extracts the value of an attribute from a string between two strings
 def extract_attribute_value(original_string, start_string, end_string):
@@ -63,7 +77,7 @@ def extract_attribute_value(original_string, start_string, end_string):
 
 # Extracts the product information from the html product description
 def format_product_info(product_description,category):
-    product = [" "] * 41
+    product = [" "] * ROW_LENGTH
     ## PRODUCT NUMBER
     product[0] = urllib.parse.unquote(extract_attribute_value(product_description, 'data-item-num="','" '))
     ## STOCK
@@ -121,50 +135,51 @@ def read_csv_to_list_of_lists(csv_file):
         msg_queue.put("STEP 2 FAILED: Local Database NOT found and will now recreate database from scratch\n\n")
         return result
 
-#Checks if the product from the website is already in the local list of products
-def checks_if_web_in_local(web_row, local_products):
-    current_date = datetime.now().strftime("%m/%d/%Y")
-    for index_local, local_row in enumerate(local_products):
-        if local_row[0] == web_row[0]:
-            local_row[27] = current_date
-            # If the web product has changed, update the local product
-            if local_row != web_row:
-                local_products[index_local][1] = web_row[1]
-                local_products[index_local][2] = web_row[2]
-                local_products[index_local][3] = web_row[3]
-                local_products[index_local][4] = web_row[4]
-                local_products[index_local][26] = web_row[26] 
-                for index_web, x in enumerate(local_row):
-                    if ((x == ' ' and x == 'Not Specified') and (web_row[index_web] != ' ' and web_row[index_web] != 'Not Specified')):
-                        local_products[index_local][index_web] = web_row[index_web]      
-            return local_products
-    web_row[27] = current_date
-    local_products.append(web_row)
-    return local_products
-
 #Compare updated info from website and current info in CSV
 def compare_web_to_csv(web_products, local_products):
     if len(local_products) <= 2:
         return web_products
-    else:
-        for web_row in web_products:
-            local_products = checks_if_web_in_local(web_row,local_products)
+    local_products, summary = merge_listing(web_products, local_products, datetime.now().strftime("%m/%d/%Y"))
+    msg_queue.put(f"    Listing merged: {summary['new']} new, {summary['changed']} changed, {summary['vanished']} no longer listed\n")
     return local_products
 
-#Get the specifications of the product
-def specification_scrape(updated_products):
+# Columns a successful rescan refreshes (brand through product type, plus the scan date)
+SPEC_COLUMNS = set(range(5, 25)) | {SPECS_UPDATED}
+# Specifications older than this are scanned again while the product is still listed
+SPEC_MAX_AGE_DAYS = 30
+# Passes over products that failed to scan before leaving them for the next run
+SPEC_SCAN_PASSES = 3
+
+#Checks if a product's specifications have to be scanned
+def needs_spec_scan(product, today, max_age_days=SPEC_MAX_AGE_DAYS):
+    if product[28] != "TRUE":
+        return True
+    # Products that are no longer listed keep the specs they have
+    if product[27] != today.strftime("%m/%d/%Y"):
+        return False
+    if product[29] == "TRUE":
+        return True
+    try:
+        scanned = datetime.strptime(product[SPECS_UPDATED], "%m/%d/%Y")
+    except ValueError:
+        return True
+    return (today - scanned).days > max_age_days
+
+#Get the specifications of the products, reusing one browser from the pool
+def specification_scrape(updated_products, pool):
+    with pool.driver(site="directdial", lean=LEAN_MODE) as driver:
+        return scan_specifications(updated_products, driver)
+
+def scan_specifications(updated_products, driver):
     retries_count = 0
+    today = datetime.now().strftime("%m/%d/%Y")
     for index, product in enumerate(updated_products):
         try:
             msg_queue.put("    Scanning product: "+ str(index+1) + " of " + str(len(updated_products))+"\n")
-            new_product = [' '] *41
-            options = uc.ChromeOptions() 
-            options.headless = False
-            driver = uc.Chrome(use_subprocess=True, options=options) 
-            driver.get(product[26])
+            new_product = [' '] * ROW_LENGTH
+            get_pacer("directdial").get(driver, product[26])
             driver.set_window_size(1050, 750) 
-            time.sleep(2)
-            container = driver.find_element(By.ID, 'tab-specification') 
+            container = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, 'tab-specification')))
             products_html = container.get_attribute("innerHTML").splitlines()
             cleaned_list = [line.strip() for line in products_html]
             cpu_brand = ''
@@ -333,39 +348,54 @@ def specification_scrape(updated_products):
 
             ##Success 
             new_product[28] = "TRUE"
+            new_product[SPECS_UPDATED] = today
         
             msg_queue.put("     Product: "+ str(index+1) + " scanned successfully\n")
             msg_queue.put("     Remaning retries: "+ str(retries_count)+"\n")
-        except NoSuchElementException:
+        except (NoSuchElementException, TimeoutException):
             new_product[28] = "FALSE"
             retries_count = retries_count+1
             msg_queue.put("     Product: "+ str(index+1) + " scanned unsuccessfully\n")
             msg_queue.put("     Remaning retries: "+ str(retries_count)+"\n")
+        rescanned = new_product[28] == "TRUE"
         updated_product = []
         for index_2, item in enumerate(new_product):
             if (item !=" " and  (product[index_2] == " " or product[index_2] =="FALSE")):
                 updated_product.append(new_product[index_2])
+            # A successful rescan replaces known specs, but never with a blank
+            elif rescanned and index_2 in SPEC_COLUMNS and item not in (" ", "Not Specified"):
+                updated_product.append(new_product[index_2])
             else:
                 updated_product.append(product[index_2])
-        time.sleep(.5)
-        driver.close()
         updated_products[index] = updated_product
     return(updated_products)
 
-def run_specification_scrape(updated_products):
+def run_specification_scrape(updated_products, pool, max_age_days=SPEC_MAX_AGE_DAYS):
     msg_queue.put("STEP 3: Scanning Individual MTMs\n")
-    unfinished_products = updated_products
+    today = datetime.now()
     finished_products = []
-    while len(unfinished_products) > 0:
-        index = 0
-        while index < len(unfinished_products):
-            if unfinished_products[index][28] == "TRUE":
-                finished_products.append(unfinished_products.pop(index))
-            else:
-                index += 1
-        unfinished_products = specification_scrape(unfinished_products)
+    unfinished_products = []
+    for product in updated_products:
+        # Rows from specs.csv files written before the scan date column existed
+        product.extend([" "] * (ROW_LENGTH - len(product)))
+        if product[28] == "TRUE" and product[SPECS_UPDATED] == " ":
+            product[SPECS_UPDATED] = today.strftime("%m/%d/%Y")
+        if needs_spec_scan(product, today, max_age_days):
+            product[28] = "FALSE"
+            unfinished_products.append(product)
+        else:
+            finished_products.append(product)
+    msg_queue.put("    " + str(len(unfinished_products)) + " of " + str(len(updated_products)) + " MTMs need their specifications scanned\n")
+    for _ in range(SPEC_SCAN_PASSES):
+        if not unfinished_products:
+            break
+        scanned_products = specification_scrape(unfinished_products, pool)
+        finished_products += [product for product in scanned_products if product[28] == "TRUE"]
+        unfinished_products = [product for product in scanned_products if product[28] != "TRUE"]
+    if unfinished_products:
+        msg_queue.put("    " + str(len(unfinished_products)) + " MTMs could not be scanned and will be retried next run\n")
     msg_queue.put("STEP 3 COMPLETED: Scanning Individual MTMs\n\n")
-    return finished_products
+    return finished_products + unfinished_products
 
 # Checks if all fields are filled in
 def check_missing_fields(updated_products):
@@ -401,45 +431,61 @@ def compute_score(products, cpu_scores, gpu_scores, form_factor_weights, categor
 
     """
     msg_queue.put("STEP 6: Compute MTMs Scores\n")
+    hardware_manager = HardwareManager('sqlite:///hardware.db')
+    # get_cpu_score strips '@' from cpu_scores, so fingerprint the stripped names
+    list_versions = {
+        'cpu': HardwareManager.list_version([(cpu[0].split('@')[0], cpu[1]) for cpu in cpu_scores]),
+        'gpu': HardwareManager.list_version(gpu_scores),
+    }
+    cached_matches = {kind: hardware_manager.get_matches(kind, GUI_MATCHER_VERSION, version) for kind, version in list_versions.items()}
+    new_matches = {'cpu': {}, 'gpu': {}}
+
+    # lookup returns (matched name, score, confidence); the whole match is cached so it can be audited
+    def cached_score(kind, raw_name, lookup, *args):
+        if raw_name not in cached_matches[kind]:
+            cached_matches[kind][raw_name] = new_matches[kind][raw_name] = lookup(*args)
+        return cached_matches[kind][raw_name][1]
+
+    def match_confidence(name, matched_name):
+        return round(SequenceMatcher(None, name.lower(), matched_name.lower()).ratio() * 100)
+
     def normalize(value, min_value, max_value):
         return (value - min_value) / (max_value - min_value) if max_value > min_value else 0
 
     def get_cpu_score(cpu_name):
         if cpu_name == "Not Specified":
-            return 0
+            return None, 0, 0
         if cpu_name == " ": 
-            return 0
+            return None, 0, 0
         if cpu_name == "": 
-            return 0
+            return None, 0, 0
         for cpu_index, cpu in enumerate(cpu_scores):
             if '@' in cpu[0]:
                 cpu_scores[cpu_index] = (cpu[0].split('@')[0], cpu[1])
                 
         for cpu in cpu_scores:
             if cpu[0] == cpu_name:
-                return cpu[1]
+                return cpu[0], cpu[1], 100
         msg_queue.put("    CPU not found: " + cpu_name+ "\n")
-        time.sleep(.5)
         closest = get_close_matches(cpu_name, [cpu[0] for cpu in cpu_scores], n=1)
         if closest:
             
             for cpu in cpu_scores:
                 if cpu[0] == closest[0]:
                     msg_queue.put("    Match found: " + closest[0]+"\n\n")
-                    time.sleep(.2)
-                    return cpu[1] 
-        return 0
+                    return cpu[0], cpu[1], match_confidence(cpu_name, closest[0])
+        return None, 0, 0
 
     def get_gpu_score(gpu_name, gpu_memory):
         gpu_name2 = gpu_name.lower()
         if gpu_name2 == "not specified":
-            return 0
+            return None, 0, 0
         if gpu_name2 == "integrated":
-            return 0
+            return None, 0, 0
         if gpu_name2 == '':
-            return 0
+            return None, 0, 0
         if gpu_name2 == ' ':
-            return 0
+            return None, 0, 0
         for gpu in gpu_scores:
             first, _, rest = gpu_name2.partition(" ")
             gpu_backup = rest or first
@@ -471,19 +517,19 @@ def compute_score(products, cpu_scores, gpu_scores, form_factor_weights, categor
                 gpu_score_name = gpu_score_name.replace('graphics', '')
             gpu_compare = gpu[0].lower()
             if gpu[0].lower() == gpu_name2.lower():
-                return gpu[1]
+                return gpu[0], gpu[1], 100
             elif gpu[0].lower() == gpu_backup.lower():
-                return gpu[1]
+                return gpu[0], gpu[1], 100
             if gpu[0].lower() == gpu_backup_2.lower():
-                return gpu[1]
+                return gpu[0], gpu[1], 100
             if gpu_compare.replace('nvidia ', '').replace('geforce ', '').replace('quadro ', '') == gpu_backup_4.lower():
-                return gpu[1]
+                return gpu[0], gpu[1], 100
             if gpu_compare.replace('nvidia ', '').replace('geforce ', '').replace('quadro ', '') == gpu_backup_5.lower():
-                return gpu[1]
+                return gpu[0], gpu[1], 100
             if gpu[0].lower() == gpu_backup_3.lower():
-                return gpu[1]
+                return gpu[0], gpu[1], 100
             if gpu[0].lower().replace('nvidia ', '').replace('geforce ', '').replace('quadro ', '') == gpu_backup_3.lower().replace('nvidia ', '').replace('geforce ', '').replace('quadro ', ''):
-                return gpu[1]
+                return gpu[0], gpu[1], 100
         msg_queue.put("    GPU not found: " + gpu_name+"\n")
         updated_gpu_list = [(gpu[0].lower().replace('nvidia ', '').replace('geforce ', '').replace('quadro ', ''), gpu[1]) for gpu in gpu_scores]
         pattern = r'\b([A-Za-z]*\d+)\b'
@@ -498,15 +544,14 @@ def compute_score(products, cpu_scores, gpu_scores, form_factor_weights, categor
                 updated_gpu_list_more.append(gpu_parse)
         if len(updated_gpu_list_more) == 0:
             updated_gpu_list_more = updated_gpu_list
-        time.sleep(.5)
         closest = get_close_matches(gpu_name2, [gpu[0] for gpu in updated_gpu_list_more], n=1)
         if closest:
     
             for index, gpu in enumerate(updated_gpu_list):
                 if gpu[0].lower() == closest[0].lower():
                     msg_queue.put("    Match found: " + gpu_scores[index][0]+"\n\n")
-                    return gpu_scores[index][1]
-        return 0
+                    return gpu_scores[index][0], gpu_scores[index][1], match_confidence(gpu_name2, closest[0])
+        return None, 0, 0
 
     for index, product in enumerate(products):
         try:
@@ -520,7 +565,7 @@ def compute_score(products, cpu_scores, gpu_scores, form_factor_weights, categor
             }
             ##CPU SCORE
             if product[8] != "Not Specified":
-                normalized_cpu = normalize(get_cpu_score(product[8]), min([cpu[1] for cpu in cpu_scores]), max([cpu[1] for cpu in cpu_scores]))
+                normalized_cpu = normalize(cached_score('cpu', product[8], get_cpu_score, product[8]), min([cpu[1] for cpu in cpu_scores]), max([cpu[1] for cpu in cpu_scores]))
             else:
                 normalized_cpu = 0
             if product[8] != "Not Specified":
@@ -536,7 +581,7 @@ def compute_score(products, cpu_scores, gpu_scores, form_factor_weights, categor
             else:
                 normalized_storage = 0
             if product[13] != "Not Specified":
-                normalized_gpu = normalize(get_gpu_score(product[13], product[14]), min([gpu[1] for gpu in gpu_scores]), max([gpu[1] for gpu in gpu_scores]))
+                normalized_gpu = normalize(cached_score('gpu', f"{product[13]} ({product[14]})", get_gpu_score, product[13], product[14]), min([gpu[1] for gpu in gpu_scores]), max([gpu[1] for gpu in gpu_scores]))
             else:
                 normalized_gpu = 0
             # Calculate score
@@ -548,28 +593,28 @@ def compute_score(products, cpu_scores, gpu_scores, form_factor_weights, categor
             score = 0
         if product[30] == category:
             products[index][25] = score*1000
+    for kind, matches in new_matches.items():
+        hardware_manager.save_matches(kind, GUI_MATCHER_VERSION, list_versions[kind], matches)
     msg_queue.put("STEP 6 COMPLETED: Computed Scores\n\n")
-    time.sleep(1)
     return products
 
 # Function to scrape scores from a URL
-def scrape_score(url):
+def scrape_score(url, pool):
     """
     Scrapes the scores from a given URL and returns a list of tuples containing the name and its score.
 
     Args:
         url (str): The URL of the webpage containing the scores.
+        pool (DriverPool): The browser pool to borrow a browser from.
 
     Returns:
         list: A list of tuples containing the name and its score.
     """
-    options = uc.ChromeOptions() 
-    options.headless = False
-    driver = uc.Chrome(use_subprocess=True, options=options) 
-    driver.get(url)
-    driver.set_window_size(1050, 750) 
-    item_table = WebDriverWait(driver, 10).until(EC.visibility_of_element_located((By.ID, 'cputable')))
-    item_html = item_table.get_attribute("innerHTML")
+    with pool.driver(site="passmark", lean=LEAN_MODE) as driver:
+        get_pacer("passmark").get(driver, url)
+        driver.set_window_size(1050, 750) 
+        item_table = WebDriverWait(driver, 10).until(EC.visibility_of_element_located((By.ID, 'cputable')))
+        item_html = item_table.get_attribute("innerHTML")
     item_list_html = item_html.split('<tr id=')[1:]
     scores = []
     for item in item_list_html:
@@ -577,46 +622,13 @@ def scrape_score(url):
         score = int(extract_attribute_value(item, '</a></td><td>', '</td><td>').replace(',', ''))
         name = name[name.rfind('">') + 2:]
         scores.append((name, score))
-    driver.close()
     return scores
 
-# Function to get the closest competitors
-def competitors(products):
-    for index_product, product in enumerate(products):
-        closest_skus = []
-        closest_skus_dell = []
-        closest_skus_hp = []
-        closest_skus_lenovo = []
-        for other_product in products:
-            try:
-                score_diffs = (other_product[0], float(abs(float(product[25]) - float(other_product[25]))))
-            except ValueError:
-                score_diffs = (other_product[0], 0)
-            if product[30] == other_product[30]:
-                if product[5] == 'Lenovo' and other_product[5] == 'HP':
-                    closest_skus_hp.append(score_diffs)
-                if product[5] == 'Lenovo' and other_product[5] == 'Dell':
-                    closest_skus_dell.append(score_diffs)
-                if product[5] == 'HP' and other_product[5] == 'Lenovo':
-                    closest_skus_lenovo.append(score_diffs)
-                if product[5] == 'Dell' and other_product[5] == 'Lenovo':
-                    closest_skus_lenovo.append(score_diffs)
-                    
-        if product[5] != 'Lenovo':
-            closest_skus = sorted(closest_skus_lenovo, key=lambda x: float(x[1]))[:10]
-        else:
-            closest_skus_dell = sorted(closest_skus_dell, key=lambda x: float(x[1]))[:5]
-            closest_skus_hp = sorted(closest_skus_hp, key=lambda x: float(x[1]))[:5]
-            closest_skus = closest_skus_dell + closest_skus_hp
-
-        
-        for index_sku, sku in enumerate(closest_skus):
-            products[index_product][index_sku+31] = sku[0]
-    return products
+# Function to get the closest competitors: competitors() in pfv.py
 
 # Function to add header
 def add_header(sorted_products):
-    header = ["SKU", "STOCK", "PRICE", "REEBATE", "SALE", "BRAND", "NAME", "FORM FACTOR", "CPU","RAM", "DDR", "STORAGE", "OS", "GPU", "VRAM", "SCREEN RES.","SCREEN TYPE", "WiFi", "KEYBOARD", "TOUCH", "ETHERNET", "RELEASE YEAR", "WARRANTY", "WARRANTY DESC.", "TYPE", "SCORE", "URL", "UPDATED", "SUCCESS", "FIX", "CATEGORY", "COMPETITOR 1", "COMPETITOR 2", "COMPETITOR 3", "COMPETITOR 4", "COMPETITOR 5", "COMPETITOR 6", "COMPETITOR 7", "COMPETITOR 8", "COMPETITOR 9", "COMPETITOR 10"]
+    header = ["SKU", "STOCK", "PRICE", "REEBATE", "SALE", "BRAND", "NAME", "FORM FACTOR", "CPU","RAM", "DDR", "STORAGE", "OS", "GPU", "VRAM", "SCREEN RES.","SCREEN TYPE", "WiFi", "KEYBOARD", "TOUCH", "ETHERNET", "RELEASE YEAR", "WARRANTY", "WARRANTY DESC.", "TYPE", "SCORE", "URL", "UPDATED", "SUCCESS", "FIX", "CATEGORY", "COMPETITOR 1", "COMPETITOR 2", "COMPETITOR 3", "COMPETITOR 4", "COMPETITOR 5", "COMPETITOR 6", "COMPETITOR 7", "COMPETITOR 8", "COMPETITOR 9", "COMPETITOR 10", "SPECS UPDATED"]
     sorted_products.insert(0,header)
     return sorted_products
 
@@ -626,120 +638,30 @@ def write_csv(file, data):
         writer = csv.writer(file)
         writer.writerows(data)
 
-# Function to read a CSV file into a dictionary
-def read_csv_to_dict(filename):
-    if not os.path.exists(filename) or os.path.getsize(filename) == 0:
-        # If the file doesn't exist or is empty, return an empty header and dictionary
-        return [], {}
-    
-    with open(filename, mode='r', newline='') as file:
-        reader = csv.reader(file)
-        data = list(reader)
-        
-    header = data[0]
-    data_dict = {row[0]: row[1:] for row in data[1:]}
-    
-    return header, data_dict
-
-# Function to update the pricing dictionary
-def update_pricing_dict(header, data_dict, new_data):
-    msg_queue.put("STEP 6: Updating Price History\n")
-    today = datetime.now().strftime('%m/%d/%Y')
-    
-    # If the header is empty (new or empty CSV), create the initial header
-    if not header:
-        header = ['SKU', today]
-    
-    # Insert the new date at index 1 if it's not already there
-    
-    skus_in_csv = set(data_dict.keys())
-    skus_in_new_data = set()
-    
-    for new_product in new_data[1:]:
-        sku = new_product[0]
-        new_price = new_product[2].replace('$', '').replace(',', '')
-        new_date = new_date = datetime.strptime(new_product[27], '%m/%d/%Y').strftime('%m/%d/%Y')
-        skus_in_new_data.add(sku)
-        
-        if new_date != today:
-            new_price = '0'
-        
-        if sku in data_dict:
-            # Insert the new price at index 1 for the existing SKU
-            if today != datetime.strptime(header[1], '%m/%d/%Y').strftime('%m/%d/%Y'):
-                data_dict[sku].insert(0, new_price)
-            else:
-                data_dict[sku][0]= new_price
-        else:
-            # Create a new entry for the new SKU
-            data_dict[sku] = [new_price] + ['$0'] * (len(header) - 2)
-    
-    # For SKUs in the CSV that are not in the new data, set today's price to $0
-    
-    if today != datetime.strptime(header[1], '%m/%d/%Y').strftime('%m/%d/%Y'):
-        header.insert(1, today)
-        
-    for sku in skus_in_csv - skus_in_new_data:
-        data_dict[sku].insert(0, '$0')
-    msg_queue.put("STEP 6 COMPLETED: Updated Price History\n")
-    return header, data_dict
-
-# Function to update the stock dictionary
-def update_stock_dict(header, data_dict, new_data):
-    msg_queue.put("STEP 7: Updating Stock History\n")
+# Price and stock history, one row per listed SKU per day
+PRICE_HISTORY_DB = 'sqlite:///direct_dial_us.db'
+PRICE_HISTORY_SOURCE = 'directdial_us'
+
+# Function to record today's prices and stock
+def update_price_history(products, price_csv, stock_csv):
+    msg_queue.put("STEP 6: Updating Price and Stock History\n")
+    price_history = PriceHistoryManager(PRICE_HISTORY_DB)
+    # The first run on the database carries over the history kept in the wide CSVs
+    if not price_history.has_history(PRICE_HISTORY_SOURCE):
+        imported = price_history.import_wide_csv(price_csv, stock_csv, PRICE_HISTORY_SOURCE)
+        msg_queue.put("    Imported " + str(imported) + " rows of price history from " + price_csv + "\n")
     today = datetime.now().strftime('%m/%d/%Y')
-    
-    # If the header is empty (new or empty CSV), create the initial header
-    if not header:
-        header = ['SKU', today]
-    
-    # Insert the new date at index 1 if it's not already there
-    
-    skus_in_csv = set(data_dict.keys())
-    skus_in_new_data = set()
-    
-    for new_product in new_data[1:]:
-        sku = new_product[0]
-        new_stock = new_product[1]
-        new_date = new_date = datetime.strptime(new_product[27], '%m/%d/%Y').strftime('%m/%d/%Y')
-        skus_in_new_data.add(sku)
-        
-        if new_date != today:
-            new_stock = '0'
-        
-        if sku in data_dict:
-            # Insert the new price at index 1 for the existing SKU
-            if today != datetime.strptime(header[1], '%m/%d/%Y').strftime('%m/%d/%Y'):
-                data_dict[sku].insert(0, new_stock)
-            else:
-                data_dict[sku][0]= new_stock
-        else:
-            # Create a new entry for the new SKU
-            data_dict[sku] = [new_stock] + ['0'] * (len(header) - 2)
-    
-    # For SKUs in the CSV that are not in the new data, set today's price to $0
-    
-    if today != datetime.strptime(header[1], '%m/%d/%Y').strftime('%m/%d/%Y'):
-        header.insert(1, today)
-        
-    for sku in skus_in_csv - skus_in_new_data:
-        data_dict[sku].insert(0, '0')
-    msg_queue.put("STEP 7 COMPLETED:  Updated Stock History\n")
-    return header, data_dict
-
-
-# Function to save a dictionary to a CSV file
-def save_dict_to_csv(header, data_dict, filename):
-    msg_queue.put("STEP 8: Saving Scraped Data to the Database\n")
-    time.sleep(2)
-    with open(filename, mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(header)
-        
-        for sku, prices in data_dict.items():
-            writer.writerow([sku] + prices)
-    msg_queue.put("STEP 8 COMPLETE: Saved Scraped Data to the Database***\n")
-    time.sleep(.5)
+    rows = [(product[0], PriceHistoryManager.to_number(product[2]), int(PriceHistoryManager.to_number(product[1])))
+            for product in products[1:] if product[27] == today]
+    recorded = price_history.record(rows, PRICE_HISTORY_SOURCE)
+    msg_queue.put("STEP 6 COMPLETED: Recorded " + str(recorded) + " Prices\n")
+
+# Function to write the price and stock history in the wide CSV layout
+def export_price_history(price_csv='price.csv', stock_csv='stock.csv'):
+    price_history = PriceHistoryManager(PRICE_HISTORY_DB)
+    days = price_history.export_wide_csv(price_csv, 'price', PRICE_HISTORY_SOURCE, missing='$0')
+    price_history.export_wide_csv(stock_csv, 'stock', PRICE_HISTORY_SOURCE)
+    msg_queue.put("Exported " + str(days) + " days of history to " + price_csv + " and " + stock_csv + "\n")
 
 """ ----------------- MAIN ----------------- """
 
@@ -774,7 +696,6 @@ def check_all_fields(products,error_csv):
             error_message = "   Data Error: "+str(product[0])+ "   Row: "+ str(product_index+2)+"\n"
             error_count = error_count + 1
             msg_queue.put(error_message)
-            time.sleep(1)
     if len(error_csv_list) == 0:
         error_csv_list.append(["CATEGORY","SKU", "ERROR", "URL"])
     elif error_csv_list[0] != ["CATEGORY","SKU", "ERROR", "URL"]:
@@ -793,10 +714,11 @@ def adjust_score_out_of_stock(products):
 ##### Building the list of lists of products
 
 #scrape the website
-def pfv_function(url, spec_csv, price_csv, stock_csv, ff_weights,error_csv, category):
-    scraped_contents = scrape_website(url)
-    #extract the product information
-    web_products = extract_product_info(scraped_contents, category)
+def pfv_function(url, spec_csv, price_csv, stock_csv, ff_weights,error_csv, category, pool):
+    #extract the product information page by page as the listing loads
+    web_products = []
+    for page_lines in scrape_website(url, pool):
+        web_products.extend(extract_product_info(page_lines, category))
 
     #read the csv file
     local_products = read_csv_to_list_of_lists(spec_csv)
@@ -806,7 +728,7 @@ def pfv_function(url, spec_csv, price_csv, stock_csv, ff_weights,error_csv, cate
 
     #scrape the specifications of the products and update the list of products
 
-    checked_products = run_specification_scrape(updated_products)
+    checked_products = run_specification_scrape(updated_products, pool)
 
     #check if all fields are filled in
     checked = check_missing_fields(checked_products)
@@ -817,11 +739,10 @@ def pfv_function(url, spec_csv, price_csv, stock_csv, ff_weights,error_csv, cate
     ####### Computing the scores of the products
 
     #get the cpu scores
-    time.sleep(1)
-    cpu_scores = scrape_score('https://www.cpubenchmark.net/cpu_list.php')
+    cpu_scores = scrape_score('https://www.cpubenchmark.net/cpu_list.php', pool)
 
     #get the gpu scores
-    gpu_scores = scrape_score('https://www.videocardbenchmark.net/gpu_list.php')
+    gpu_scores = scrape_score('https://www.videocardbenchmark.net/gpu_list.php', pool)
 
     #Compute the product scores
     scored = compute_score(sorted_products, cpu_scores, gpu_scores, ff_weights, category)
@@ -843,24 +764,11 @@ def pfv_function(url, spec_csv, price_csv, stock_csv, ff_weights,error_csv, cate
 
     check_all_fields(final_products,error_csv)
     ##### Price Tracking
-
-    #Read existing data into dictionary
-    header, data_dict = read_csv_to_dict(price_csv)
-
-    #Update the pricing dictionary with new data
-    header, updated_data_dict = update_pricing_dict(header, data_dict, final_products)
-
-    save_dict_to_csv(header, updated_data_dict, price_csv)
-
-    header, data_dict = read_csv_to_dict(stock_csv)
-
-    header, updated_data_dict = update_stock_dict(header, data_dict, final_products)
-    save_dict_to_csv(header, updated_data_dict, stock_csv)
+    update_price_history(final_products, price_csv, stock_csv)
 
 
     #Save the updated pricing dictionary to a CSV file
     msg_queue.put("STEP 7: Saving Scraped Data to the Database\n")
-    time.sleep(2)
     msg_queue.put("STEP 7 COMPLETE: Saved Scraped Data to the Database***\n")
     msg_queue.put("------Process Completed------\n")
 
@@ -872,15 +780,17 @@ def run_pfv(list_par):
         thread.start()
     
 def pfv_inter(list_par):
-    for i in list_par:
-        url = i[0]
-        spec_csv = i[1]
-        price_csv = i[2]
-        stock_csv = i[3]
-        ff_weights = i[4]
-        errors_csv = i[5]  
-        category = i[6] 
-        pfv_function(url, spec_csv, price_csv, stock_csv, ff_weights, errors_csv, category)
+    # One browser is shared by every category instead of relaunching Chrome per step
+    with DriverPool(size=1, profile=BROWSER_PROFILE) as pool:
+        for i in list_par:
+            url = i[0]
+            spec_csv = i[1]
+            price_csv = i[2]
+            stock_csv = i[3]
+            ff_weights = i[4]
+            errors_csv = i[5]  
+            category = i[6] 
+            pfv_function(url, spec_csv, price_csv, stock_csv, ff_weights, errors_csv, category, pool)
     reset_buttons()
 
 def Notebooks():
@@ -1090,6 +1000,8 @@ progressbar.grid(row=6, column=0, columnspan=5, padx=10, pady=10)
 
 button_cancel = customtkinter.CTkButton(master=frame, text="Cancel", command=Cancel, state="disabled")
 button_cancel.grid(row=7, column=0, columnspan=5, padx=10, pady=10)
+button_export = customtkinter.CTkButton(master=frame, text="Export History", command=export_price_history, state="normal")
+button_export.grid(row=8, column=0, columnspan=5, padx=10, pady=10)
 
 root.after(100, check_queue)
 root.mainloop()
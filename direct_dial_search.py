@@ -0,0 +1,159 @@
+import json
+import logging
+import re
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from html_tags import DIRECT_DIAL_SEARCH
+
+# Listing URL query parameters that map to Algolia facets
+FACET_PARAMS = ("productType", "brand")
+
+def create_http_session(pool_size=10):
+    session = requests.Session()
+    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36",
+        "Accept-Language": "en-US,en;q=0.9",
+    })
+    return session
+
+class DirectDialSearch:
+    """Lists DirectDial products by querying its Algolia index over HTTP.
+
+    Returns the same fields DirectDialScraper reads from the rendered listing.
+    The hit field names in html_tags.DIRECT_DIAL_SEARCH have not been checked
+    against the live index, so any listing that doesn't look complete raises
+    ValueError and the scraper falls back to the browser.
+    """
+    configs = {}
+
+    def __init__(self, url, session=None, timeout=10):
+        self.url = url
+        self.session = session or create_http_session()
+        self.timeout = timeout
+
+    def fetch_products(self):
+        """Returns every product in the listing.
+
+        Raises ValueError when a hit has no SKU or URL (the field names don't
+        match the index), or when the index matched more products than it
+        returned (Algolia stops paging at paginationLimitedTo, 1000 by default).
+        """
+        products = []
+        matched = 0
+        for result in self.iter_results():
+            matched = result.get("nbHits", matched)
+            for hit in result.get("hits", []):
+                product = self.hit_to_product(hit)
+                if not product["sku"] or not product["url"]:
+                    raise ValueError(f"Search hit without a SKU or URL, hit fields: {', '.join(sorted(hit))}")
+                products.append(product)
+        if matched > len(products):
+            logging.warning(f"Search matched {matched} products but only {len(products)} could be paged through")
+            raise ValueError(f"Search results truncated at {len(products)} of {matched}")
+        return products
+
+    def iter_results(self):
+        config = self.search_config()
+        page = 0
+        while True:
+            result = self.query(config, page)
+            yield result
+            page += 1
+            if page >= result.get("nbPages", 0):
+                break
+
+    def search_config(self):
+        host = urlparse(self.url).netloc
+        if host in self.configs:
+            return self.configs[host]
+        config = {
+            "app_id": DIRECT_DIAL_SEARCH["app_id"],
+            "api_key": DIRECT_DIAL_SEARCH["api_key"],
+            "index_name": DIRECT_DIAL_SEARCH["index_name"],
+        }
+        if not all(config.values()):
+            response = self.session.get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+            config = self.discover_config(response.text, config)
+        missing = [key for key, value in config.items() if not value]
+        if missing:
+            raise ValueError(f"Could not find Algolia settings on {host}: {', '.join(missing)}")
+        self.configs[host] = config
+        return config
+
+    @classmethod
+    def discover_config(cls, html, config):
+        config = dict(config)
+        client = re.search(DIRECT_DIAL_SEARCH["client_pattern"], html)
+        if client:
+            config["app_id"] = config["app_id"] or client.group(1)
+            config["api_key"] = config["api_key"] or client.group(2)
+        for key in ("app_id", "api_key", "index_name"):
+            if not config[key]:
+                match = re.search(DIRECT_DIAL_SEARCH[f"{key}_pattern"], html)
+                config[key] = match.group(1) if match else None
+        return config
+
+    def query(self, config, page):
+        endpoint = f"https://{config['app_id']}-dsn.algolia.net/1/indexes/{config['index_name']}/query"
+        headers = {
+            "X-Algolia-Application-Id": config["app_id"],
+            "X-Algolia-API-Key": config["api_key"],
+        }
+        body = {"params": urlencode(self.search_params(page))}
+        response = self.session.post(endpoint, json=body, headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def search_params(self, page):
+        parsed = urlparse(self.url)
+        query = parse_qsl(parsed.query)
+        facets = {}
+        for key, value in query:
+            if key in FACET_PARAMS:
+                facets.setdefault(key, []).append(f"{key}:{value}")
+        facet_filters = list(facets.values())
+        category = parsed.path.split("/search/", 1)[-1].strip("/") if "/search/" in parsed.path else ""
+        if category:
+            facet_filters.append([f"{DIRECT_DIAL_SEARCH['category_attribute']}:{category}"])
+        params = {
+            "query": "",
+            "page": page,
+            "hitsPerPage": DIRECT_DIAL_SEARCH["hits_per_page"],
+            "facetFilters": json.dumps(facet_filters),
+        }
+        if ("instock", "true") in query:
+            params["numericFilters"] = json.dumps([DIRECT_DIAL_SEARCH["stock_filter"]])
+        return params
+
+    @classmethod
+    def hit_to_product(cls, hit):
+        fields = DIRECT_DIAL_SEARCH["hit_fields"]
+        price = hit.get(fields["price"], 0) or 0
+        msrp = hit.get(fields["msrp"], 0) or 0
+        url = hit.get(fields["url"], "")
+        if url and not url.startswith("http"):
+            url = "https://www.directdial.com" + url
+        try:
+            sale = round(float(msrp) - float(price), 2) if float(msrp) > float(price) else 0
+        except (TypeError, ValueError):
+            logging.warning(f"Invalid price or MSRP in search hit: {price}, {msrp}")
+            sale = 0
+        return {
+            "sku": hit.get(fields["sku"]),
+            "stock": hit.get(fields["stock"], 0),
+            "price": price,
+            "msrp": msrp,
+            "rebate": hit.get(fields["rebate"], 0) or 0,
+            "sale": sale,
+            "brand": hit.get(fields["brand"], 0),
+            "url": url,
+        }
@@ -1,21 +1,301 @@
-
 from selenium_stealth import stealth
 import undetected_chromedriver as uc
+from contextlib import contextmanager
+import logging
+import queue
+import threading
+
+# Browser launch settings. "desktop" is a normal windowed Chrome for runs
+# someone watches. "server" is headless (uc starts it with --headless=new), so
+# it needs no X display or framebuffer. It skips the GPU process and keeps
+# one renderer per site, with a capped JS heap, so several browsers fit in
+# the memory of a small Linux box.
+BROWSER_PROFILES = {
+    "desktop": {
+        "headless": False,
+        "arguments": [],
+    },
+    "server": {
+        "headless": True,
+        "arguments": [
+            "--disable-gpu",
+            "--disable-software-rasterizer",
+            "--disable-dev-shm-usage",
+            "--process-per-site",
+            "--renderer-process-limit=2",
+            "--js-flags=--max-old-space-size=256",
+            "--disable-extensions",
+            "--disable-background-networking",
+            "--mute-audio",
+            "--window-size=1366,900",
+        ],
+    },
+}
+
+# Lean mode: requests the scrapers never read are refused by the browser
+# (CDP Network.setBlockedURLs) so detail pages load only HTML, CSS and scripts.
+# Off unless a scraper is created with lean=True, once its extraction has been
+# checked against the blocked page.
+LEAN_BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico", "*.bmp",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.mp3", "*.m3u8", "*.ogg",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*",
+    "*googleadservices.com*", "*facebook.net*", "*facebook.com/tr*", "*connect.facebook*", "*bat.bing.com*",
+    "*clarity.ms*", "*hotjar.com*", "*criteo.*", "*quantserve.com*", "*scorecardresearch.com*",
+    "*adsrvr.org*", "*taboola.com*", "*outbrain.com*", "*linkedin.com/px*", "*snap.licdn.com*",
+    "*tiktok.com/i18n/pixel*", "*pinimg.com*", "*newrelic.com*", "*nr-data.net*", "*demdex.net*",
+    "*omtrdc.net*", "*everesttech.net*", "*rlcdn.com*", "*bluekai.com*", "*krxd.net*", "*yottaa.net*",
+]
+
+# Every Nth lean page per browser is loaded in full so the logs can report the bytes lean mode saves
+LEAN_BASELINE_EVERY = 50
+
+# Patterns a site still needs (its specs render from them); they are left out
+# of that site's block list. For example "cdw": ["*.svg"].
+LEAN_ALLOW = {}
+
+# Resource Timing keeps 250 entries by default, fewer than a full product page loads
+RESOURCE_BUFFER_SCRIPT = "performance.setResourceTimingBufferSize(2000);"
+PAGE_BYTES_SCRIPT = """
+const entries = performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'));
+return [entries.reduce((total, entry) => total + (entry.transferSize || 0), 0), entries.length];
+"""
+
+def create_driver(profile="desktop"):
+    settings = BROWSER_PROFILES[profile]
+    options = uc.ChromeOptions()
+    options.headless = settings["headless"]
+    for argument in settings["arguments"]:
+        options.add_argument(argument)
+    driver = uc.Chrome(use_subprocess=True, options=options)
+    stealth(driver,
+            languages=["en-US", "en"],
+            vendor="Google Inc.",
+            platform="Win32",
+            webgl_vendor="Intel Inc.",
+            renderer="Intel Iris OpenGL Engine",
+            fix_hairline=True)
+    return driver
+
+def lean_patterns(site):
+    allowed = set(LEAN_ALLOW.get(site, []))
+    return [pattern for pattern in LEAN_BLOCKED_URLS if pattern not in allowed]
+
+def set_lean_mode(driver, site=None, lean=False):
+    """Tags the browser with the site it is loading and blocks that site's lean-mode patterns, or nothing."""
+    driver.site = site
+    lean_site = site if lean else None
+    if getattr(driver, "lean_site", None) == lean_site:
+        return
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": lean_patterns(lean_site) if lean_site else []})
+    driver.lean_site = lean_site
+
+class PageWeights:
+    """Bytes transferred per page load (as Resource Timing reports them), by site and lean or full mode."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals = {}
+
+    def record(self, site, lean, transferred, resources):
+        with self.lock:
+            total = self.totals.setdefault((site, lean), [0, 0, 0])
+            total[0] += 1
+            total[1] += transferred
+            total[2] += resources
+
+    def average(self, site, lean):
+        with self.lock:
+            total = self.totals.get((site, lean))
+        return self.mean(total)
+
+    @classmethod
+    def mean(cls, total):
+        pages, transferred, _ = total or (0, 0, 0)
+        return transferred / pages if pages else None
+
+    def report(self):
+        with self.lock:
+            totals = {key: list(total) for key, total in self.totals.items()}
+        for site in sorted({site for site, _ in totals}, key=str):
+            lean, full = (self.mean(totals.get((site, mode))) for mode in (True, False))
+            pages = sum(totals.get((site, mode), (0,))[0] for mode in (True, False))
+            message = f"{site or 'unassigned'}: {pages} pages"
+            if full is not None:
+                message += f", {full / 1024:.0f} KB per full page"
+            if lean is not None:
+                message += f", {lean / 1024:.0f} KB per lean page"
+            if lean is not None and full is not None:
+                message += f", {(full - lean) / 1024:.0f} KB saved per page"
+            logging.info(message)
+
+page_weights = PageWeights()
+
+def track_pages(driver):
+    """Counts page loads on a driver and records the bytes each one transferred."""
+    get = driver.get
+    def counting_get(url):
+        driver.pages_loaded += 1
+        if url == "about:blank":
+            return get(url)
+        lean_site = getattr(driver, "lean_site", None)
+        baseline = lean_site is not None and driver.pages_loaded % LEAN_BASELINE_EVERY == 0
+        if baseline:
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": []})
+        try:
+            result = get(url)
+        finally:
+            if baseline:
+                driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": lean_patterns(lean_site)})
+        try:
+            transferred, resources = driver.execute_script(PAGE_BYTES_SCRIPT)
+            page_weights.record(getattr(driver, "site", None), lean_site is not None and not baseline,
+                                transferred, resources)
+            logging.debug(f"{url}: {transferred / 1024:.0f} KB in {resources} requests")
+        except Exception as e:
+            logging.debug(f"Could not measure page weight for {url}: {e}")
+        return result
+    driver.pages_loaded = 0
+    driver.get = counting_get
+    try:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": RESOURCE_BUFFER_SCRIPT})
+    except Exception as e:
+        logging.debug(f"Could not enlarge the resource timing buffer: {e}")
 
 class DriverManager:
+    """Hands out a browser for the duration of a with-block.
+
+    Without a pool a fresh browser is launched and quit on exit. With a pool
+    a browser is borrowed from it and given back on exit instead. With
+    `lean` set the browser blocks `site`'s lean-mode patterns while held.
+    """
+    def __init__(self, pool=None, profile="desktop", site=None, lean=False):
+        self.pool = pool
+        self.profile = profile
+        self.site = site
+        self.lean = lean
+        self.driver = None
+
     def __enter__(self):
-        options = uc.ChromeOptions()
-        options.headless = False
-        self.driver = uc.Chrome(use_subprocess=True, options=options)
-        stealth(self.driver,
-                languages=["en-US", "en"],
-                vendor="Google Inc.",
-                platform="Win32",
-                webgl_vendor="Intel Inc.",
-                renderer="Intel Iris OpenGL Engine",
-                fix_hairline=True)
+        if self.pool:
+            self.driver = self.pool.acquire()
+        else:
+            self.driver = create_driver(self.profile)
+            track_pages(self.driver)
+        set_lean_mode(self.driver, self.site, self.lean)
         return self.driver
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.driver:
-            self.driver.quit()
\ No newline at end of file
+            if self.pool:
+                self.pool.release(self.driver)
+            else:
+                self.driver.quit()
+            self.driver = None
+
+class DriverPool:
+    """Keeps up to `size` stealth browsers alive for a whole run.
+
+    Browsers are launched as they are first needed, so a pool nobody borrows
+    from costs nothing. They are reset (cookies, extra tabs) when returned and
+    replaced by a fresh one once they have loaded `max_pages` pages.
+    """
+    def __init__(self, size=1, max_pages=200, profile="desktop"):
+        self.size = size
+        self.max_pages = max_pages
+        self.profile = profile
+        self.idle = queue.Queue()
+        self.drivers = []
+        self.starting = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def launch(self):
+        driver = create_driver(self.profile)
+        track_pages(driver)
+        with self.lock:
+            self.drivers.append(driver)
+        return driver
+
+    def acquire(self, timeout=None):
+        while True:
+            with self.lock:
+                launch = self.idle.empty() and len(self.drivers) + self.starting < self.size
+                if launch:
+                    self.starting += 1
+            if not launch:
+                driver = self.idle.get(timeout=timeout)
+                if driver is None:
+                    # A browser was lost and not replaced; its slot is free to launch into
+                    continue
+                return driver
+            try:
+                return self.launch()
+            finally:
+                with self.lock:
+                    self.starting -= 1
+
+    def release(self, driver):
+        if driver.pages_loaded >= self.max_pages:
+            logging.info(f"Recycling browser after {driver.pages_loaded} pages")
+            self.replace(driver)
+            return
+        try:
+            self.reset(driver)
+        except Exception as e:
+            logging.warning(f"Browser reset failed, replacing it: {e}")
+            self.replace(driver)
+            return
+        self.idle.put(driver)
+
+    def replace(self, driver):
+        self.retire(driver)
+        try:
+            driver = self.launch()
+        except Exception as e:
+            logging.error(f"Could not start a replacement browser: {e}")
+            # Wakes anyone waiting in acquire() so they launch into the freed slot themselves
+            driver = None
+        self.idle.put(driver)
+
+    def reset(self, driver):
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        driver.delete_all_cookies()
+        driver.get("about:blank")
+        driver.pages_loaded -= 1
+
+    def retire(self, driver):
+        with self.lock:
+            if driver in self.drivers:
+                self.drivers.remove(driver)
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.warning(f"Error closing browser: {e}")
+
+    @contextmanager
+    def driver(self, site=None, lean=False):
+        driver = self.acquire()
+        try:
+            set_lean_mode(driver, site, lean)
+            yield driver
+        finally:
+            self.release(driver)
+
+    def close(self):
+        with self.lock:
+            drivers = list(self.drivers)
+        for driver in drivers:
+            self.retire(driver)
+        while not self.idle.empty():
+            self.idle.get_nowait()
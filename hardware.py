@@ -1,14 +1,14 @@
-from sqlalchemy import create_engine, Column, String, Float
+from sqlalchemy import Column, String, Float, Integer, delete, select, update, bindparam
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-import undetected_chromedriver as uc
-from bs4 import BeautifulSoup
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
-from selenium_stealth import stealth
+import lxml.html
+from database import get_engine, get_session_factory
+from driver_manager import DriverManager
+from pacing import get_pacer
+import hashlib
 
 Base = declarative_base()
 
@@ -26,11 +26,29 @@ class CPU(Hardware):
 class GPU(Hardware):
     __tablename__ = 'gpus'
 
+class HardwareMatch(Base):
+    """A product's raw CPU/GPU string resolved to a benchmark entry.
+
+    Rows are only valid for the matcher version and benchmark list they were
+    computed against.
+    """
+    __tablename__ = 'hardware_matches'
+    kind = Column("kind", String, primary_key=True)
+    raw_name = Column("raw name", String, primary_key=True)
+    matcher_version = Column("matcher version", String, primary_key=True)
+    list_version = Column("list version", String)
+    matched_name = Column("matched name", String)
+    score = Column("score", Float)
+    confidence = Column("confidence", Integer)
+
+    def __repr__(self):
+        return f"HardwareMatch({self.kind}, {self.raw_name} -> {self.matched_name}, {self.score})"
+
 class HardwareManager:
     def __init__(self, db_url):
-        self.engine = create_engine(db_url, echo=False)
+        self.engine = get_engine(db_url)
         Base.metadata.create_all(self.engine)
-        self.Session = sessionmaker(bind=self.engine)
+        self.Session = get_session_factory(db_url)
 
     def get_session(self):
         return self.Session()
@@ -51,6 +69,91 @@ class HardwareManager:
         finally:
             session.close()
 
+    def sync_hardware(self, hardware_class, scores, min_keep=0.9):
+        """Makes the hardware_class table match {name: score} in one transaction.
+
+        Rows missing from `scores` are only removed when `scores` has at least
+        `min_keep` times as many entries as the table, so a truncated scrape
+        adds and updates but doesn't wipe the list. Returns the number of rows
+        added, changed and removed.
+        """
+        table = hardware_class.__table__
+        counts = {"added": 0, "changed": 0, "removed": 0}
+        try:
+            with self.engine.begin() as connection:
+                existing = dict(connection.execute(select(table.c.name, table.c.score)).all())
+                added = [{"name": name, "score": score} for name, score in scores.items() if name not in existing]
+                changed = [{"old_name": name, "new_score": score} for name, score in scores.items()
+                           if name in existing and existing[name] != score]
+                removed = [{"old_name": name} for name in existing if name not in scores]
+                if removed and len(scores) < min_keep * len(existing):
+                    print(f"Only {len(scores)} {table.name} scores for {len(existing)} stored, "
+                          f"keeping the {len(removed)} rows missing from the scrape")
+                    removed = []
+                if added:
+                    connection.execute(insert(table), added)
+                if changed:
+                    connection.execute(update(table).where(table.c.name == bindparam("old_name"))
+                                       .values(score=bindparam("new_score")), changed)
+                if removed:
+                    connection.execute(delete(table).where(table.c.name == bindparam("old_name")), removed)
+            counts.update(added=len(added), changed=len(changed), removed=len(removed))
+        except Exception as e:
+            print(f"Error syncing {table.name}: {e}")
+        return counts
+
+    @classmethod
+    def list_version(cls, scores):
+        """Fingerprints a benchmark list given as a {name: score} dict or (name, score) pairs."""
+        items = scores.items() if isinstance(scores, dict) else scores
+        digest = hashlib.sha1()
+        for name, score in sorted((str(name), str(score)) for name, score in items):
+            digest.update(f"{name}\t{score}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def get_matches(self, kind, matcher_version, list_version):
+        """Returns cached {raw name: (matched name, score, confidence)} for the current list."""
+        # Runs on its own connection so callers' sessions (and loaded CPU/GPU rows) are left alone
+        table = HardwareMatch.__table__
+        try:
+            with self.engine.begin() as connection:
+                # Matches made against an older benchmark list are dropped
+                connection.execute(delete(table).where(table.c.kind == kind,
+                                                       table.c["matcher version"] == matcher_version,
+                                                       table.c["list version"] != list_version))
+                rows = connection.execute(select(table).where(table.c.kind == kind,
+                                                              table.c["matcher version"] == matcher_version))
+                return {row._mapping["raw name"]: (row._mapping["matched name"], row._mapping["score"], row._mapping["confidence"])
+                        for row in rows}
+        except Exception as e:
+            print(f"Error retrieving {kind} matches: {e}")
+            return {}
+
+    def save_matches(self, kind, matcher_version, list_version, matches):
+        rows = [{"kind": kind, "raw name": raw_name, "matcher version": matcher_version, "list version": list_version,
+                 "matched name": matched_name, "score": score, "confidence": confidence}
+                for raw_name, (matched_name, score, confidence) in matches.items()]
+        if not rows:
+            return
+        statement = insert(HardwareMatch.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=["kind", "raw name", "matcher version"],
+            set_={name: statement.excluded[name] for name in ("list version", "matched name", "score", "confidence")})
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(statement, rows)
+        except Exception as e:
+            print(f"Error saving {kind} matches: {e}")
+
+    def invalidate_matches(self, kind):
+        table = HardwareMatch.__table__
+        try:
+            with self.engine.begin() as connection:
+                return connection.execute(delete(table).where(table.c.kind == kind)).rowcount
+        except Exception as e:
+            print(f"Error clearing {kind} matches: {e}")
+            return 0
+
     def get_all_hardware_scores(self, hardware_type):
         session = self.get_session()
         try:
@@ -64,35 +167,47 @@ class HardwareManager:
             session.close()
 
 class HardwareScraper:
-    def __init__(self, url):
+    def __init__(self, url, pool=None, profile="server", lean=False):
         self.url = url
+        self.pool = pool
+        self.profile = profile
+        self.lean = lean
 
     def scrape_hardware(self):
         print(f"Scraping Hardware Scores from: {self.url}")
-        options = uc.ChromeOptions() 
-        options.headless = True
-        driver = uc.Chrome(use_subprocess=True, options=options)
-        stealth(driver,
-            languages=["en-US", "en"],
-            vendor="Google Inc.",
-            platform="Win32",
-            webgl_vendor="Intel Inc.",
-            renderer="Intel Iris OpenGL Engine",
-            fix_hairline=True) 
-        driver.get(self.url)
-        wait = WebDriverWait(driver, 20)
-        item_table = wait.until(EC.visibility_of_element_located((By.ID, 'cputable')))
-        item_html = item_table.get_attribute("innerHTML")
-        driver.close()
-        soup = BeautifulSoup(item_html, 'lxml')
-        hardware = soup.find('tbody').find_all('tr')
-        for item in hardware:
-            name = item.find('a').text.split('@')[0].strip() if item.find('a') else None
-            score = int(item.find_all('td')[1].text.replace(',', '')) if len(item.find_all('td')) > 1 else None
+        with DriverManager(self.pool, profile=self.profile, site="passmark", lean=self.lean) as driver:
+            get_pacer("passmark").get(driver, self.url)
+            wait = WebDriverWait(driver, 20)
+            item_table = wait.until(EC.visibility_of_element_located((By.ID, 'cputable')))
+            item_html = item_table.get_attribute("innerHTML")
+        scores = self.parse_hardware(item_html)
+        if not scores:
+            print("No hardware rows found, keeping the current list")
+            return
+        kind, hardware_class = ('cpu', CPU) if 'cpu' in self.url else ('gpu', GPU)
+        hardware_manager = HardwareManager('sqlite:///hardware.db')
+        counts = hardware_manager.sync_hardware(hardware_class, scores)
+        if any(counts.values()):
+            # A new benchmark list makes every cached product match stale
+            hardware_manager.invalidate_matches(kind)
+        print(f"Scraping Complete: {len(scores)} {kind.upper()}s, {counts['added']} added, "
+              f"{counts['changed']} changed, {counts['removed']} removed")
+
+    @classmethod
+    def parse_hardware(cls, item_html):
+        """Returns {name: score} for every row of a PassMark cputable."""
+        table = lxml.html.fromstring(f"<table>{item_html}</table>")
+        scores = {}
+        for row in table.iterfind('.//tbody/tr'):
+            link = row.find('.//a')
+            cells = row.findall('td')
+            if link is None or len(cells) < 2:
+                continue
+            name = link.text_content().split('@')[0].strip()
+            try:
+                score = int(cells[1].text_content().replace(',', ''))
+            except ValueError:
+                continue
             if name and score:
-                hardware_manager = HardwareManager('sqlite:///hardware.db')
-                if 'cpu' in self.url:
-                    hardware_manager.add_hardware(name, score, CPU)
-                elif 'gpu' in self.url:
-                    hardware_manager.add_hardware(name, score, GPU)
-        print("Scraping Complete")
\ No newline at end of file
+                scores[name] = score
+        return scores
\ No newline at end of file
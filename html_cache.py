@@ -0,0 +1,155 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+class HtmlCache:
+    """Keeps the HTML scrapers read from product pages so specs can be re-parsed offline.
+
+    Pages are stored zlib-compressed under the SHA-256 of their content, so a
+    page that hasn't changed between fetches is stored once. A small SQLite
+    index records which URL was fetched when and which blob it produced.
+    Fetches older than `max_age_days` are dropped, then the oldest fetches
+    until the blobs fit in `max_bytes`. The directory and index are created
+    by the first `put`, so a scraper that never caches a page leaves no trace.
+    Blob files are written, read and removed under the same lock as the index,
+    so an eviction can't delete a blob a concurrent fetch has just pointed at.
+    """
+    def __init__(self, directory="html_cache", max_bytes=512 * 1024 * 1024, max_age_days=90):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def index(self, create=False):
+        """The index connection, opened on first use; None while nothing is cached unless `create`. Hold the lock."""
+        if self.connection is None:
+            path = os.path.join(self.directory, "index.db")
+            if not create and not os.path.exists(path):
+                return None
+            os.makedirs(self.directory, exist_ok=True)
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            with self.connection:
+                self.connection.execute("PRAGMA journal_mode=WAL")
+                self.connection.execute("CREATE TABLE IF NOT EXISTS fetches (url TEXT, fetched_at REAL, digest TEXT, PRIMARY KEY (url, fetched_at))")
+                self.connection.execute("CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER)")
+                self.connection.execute("CREATE INDEX IF NOT EXISTS ix_fetches_digest ON fetches (digest)")
+                self.connection.execute("CREATE INDEX IF NOT EXISTS ix_fetches_fetched_at ON fetches (fetched_at)")
+        return self.connection
+
+    def blob_path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest + ".z")
+
+    def put(self, url, html, fetched_at=None):
+        data = html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        with self.lock:
+            connection = self.index(create=True)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                compressed = zlib.compress(data, 6)
+                # Write then rename so a crash never leaves a truncated blob behind
+                temporary = f"{path}.{threading.get_ident()}.tmp"
+                with open(temporary, "wb") as file:
+                    file.write(compressed)
+                os.replace(temporary, path)
+                size = len(compressed)
+            else:
+                size = os.path.getsize(path)
+            with connection:
+                connection.execute("INSERT OR IGNORE INTO blobs (digest, size) VALUES (?, ?)", (digest, size))
+                connection.execute("INSERT OR REPLACE INTO fetches (url, fetched_at, digest) VALUES (?, ?, ?)",
+                                   (url, fetched_at or time.time(), digest))
+        return digest
+
+    def get(self, url):
+        """Returns the most recently fetched HTML for a URL, or None."""
+        with self.lock:
+            connection = self.index()
+            if connection is None:
+                return None
+            row = connection.execute("SELECT digest FROM fetches WHERE url = ? ORDER BY fetched_at DESC LIMIT 1",
+                                     (url,)).fetchone()
+            if row is None:
+                return None
+            html = self.read(row[0])
+            if html is None:
+                # A blob removed behind the cache's back is a miss; forget it so the page is fetched again
+                with connection:
+                    connection.execute("DELETE FROM fetches WHERE digest = ?", (row[0],))
+                    connection.execute("DELETE FROM blobs WHERE digest = ?", (row[0],))
+            return html
+
+    def pages(self, limit=None):
+        """Returns (url, html) for the latest fetch of each cached URL, up to `limit` of them."""
+        with self.lock:
+            connection = self.index()
+            if connection is None:
+                return []
+            # SQLite takes the bare digest column from the row holding MAX(fetched_at)
+            rows = connection.execute("SELECT url, digest, MAX(fetched_at) FROM fetches GROUP BY url ORDER BY url LIMIT ?",
+                                           (-1 if limit is None else limit,)).fetchall()
+        pages = []
+        for url, digest, _ in rows:
+            html = self.read(digest)
+            if html is not None:
+                pages.append((url, html))
+        return pages
+
+    def read(self, digest):
+        try:
+            with open(self.blob_path(digest), "rb") as file:
+                return zlib.decompress(file.read()).decode("utf-8")
+        except (OSError, zlib.error) as e:
+            logging.warning(f"Unreadable cached page {digest}: {e}")
+            return None
+
+    def evict(self):
+        """Applies the age and size limits. Returns the number of blobs removed."""
+        cutoff = time.time() - self.max_age_days * 86400
+        with self.lock:
+            connection = self.index()
+            if connection is None:
+                return 0
+            with connection:
+                orphans = self.evict_rows(connection, cutoff)
+            for digest in orphans:
+                try:
+                    os.remove(self.blob_path(digest))
+                except OSError:
+                    pass
+        if orphans:
+            logging.info(f"Evicted {len(orphans)} cached pages")
+        return len(orphans)
+
+    def evict_rows(self, connection, cutoff):
+        """Drops expired and over-budget fetches from the index and returns the digests no fetch uses any more."""
+        connection.execute("DELETE FROM fetches WHERE fetched_at < ?", (cutoff,))
+        # Blobs by the last time any URL produced them, oldest first
+        blobs = connection.execute(
+            "SELECT blobs.size, MAX(fetches.fetched_at) FROM blobs JOIN fetches ON fetches.digest = blobs.digest "
+            "GROUP BY blobs.digest ORDER BY 2").fetchall()
+        total = sum(size for size, _ in blobs)
+        cutoff = None
+        for size, last_fetched in blobs:
+            if total <= self.max_bytes:
+                break
+            total -= size
+            cutoff = last_fetched
+        if cutoff is not None:
+            connection.execute("DELETE FROM fetches WHERE fetched_at <= ?", (cutoff,))
+        orphans = [row[0] for row in connection.execute(
+            "SELECT digest FROM blobs WHERE digest NOT IN (SELECT digest FROM fetches)").fetchall()]
+        connection.executemany("DELETE FROM blobs WHERE digest = ?", [(digest,) for digest in orphans])
+        return orphans
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
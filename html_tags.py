@@ -11,4 +11,86 @@ DIRECT_DIAL = {
     "pagination_stats": ".ais-Stats",
     "site_content": ".site-content",
     "specification_tab": 'tab-specification',
-}
\ No newline at end of file
+}
+
+# The DirectDial listing is an Algolia InstantSearch page. These settings let
+# direct_dial_search query the same index over plain HTTP. Credentials are read
+# from the listing page unless they are filled in here.
+DIRECT_DIAL_SEARCH = {
+    "app_id": None,
+    "api_key": None,
+    "index_name": None,
+    "client_pattern": r'algoliasearch\(\s*["\']([A-Z0-9]{10})["\']\s*,\s*["\']([a-f0-9]{32})["\']',
+    "app_id_pattern": r'(?:appId|applicationId|app_id|ALGOLIA_APP_ID)["\']?\s*[:=,]\s*["\']([A-Z0-9]{10})["\']',
+    "api_key_pattern": r'(?:apiKey|searchKey|search_api_key|ALGOLIA_SEARCH_KEY)["\']?\s*[:=,]\s*["\']([a-f0-9]{32})["\']',
+    "index_name_pattern": r'indexName["\']?\s*[:=]\s*["\']([\w\-]+)["\']',
+    "hits_per_page": 200,
+    "category_attribute": "categories",
+    "stock_filter": "stock > 0",
+    "hit_fields": {
+        "sku": "item_num",
+        "price": "price",
+        "msrp": "msrp",
+        "stock": "stock",
+        "rebate": "instant_rebate",
+        "brand": "brand",
+        "url": "url",
+    },
+}
+
+# Spec tab rules, compiled once per scraper by spec_fields.SpecFieldMap. Rows
+# are the elements matching row_xpath, and their cell_tag elements are the
+# label and value. Fields are filled in order: "method"
+# hands the rows to the scraper's extract_* classmethod, "labels" takes the
+# first label present (the first non-empty one with skip_empty), "capacity"
+# turns GB/TB into GB and "yes_if_contains" reduces the value to Yes/No.
+DIRECT_DIAL_SPECS = {
+    "row_xpath": "//tr",
+    "cell_tag": "td",
+    "label_strip": ":",
+    "fields": {
+        "name": {"method": "extract_name", "args": ["sku"]},
+        "form_factor": {"method": "extract_form_factor", "args": ["type"]},
+        "cpu": {"method": "extract_cpu"},
+        "gpu": {"method": "extract_gpu"},
+        "storage": {"labels": ["Total Solid State Drive Capacity", "Flash Memory Capacity"], "skip_empty": True, "capacity": True},
+        "ram": {"method": "extract_ram"},
+        "keyboard": {"labels": ["Keyboard Localization"]},
+        "warranty": {"method": "extract_warranty"},
+        "ddr": {"method": "extract_ddr"},
+        "os": {"labels": ["Operating System Platform"]},
+        "ethernet": {"labels": ["Ethernet Technology"]},
+        "wifi": {"labels": ["Wireless LAN"]},
+        "screen_resolution": {"labels": ["Screen Mode"]},
+        "screen_type": {"labels": ["Display Screen Type"]},
+        "screen_size": {"labels": ["Screen Size"]},
+        "touch": {"labels": ["Touchscreen"]},
+    },
+}
+
+# Insight's specification tab uses the same table markup and labels
+INSIGHT_SPECS = DIRECT_DIAL_SPECS
+
+CDW_SPECS = {
+    "row_xpath": "//div[contains(concat(' ', normalize-space(@class), ' '), ' panel-row ')]",
+    "cell_tag": "span",
+    "fields": {
+        "brand": {"method": "extract_brand"},
+        "name": {"method": "extract_name", "args": ["brand"]},
+        "form_factor": {"method": "extract_form_factor", "args": ["type"]},
+        "cpu": {"method": "extract_cpu"},
+        "gpu": {"method": "extract_gpu"},
+        "storage": {"labels": ["Hard Drive Capacity"], "skip_empty": True, "capacity": True},
+        "ram": {"method": "extract_ram"},
+        "keyboard": {"labels": ["Keyboard Localization"]},
+        "warranty": {"method": "extract_warranty"},
+        "ddr": {"method": "extract_ddr"},
+        "os": {"labels": ["Operating System"], "skip_empty": True},
+        "ethernet": {"labels": ["Data Link Protocols"], "yes_if_contains": ["ethernet"]},
+        "wifi": {"labels": ["Wireless LAN"], "yes_if_contains": ["802", "yes"]},
+        "screen_resolution": {"labels": ["Display Resolution Abbreviation", "Native Resolution"], "skip_empty": True},
+        "screen_type": {"labels": ["TFT Technology"]},
+        "screen_size": {"method": "extract_screen_size"},
+        "touch": {"labels": ["Touchscreen"], "skip_empty": True},
+    },
+}
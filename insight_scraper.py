@@ -3,15 +3,16 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
 from selenium.webdriver.support.ui import Select
-import undetected_chromedriver as uc
-import time
 from datetime import datetime
-from products import ProductManager, Product
+from products import ProductManager, Product, ScanWorkList
 from bs4 import BeautifulSoup
-from hardware import HardwareManager, CPU, GPU
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
-from selenium_stealth import stealth
+from database import get_session_factory
+from driver_manager import DriverManager
+from html_cache import HtmlCache
+from pacing import get_pacer
+from html_tags import INSIGHT_SPECS
+from spec_fields import SpecFieldMap
+from metrics import run_metrics
 import re
 import traceback
 import logging
@@ -19,17 +20,24 @@ import math
 
 
 class InsightScraper:
-    def __init__(self, url):
+    def __init__(self, url, pool=None, html_cache=None, lean=False, profile="desktop"):
         self.url = url
+        self.lean = lean
+        self.profile = profile
+        self.pool = pool
+        self.db = 'sqlite:///insight_ca.db'
+        self.product_manager = ProductManager(self.db)
+        self.html_cache = html_cache or HtmlCache()
+        self.pacer = get_pacer("insight")
 
     def scrape_product_page(self):
         print('Scraping product page')
-        driver = self.setup_driver()
-        self.navigate_to_page(driver, self.url)
-        #self.page_setup(driver)
-        item = '.c-search-products'
-        self.wait_for_elements(driver, item, timeout=5)
-        products_html = self.extract_html(driver)
+        with DriverManager(self.pool, profile=self.profile, site="insight", lean=self.lean) as driver:
+            self.navigate_to_page(driver, self.url)
+            #self.page_setup(driver)
+            item = '.c-search-products'
+            self.wait_for_elements(driver, item, timeout=5)
+            products_html = self.extract_html(driver)
         #num_pages = self.pagination(driver)
         #print(f"Number of pages: {num_pages}")
         #while num_pages > 1:
@@ -42,24 +50,11 @@ class InsightScraper:
         #    self.wait_for_elements(driver, item, timeout=5)
         #    products_html += self.extract_html(driver)
         #    num_pages -= 1
-        driver.quit()
         self.extract_product_info(products_html)
 
-    def setup_driver(self):
-        options = uc.ChromeOptions()
-        options.headless = False
-        driver = uc.Chrome(use_subprocess=True, options=options)
-        stealth(driver,
-            languages=["en-US", "en"],
-            vendor="Google Inc.",
-            platform="Win32",
-            webgl_vendor="Intel Inc.",
-            renderer="Intel Iris OpenGL Engine",
-            fix_hairline=True)
-        return driver
-
     def navigate_to_page(self, driver, url):
-        driver.get(url)
+        if not self.pacer.get(driver, url):
+            logging.warning(f"Challenge page at {url}")
 
     def page_setup(self, driver):
         item = '.gridlist-view-button'
@@ -67,24 +62,25 @@ class InsightScraper:
         driver.find_element(By.XPATH, '//*[@id="list-btn-top"]').click()
         item = ".ais-HitsPerPage"
         self.wait_for_elements(driver, item, timeout=5)
-        time.sleep(2)
+        WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.XPATH, '//*[@id="hits-per-page"]/div/select')))
         dropdown = Select(driver.find_element(By.XPATH, '//*[@id="hits-per-page"]/div/select'))
         dropdown.select_by_value("60")
         item = '.products'
         self.wait_for_elements(driver, item, timeout=5)
-        time.sleep(2)
 
     def wait_for_elements(self, driver, item_class, timeout):
         wait = WebDriverWait(driver, timeout)
-        wait.until(lambda driver: driver.execute_script("return document.readyState") == "complete")
-        wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, item_class)))
-        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, item_class)))
+        with run_metrics.timer("wait", "insight"):
+            wait.until(lambda driver: driver.execute_script("return document.readyState") == "complete")
+            wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, item_class)))
+            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, item_class)))
 
     def extract_html(self, driver):
-        self.wait_for_elements(driver, '.c-search-products', timeout=5)
-        time.sleep(5)
-        container = driver.find_element(By.CLASS_NAME, 'c-search-products')
-        return container.get_attribute("innerHTML")
+        # The result cards are filled in after the container appears
+        self.wait_for_elements(driver, '.c-search-products .c-list-item', timeout=10)
+        with run_metrics.timer("extract", "insight"):
+            container = driver.find_element(By.CLASS_NAME, 'c-search-products')
+            return container.get_attribute("innerHTML")
     
     def pagination(self, driver):
         self.wait_for_elements(driver, ".ais-Stats", timeout=5)
@@ -106,149 +102,162 @@ class InsightScraper:
         test = soup.find('div', class_="c-list-item__product-details__info")
         products = soup.find_all('div', class_="c-list-item")
         products = products[:5]
-        for product in products:
-            sku = self.extract_sku(product)
-            price = self.extract_price(product)
-            url = self.extract_url(product)
-            updated = datetime.now().strftime("%m/%d/%Y")
-            discovered = datetime.now().strftime("%m/%d/%Y")
-            product_manager = ProductManager('sqlite:///insight_ca.db')
-            if "notebook" in self.url or "laptop" in self.url:
-                type = "notebook"
-            elif "desktop" in self.url:
-                type = "desktop"
-            elif 'workstation' in self.url:
-                type = "workstation"
-            else:
-                type = "N/A"
-            product_manager.add_cdw_product(sku, price, type, url, updated, discovered)
-
-    def scrape_individual_products(self):
-        engine = create_engine('sqlite:///insight_ca.db')
-        session = sessionmaker(bind=engine)()
-        driver = self.setup_driver()
-        while True:
-            num_products = session.query(Product).filter_by(scanned=False).count()
-            if num_products == 0:
-                print("All products have been scanned.")
-                break
-            print(f"Remaining products to scan: {num_products}")
-            products = session.query(Product).filter_by(scanned=False).yield_per(1)
-            for product in products:
-                print(f"Scanning product {product.sku}")
-                self.scan_product(driver, product, session)
-        driver.quit()
-        session.close()
+        updated = datetime.now().strftime("%m/%d/%Y")
+        discovered = datetime.now().strftime("%m/%d/%Y")
+        if "notebook" in self.url or "laptop" in self.url:
+            type = "notebook"
+        elif "desktop" in self.url:
+            type = "desktop"
+        elif 'workstation' in self.url:
+            type = "workstation"
+        else:
+            type = "N/A"
+        rows = [{
+            'sku': self.extract_sku(product),
+            'price': self.extract_price(product),
+            'type': type,
+            'url': self.extract_url(product),
+            'updated': updated,
+            'discovered': discovered,
+        } for product in products]
+        with run_metrics.timer("commit", "insight", items=len(rows)):
+            self.product_manager.upsert_products(rows)
+
+    def scrape_individual_products(self, batch_size=10):
+        work_list = ScanWorkList('sqlite:///insight_ca.db')
+        with DriverManager(self.pool, profile=self.profile, site="insight", lean=self.lean) as driver:
+            while True:
+                num_products = work_list.remaining()
+                if num_products == 0:
+                    print("All products have been scanned.")
+                    break
+                print(f"Remaining products to scan: {num_products}")
+                for job in work_list.jobs(batch_size):
+                    print(f"Scanning product {job[0]}")
+                    with run_metrics.item(job[0]):
+                        self.scan_product(driver, job, work_list)
+                if work_list.remaining() == num_products:
+                    logging.warning(f"No progress scanning the last {num_products} products, stopping")
+                    break
+                work_list.restart()
+        self.html_cache.evict()
         logging.info("Scanning complete")
 
-    def scan_product(self, driver, product, session):
+    def reparse_from_cache(self):
+        """Rebuilds the specs of every product with a cached spec page, without a browser."""
+        Session = get_session_factory(self.db)
+        rows = []
+        with Session() as session:
+            for product in session.query(Product).all():
+                specs_html = self.html_cache.get(product.url)
+                if specs_html is None:
+                    continue
+                specs = self.parse_product_specs(specs_html, product.type, product.sku)
+                rows.append(self.scanned_row(product.sku, specs))
+        # One bulk update for the whole catalogue instead of a commit per product
+        self.product_manager.update_products(rows)
+        reparsed = len(rows)
+        logging.info(f"Re-parsed {reparsed} products from the HTML cache")
+        return reparsed
+
+    def scan_product(self, driver, job, work_list):
+        sku, url, type = job
         try:
-            url = product.url
             specs = {}
-            driver.get(url)
-            time.sleep(2)
+            if not self.pacer.get(driver, url):
+                logging.warning(f"Challenge page for product {sku}, leaving it for the next pass")
+                return
             item_class=".site-content"
             try:
                 self.wait_for_elements(driver, item_class, timeout=5)
             except TimeoutException:
-                logging.info(f"First attempt failed for product {product.sku}, refreshing page...")
-                driver.refresh()
+                logging.info(f"First attempt failed for product {sku}, refreshing page...")
+                self.pacer.refresh(driver)
                 try:
-                    time.sleep(1)
                     self.wait_for_elements(driver, item_class, timeout=5)
                 except TimeoutException:
-                    logging.error(f"Second attempt failed for product {product.sku}, moving on...")
-                    product.scanned = True
-                    product.error = True
-                    session.commit()
+                    logging.error(f"Second attempt failed for product {sku}, moving on...")
+                    self.update_product_in_db(work_list, sku, None)
                     return
-            self.extract_product_specs(driver, specs, product.type, product.sku)
-            self.update_product_in_db(product, specs, session)
+            self.extract_product_specs(driver, specs, type, sku, url=url)
+            self.update_product_in_db(work_list, sku, specs)
         
         except (TimeoutException, NoSuchElementException) as e:
-            logging.error(f"Error scanning product {product.sku}: {traceback.format_exc()}")
-            product.scanned = True
-            product.error = True
-            session.commit()
+            logging.error(f"Error scanning product {sku}: {traceback.format_exc()}")
+            self.update_product_in_db(work_list, sku, None)
 
-    def extract_product_specs(self, driver, specs, type, sku):
+    def extract_product_specs(self, driver, specs, type, sku, url=None):
         """Extracts the product specs using Selenium and BeautifulSoup."""
-        unrefined_data = {}
         try:
-            container = driver.find_element(By.ID, 'tab-specification')
-            specs_html = container.get_attribute("innerHTML")
-            soup = BeautifulSoup(specs_html, 'html.parser')
-            rows = soup.find_all('tr')
-            for row in rows:
-                columns = row.find_all('td')
-                if len(columns) == 2:
-                    label = columns[0].get_text(strip=True).replace(':', '')
-                    value = columns[1].get_text(strip=True)
-                    unrefined_data[label] = value
-            specs['name'] = self.extract_name(unrefined_data, sku)
-            specs['form_factor'] = self.extract_form_factor(unrefined_data, type)
-            specs['cpu'] = self.extract_cpu(unrefined_data)
-            specs['gpu'] = self.extract_gpu(unrefined_data)
-            specs['storage'] = self.extract_storage(unrefined_data)
-            specs['ram'] = self.extract_ram(unrefined_data)
-            specs['keyboard'] = self.extract_keyboard(unrefined_data)
-            specs['warranty'] = self.extract_warranty(unrefined_data)
-            specs['ddr'] = self.extract_ddr(unrefined_data)
-            specs['os'] = self.extract_os(unrefined_data)
-            specs['ethernet'] = self.extract_ethernet(unrefined_data)
-            specs['wifi'] = self.extract_wifi(unrefined_data)
-            specs['screen_resolution'] = self.extract_screen_res(unrefined_data)          
-            specs['screen_type'] = self.extract_screen_type(unrefined_data)
-            specs['screen_size'] = self.extract_screen_size(unrefined_data)
-            specs['touch'] = self.extract_touch(unrefined_data)
-
-        except NoSuchElementException as e:
+            with run_metrics.timer("extract", "insight"):
+                container = WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.ID, 'tab-specification')))
+                specs_html = container.get_attribute("innerHTML")
+        except (NoSuchElementException, TimeoutException) as e:
             logging.error(f"Error extracting product specs: {traceback.format_exc()}")
-            specs['name'] = specs.get('name', 'N/A')
-            specs['form_factor'] = specs.get('form_factor', 'N/A')
-            specs['cpu'] = specs.get('cpu', 'N/A')
-            specs['gpu'] = specs.get('gpu', 'N/A')
-            specs['storage'] = specs.get('storage', 0)
-            specs['ram'] = specs.get('ram', 0)
-            specs['warranty'] = specs.get('warranty', 'N/A')
-            specs['ddr'] = specs.get('ddr', 'N/A')
-            specs['os'] = specs.get('os', 'N/A')
-            specs['ethernet'] = specs.get('ethernet', 'N/A')
-            specs['wifi'] = specs.get('wifi', 'N/A')
-            specs['keyboard'] = specs.get('keyboard', 'N/A')
-            specs['screen_resolution'] = specs.get('screen_resolution', 'N/A')
-            specs['screen_size'] = specs.get('screen_size', 'N/A')
-            specs['screen_type'] = specs.get('screen_type', 'N/A')
-            specs['touch'] = specs.get('touch', 'N/A')
-            time.sleep(1)
+            self.fill_missing_specs(specs)
+            return
+        if url:
+            self.html_cache.put(url, specs_html)
+        with run_metrics.timer("parse", "insight"):
+            specs.update(self.parse_product_specs(specs_html, type, sku))
 
-    def update_product_in_db(self, product, specs, session):
-        try:
-            #product.brand = specs.get('brand', 'N/A')
-            product.name = specs.get('name', 'N/A')
-            product.form_factor = specs.get('form_factor', 'N/A')
-            product.cpu = specs.get('cpu', 'N/A')
-            product.gpu = specs.get('gpu', 'N/A')
-            product.storage = specs.get('storage', 0)
-            product.ram = specs.get('ram', 0)
-            product.keyboard = specs.get('keyboard', 'N/A')
-            product.warranty = specs.get('warranty', 'N/A')
-            product.ddr = specs.get('ddr', 'N/A')
-            product.os = specs.get('os', 'N/A')
-            product.ethernet = specs.get('ethernet', 'N/A')
-            product.wifi = specs.get('wifi', 'N/A')
-            product.screen_resolution = specs.get('screen_resolution', 'N/A')
-            product.screen_size = specs.get('screen_size', 'N/A')
-            product.screen_type = specs.get('screen_type', 'N/A')
-            product.touch = specs.get('touch', 'N/A')
+    @classmethod
+    def parse_product_specs(cls, specs_html, type, sku):
+        """Turns the innerHTML of a product's spec table into a specs dict."""
+        return SpecFieldMap.for_scraper(cls, INSIGHT_SPECS).parse(specs_html, type=type, sku=sku)
 
-            product.scanned = True
-            if product.cpu == "N/A" or product.gpu == "N/A" or product.storage == 0 or product.ram == 0:
-                product.error = True
-            session.commit()
-        except Exception as e:
-            logging.error(f"Error updating product {product.sku} in the database: {traceback.format_exc()}")
-            session.rollback()  
+    @classmethod
+    def fill_missing_specs(cls, specs):
+        specs['name'] = specs.get('name', 'N/A')
+        specs['form_factor'] = specs.get('form_factor', 'N/A')
+        specs['cpu'] = specs.get('cpu', 'N/A')
+        specs['gpu'] = specs.get('gpu', 'N/A')
+        specs['storage'] = specs.get('storage', 0)
+        specs['ram'] = specs.get('ram', 0)
+        specs['warranty'] = specs.get('warranty', 'N/A')
+        specs['ddr'] = specs.get('ddr', 'N/A')
+        specs['os'] = specs.get('os', 'N/A')
+        specs['ethernet'] = specs.get('ethernet', 'N/A')
+        specs['wifi'] = specs.get('wifi', 'N/A')
+        specs['keyboard'] = specs.get('keyboard', 'N/A')
+        specs['screen_resolution'] = specs.get('screen_resolution', 'N/A')
+        specs['screen_size'] = specs.get('screen_size', 'N/A')
+        specs['screen_type'] = specs.get('screen_type', 'N/A')
+        specs['touch'] = specs.get('touch', 'N/A')
+
+    @classmethod
+    def scanned_row(cls, sku, specs):
+        """The ScanWorkList row finishing a product's scan. Specs of None mark the scan as failed."""
+        if specs is None:
+            return ScanWorkList.failed(sku)
+        row = {
+            'name': specs.get('name', 'N/A'),
+            'form_factor': specs.get('form_factor', 'N/A'),
+            'cpu': specs.get('cpu', 'N/A'),
+            'gpu': specs.get('gpu', 'N/A'),
+            'storage': specs.get('storage', 0),
+            'ram': specs.get('ram', 0),
+            'keyboard': specs.get('keyboard', 'N/A'),
+            'warranty': specs.get('warranty', 'N/A'),
+            'ddr': specs.get('ddr', 'N/A'),
+            'os': specs.get('os', 'N/A'),
+            'ethernet': specs.get('ethernet', 'N/A'),
+            'wifi': specs.get('wifi', 'N/A'),
+            'screen_res': specs.get('screen_resolution', 'N/A'),
+            'screen_size': specs.get('screen_size', 'N/A'),
+            'screen_type': specs.get('screen_type', 'N/A'),
+            'touch': specs.get('touch', 'N/A'),
+        }
+        # Set either way, so a re-parse that now finds every field clears an earlier error
+        row['error'] = row['cpu'] == "N/A" or row['gpu'] == "N/A" or row['storage'] == 0 or row['ram'] == 0
+        return ScanWorkList.done(sku, row)
+
+    def update_product_in_db(self, work_list, sku, specs):
+        try:
+            with run_metrics.timer("commit", "insight"):
+                work_list.finish([self.scanned_row(sku, specs)])
+        except Exception:
+            logging.error(f"Error updating product {sku} in the database: {traceback.format_exc()}")
 
     @classmethod
     def extract_sku(cls, product):
@@ -419,54 +428,6 @@ class InsightScraper:
         else:
             return "N/A"
 
-    @classmethod
-    def extract_storage(cls, product):
-        storage = "N/A"
-        if (product.get('Total Solid State Drive Capacity')):
-            storage = product.get('Total Solid State Drive Capacity').upper()
-        elif (product.get('Flash Memory Capacity')):
-            storage = product.get('Flash Memory Capacity').upper()
-        if storage != "N/A":
-            if "GB" in storage:
-                storage = int(storage.replace("GB", "").strip())
-            elif "TB" in storage:
-                storage = int(storage.replace("TB", "").strip())*1000
-            return storage
-        else:
-            return 0
-
-    @classmethod
-    def extract_os(cls, product):
-        return product.get('Operating System Platform', "N/A")
-
-    @classmethod
-    def extract_screen_res(cls, product):
-        return product.get('Screen Mode', "N/A")
-    
-    @classmethod
-    def extract_screen_type(cls, product):
-        return product.get('Display Screen Type', "N/A")
-    
-    @classmethod
-    def extract_screen_size(cls, product):
-        return product.get('Screen Size', "N/A")
-
-    @classmethod
-    def extract_wifi(cls, product):
-        return product.get('Wireless LAN', "N/A")
-
-    @classmethod
-    def extract_keyboard(cls, product):
-        return product.get('Keyboard Localization', "N/A")
-
-    @classmethod
-    def extract_touch(cls, product):
-        return product.get('Touchscreen', "N/A")
-        
-    @classmethod
-    def extract_ethernet(cls, product):
-        return product.get('Ethernet Technology', "N/A") 
-
     @classmethod
     def extract_release_year(cls, product):
         return product.get('Release Year', "N/A")
@@ -0,0 +1,106 @@
+import atexit
+import json
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Stages timed during a run, in the order the report lists them
+STAGES = ("get", "wait", "extract", "parse", "commit", "score")
+
+class RunMetrics:
+    """Durations of each timed step in a run, kept for the end-of-run report and appended to a JSONL file.
+
+    A record is one step: its stage, retailer, the SKU being worked on (set
+    per thread with `item()`), the seconds it took and how many products it
+    covered (a batched commit covers many). Records are written out every
+    `flush_every` steps and when the report runs.
+    """
+    def __init__(self, path="metrics.jsonl", flush_every=200):
+        self.path = path
+        self.flush_every = flush_every
+        self.run = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.durations = {}
+        self.loads = {}
+        self.pending = []
+
+    @contextmanager
+    def item(self, sku):
+        """Tags every step this thread records inside the block with `sku`."""
+        previous = getattr(self.local, "sku", None)
+        self.local.sku = sku
+        try:
+            yield
+        finally:
+            self.local.sku = previous
+
+    @contextmanager
+    def timer(self, stage, retailer=None, items=1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            # Failed steps count too: a wait that times out still cost its timeout
+            self.record(stage, time.perf_counter() - start, retailer, items=items)
+
+    def record(self, stage, seconds, retailer=None, sku=None, items=1):
+        if sku is None:
+            sku = getattr(self.local, "sku", None)
+        now = time.time()
+        with self.lock:
+            self.durations.setdefault((stage, retailer), []).append(seconds)
+            if stage == "get":
+                # Page loads per retailer, with when the first one started and the last one ended
+                loads = self.loads.setdefault(retailer, [0, now - seconds, now])
+                loads[0] += 1
+                loads[2] = now
+            self.pending.append({"run": self.run, "at": round(now, 3), "stage": stage, "retailer": retailer,
+                                 "sku": sku, "seconds": round(seconds, 4), "items": items})
+            if len(self.pending) >= self.flush_every:
+                self.write_pending()
+
+    def write_pending(self):
+        try:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.writelines(json.dumps(record) + "\n" for record in self.pending)
+        except OSError as e:
+            logging.warning(f"Could not write metrics to {self.path}: {e}")
+        self.pending = []
+
+    def flush(self):
+        with self.lock:
+            if self.pending:
+                self.write_pending()
+
+    @classmethod
+    def percentile(cls, ordered, percent):
+        # Nearest rank: the smallest value with at least `percent`% of values at or below it
+        return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+    def pages_per_minute(self, retailer):
+        with self.lock:
+            count, first, last = self.loads.get(retailer, (0, 0, 0))
+        return count / (last - first) * 60 if last > first else 0.0
+
+    def report(self):
+        """Logs p50/p95/p99 per stage and retailer, and pages per minute per retailer."""
+        self.flush()
+        with self.lock:
+            durations = {key: sorted(values) for key, values in self.durations.items()}
+            retailers = list(self.loads)
+        order = {stage: position for position, stage in enumerate(STAGES)}
+        for stage, retailer in sorted(durations, key=lambda key: (order.get(key[0], len(STAGES)), key[0], str(key[1]))):
+            values = durations[(stage, retailer)]
+            logging.info(f"{stage:<8}{retailer or '-':<12}{len(values):>6} steps  "
+                         f"p50 {self.percentile(values, 50):.3f}s  p95 {self.percentile(values, 95):.3f}s  "
+                         f"p99 {self.percentile(values, 99):.3f}s  total {sum(values):.1f}s")
+        for retailer in sorted(retailers, key=str):
+            logging.info(f"{retailer or '-'}: {self.pages_per_minute(retailer):.1f} pages/min")
+
+run_metrics = RunMetrics()
+# Runs that never reach the report (the GUI, a crash) still keep their records
+atexit.register(run_metrics.flush)
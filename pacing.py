@@ -0,0 +1,118 @@
+import logging
+import random
+import threading
+import time
+
+from metrics import run_metrics
+
+# Default request budgets per retailer. Each browser page load takes one slot;
+# slots are spread evenly over the minute with +/- jitter, and stretched by the
+# backoff factor while a site is answering slowly or serving challenge pages.
+# A budget is shared by every worker loading that retailer, so it caps the
+# retailer's total page rate however many browsers are scanning.
+RETAILER_PACING = {
+    "directdial": {"rpm": 30, "jitter": 0.3},
+    "cdw": {"rpm": 20, "jitter": 0.4},
+    "insight": {"rpm": 20, "jitter": 0.4},
+    "passmark": {"rpm": 10, "jitter": 0.2},
+}
+
+# Title fragments and elements of bot-check / block pages (Cloudflare,
+# PerimeterX, Akamai, Incapsula)
+CHALLENGE_TITLES = ("just a moment", "attention required", "access denied", "are you a robot", "request unsuccessful")
+CHALLENGE_SELECTORS = "#challenge-form, #challenge-running, #px-captcha, iframe[src*='captcha'], iframe[src*='_Incapsula_']"
+
+pacers = {}
+lock = threading.Lock()
+
+class Pacer:
+    """Spaces out one retailer's page loads within a requests-per-minute budget.
+
+    Every page load waits for its slot, then reports how long it took and
+    whether it landed on a challenge page. Slow loads (over `slow_after`
+    seconds) grow the backoff factor by half, challenge pages double it, and
+    each clean load shrinks it back towards 1.
+    """
+    def __init__(self, name, rpm=30, jitter=0.3, slow_after=10.0, max_backoff=16.0):
+        self.name = name
+        self.rpm = rpm
+        self.jitter = jitter
+        self.slow_after = slow_after
+        self.max_backoff = max_backoff
+        self.backoff = 1.0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def interval(self):
+        return 60.0 / self.rpm * self.backoff
+
+    def wait(self):
+        """Blocks until this caller's slot. Thread-safe: concurrent workers take successive slots."""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+        if slot > now:
+            time.sleep(slot - now)
+
+    def record(self, elapsed, challenged=False):
+        with self.lock:
+            if challenged:
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+                logging.warning(f"{self.name}: challenge page, slowing to one request every {self.interval:.1f}s")
+            elif elapsed > self.slow_after:
+                self.backoff = min(self.backoff * 1.5, self.max_backoff)
+                logging.info(f"{self.name}: slow response ({elapsed:.1f}s), slowing to one request every {self.interval:.1f}s")
+            else:
+                self.backoff = max(1.0, self.backoff * 0.9)
+
+    def get(self, driver, url):
+        """Loads `url` in its slot. Returns False if the site answered with a challenge page."""
+        self.wait()
+        start = time.monotonic()
+        driver.get(url)
+        challenged = self.is_challenge(driver)
+        elapsed = time.monotonic() - start
+        self.record(elapsed, challenged)
+        run_metrics.record("get", elapsed, self.name)
+        return not challenged
+
+    def refresh(self, driver):
+        self.wait()
+        start = time.monotonic()
+        driver.refresh()
+        challenged = self.is_challenge(driver)
+        elapsed = time.monotonic() - start
+        self.record(elapsed, challenged)
+        run_metrics.record("get", elapsed, self.name)
+        return not challenged
+
+    @classmethod
+    def is_challenge(cls, driver):
+        try:
+            title = (driver.title or "").lower()
+            if any(fragment in title for fragment in CHALLENGE_TITLES):
+                return True
+            return bool(driver.execute_script("return document.querySelector(arguments[0]) !== null", CHALLENGE_SELECTORS))
+        except Exception as e:
+            logging.debug(f"Challenge check failed: {e}")
+            return False
+
+def set_pacing(retailer, **settings):
+    """Changes a retailer's budget (rpm, jitter, ...) for this run, including for workers already pacing it."""
+    with lock:
+        RETAILER_PACING[retailer] = dict(RETAILER_PACING.get(retailer, {}), **settings)
+        pacer = pacers.get(retailer)
+    if pacer is not None:
+        with pacer.lock:
+            for key, value in settings.items():
+                setattr(pacer, key, value)
+
+def get_pacer(retailer):
+    """Returns the one Pacer for a retailer in this process, so every worker shares its budget."""
+    with lock:
+        pacer = pacers.get(retailer)
+        if pacer is None:
+            pacer = pacers[retailer] = Pacer(retailer, **RETAILER_PACING.get(retailer, {}))
+        return pacer
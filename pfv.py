@@ -0,0 +1,115 @@
+from bisect import bisect_left
+
+# Row logic of the PFV tool (direct_dial_scraping_gui_US.py) that needs no window.
+# Rows are the GUI's spec.csv lists, indexed by column as in its add_header.
+
+# Listing fields refreshed from the website on every run: stock, price, rebate, sale and URL
+LISTING_FIELDS = (1, 2, 3, 4, 26)
+
+#Merges one product from the website into the local list of products, using a SKU -> row index
+def checks_if_web_in_local(web_row, local_products, local_index, current_date, summary):
+    index_local = local_index.get(web_row[0])
+    if index_local is None:
+        web_row[27] = current_date
+        local_index[web_row[0]] = len(local_products)
+        local_products.append(web_row)
+        summary['new'] += 1
+        return local_products
+    local_row = local_products[index_local]
+    local_row[27] = current_date
+    if any(local_row[field] != web_row[field] for field in LISTING_FIELDS):
+        summary['changed'] += 1
+        for field in LISTING_FIELDS:
+            local_row[field] = web_row[field]
+    return local_products
+
+def merge_listing(web_products, local_products, current_date):
+    """
+    Merges the scraped listing into the local rows in place. Returns the rows and
+    counts of new, changed and vanished (no longer listed) products.
+    """
+    local_index = {}
+    for index_local, local_row in enumerate(local_products):
+        local_index.setdefault(local_row[0], index_local)
+    summary = {'new': 0, 'changed': 0}
+    for web_row in web_products:
+        local_products = checks_if_web_in_local(web_row, local_products, local_index, current_date, summary)
+    # Local products of the scraped categories that are no longer listed
+    categories = {web_row[30] for web_row in web_products}
+    web_skus = {web_row[0] for web_row in web_products}
+    summary['vanished'] = sum(1 for local_row in local_products if local_row[30] in categories and local_row[0] not in web_skus)
+    return local_products, summary
+
+# Brands each brand is compared against, and how many rivals to keep from each
+COMPETITOR_BRANDS = {
+    'Lenovo': [('Dell', 5), ('HP', 5)],
+    'HP': [('Lenovo', 10)],
+    'Dell': [('Lenovo', 10)],
+}
+
+def parse_score(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+def competitor_buckets(products):
+    """
+    Groups products by (category, brand). Each bucket holds the products with a
+    numeric score sorted by (score, row), plus the rows whose score isn't a number.
+    """
+    buckets = {}
+    for index, product in enumerate(products):
+        bucket = buckets.setdefault((product[30], product[5]), {'scores': [], 'rows': [], 'unscored': []})
+        score = parse_score(product[25])
+        if score is None:
+            bucket['unscored'].append(index)
+        else:
+            bucket['rows'].append((score, index))
+    for bucket in buckets.values():
+        bucket['rows'].sort()
+        bucket['scores'] = [score for score, _ in bucket['rows']]
+    return buckets
+
+def nearest_rows(bucket, score, count):
+    """
+    Returns the rows of the `count` products closest in score, ties going to the
+    earlier row. A product without a numeric score is 0 away from everything.
+    """
+    if score is None:
+        return sorted([index for _, index in bucket['rows']] + bucket['unscored'])[:count]
+    rows = bucket['rows']
+    candidates = [(0.0, index) for index in bucket['unscored'][:count]]
+    # Walk outwards from the product's own score, keeping going past `count`
+    # while the distance ties with the last one taken
+    left = bisect_left(bucket['scores'], score) - 1
+    right = left + 1
+    limit = None
+    while left >= 0 or right < len(rows):
+        left_diff = abs(score - rows[left][0]) if left >= 0 else None
+        right_diff = abs(score - rows[right][0]) if right < len(rows) else None
+        if right_diff is None or (left_diff is not None and left_diff <= right_diff):
+            diff, index = left_diff, rows[left][1]
+            left -= 1
+        else:
+            diff, index = right_diff, rows[right][1]
+            right += 1
+        if limit is not None and diff > limit:
+            break
+        candidates.append((diff, index))
+        if limit is None and len(candidates) >= count:
+            limit = sorted(candidates)[count - 1][0]
+    return [index for _, index in sorted(candidates)[:count]]
+
+def competitors(products):
+    buckets = competitor_buckets(products)
+    for index_product, product in enumerate(products):
+        score = parse_score(product[25])
+        closest_skus = []
+        for brand, count in COMPETITOR_BRANDS.get(product[5], []):
+            bucket = buckets.get((product[30], brand))
+            if bucket:
+                closest_skus += [products[index][0] for index in nearest_rows(bucket, score, count)]
+        for index_sku, sku in enumerate(closest_skus):
+            products[index_product][index_sku+31] = sku
+    return products
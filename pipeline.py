@@ -0,0 +1,264 @@
+import logging
+import queue
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from metrics import run_metrics
+
+# Marks the end of the stream on a stage's input queue
+END = object()
+
+class Ready:
+    """Returned by a fetch to send a result straight to the writer, skipping the parse stage."""
+    def __init__(self, result):
+        self.result = result
+
+class StageMetrics:
+    """Counts a stage's items and splits its time into work and waiting on a full downstream queue."""
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.items = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.started = None
+        self.finished = None
+
+    def add(self, items=1, busy=0.0, blocked=0.0, errors=0):
+        with self.lock:
+            if self.started is None:
+                self.started = time.monotonic()
+            self.items += items
+            self.busy += busy
+            self.blocked += blocked
+            self.errors += errors
+            self.finished = time.monotonic()
+
+    def per_minute(self, elapsed):
+        return self.items / elapsed * 60 if elapsed else 0.0
+
+    def summary(self, elapsed):
+        return (f"{self.name}: {self.items} items ({self.per_minute(elapsed):.1f}/min), "
+                f"busy {self.busy:.1f}s, blocked {self.blocked:.1f}s, {self.errors} errors")
+
+def timed_parse(parse, payload):
+    # Runs in a worker process; the duration travels back with the result
+    start = time.perf_counter()
+    result = parse(payload)
+    return result, time.perf_counter() - start
+
+class ScanPipeline:
+    """Fetch, parse and write stages joined by bounded queues.
+
+    `fetcher` is called once per fetch thread and returns a context manager
+    yielding that thread's fetch(job) callable (typically holding a browser).
+    A fetch returns a payload for `parse`, a Ready(result) to bypass parsing,
+    or None to drop the job. `parse` must be picklable: it runs on a process
+    pool of `parse_workers` processes (or inline on the dispatcher thread when
+    that is 0). Jobs are tuples led by the SKU, which tags the run metrics
+    recorded for them. `write` receives lists of (job, result) of up to `batch_size`
+    on a single writer thread. When a downstream queue is full the upstream
+    stage waits, so a slow writer throttles the browsers instead of piling up
+    HTML in memory.
+    """
+    def __init__(self, name, fetcher, parse, write, fetchers=1, parse_workers=2, queue_size=20, batch_size=25):
+        self.name = name
+        self.fetcher = fetcher
+        self.parse = parse
+        self.write = write
+        self.fetchers = max(1, fetchers)
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.metrics = {stage: StageMetrics(stage) for stage in ("fetch", "parse", "write")}
+        self.elapsed = 0.0
+        self.stop = threading.Event()
+        self.error = None
+
+    @classmethod
+    def job_id(cls, job):
+        return job[0] if isinstance(job, tuple) else job
+
+    def put(self, target, item, stage):
+        start = time.monotonic()
+        target.put(item)
+        self.metrics[stage].add(items=0, blocked=time.monotonic() - start)
+
+    def run(self, jobs):
+        """Feeds `jobs` through the stages and waits for the last write.
+
+        If a stage dies outside its per-item error handling, the remaining
+        jobs are skipped and its exception is raised here once every thread
+        has stopped.
+        """
+        start = time.monotonic()
+        self.stop.clear()
+        self.error = None
+        job_queue = queue.Queue(maxsize=self.queue_size)
+        parse_queue = queue.Queue(maxsize=self.queue_size)
+        write_queue = queue.Queue(maxsize=self.queue_size)
+        fetch_threads = [threading.Thread(target=self.fetch_stage, args=(job_queue, parse_queue, write_queue))
+                         for _ in range(self.fetchers)]
+        parse_thread = threading.Thread(target=self.parse_stage, args=(parse_queue, write_queue))
+        write_thread = threading.Thread(target=self.write_stage, args=(write_queue,))
+        for thread in fetch_threads + [parse_thread, write_thread]:
+            thread.start()
+        try:
+            for job in jobs:
+                if self.stop.is_set():
+                    break
+                job_queue.put(job)
+        finally:
+            for _ in fetch_threads:
+                job_queue.put(END)
+            for thread in fetch_threads:
+                thread.join()
+            parse_queue.put(END)
+            parse_thread.join()
+            write_queue.put(END)
+            write_thread.join()
+        self.elapsed = time.monotonic() - start
+        if self.error is not None:
+            raise self.error
+        return self.metrics
+
+    def fail(self, stage, error, source, ended):
+        """Stops the pipeline after a stage died and keeps reading its input so upstream stages never block."""
+        logging.error(f"{self.name}: {stage} stage stopped: {traceback.format_exc()}")
+        if self.error is None:
+            self.error = error
+        self.stop.set()
+        if not ended:
+            while source.get() is not END:
+                pass
+
+    @classmethod
+    def take(cls, source, timeout=None):
+        # Only one thread reads the parse and write queues, so the queue itself can remember seeing END
+        item = source.get(timeout=timeout)
+        if item is END:
+            source.ended = True
+        return item
+
+    def fetch_stage(self, job_queue, parse_queue, write_queue):
+        metrics = self.metrics["fetch"]
+        ended = False
+        try:
+            with self.fetcher() as fetch:
+                while True:
+                    job = job_queue.get()
+                    if job is END:
+                        ended = True
+                        break
+                    if self.stop.is_set():
+                        continue
+                    start = time.monotonic()
+                    try:
+                        with run_metrics.item(self.job_id(job)):
+                            payload = fetch(job)
+                    except Exception:
+                        logging.error(f"{self.name}: fetch failed for {job}: {traceback.format_exc()}")
+                        metrics.add(busy=time.monotonic() - start, errors=1)
+                        continue
+                    metrics.add(busy=time.monotonic() - start)
+                    if isinstance(payload, Ready):
+                        self.put(write_queue, (job, payload.result), "fetch")
+                    elif payload is not None:
+                        self.put(parse_queue, (job, payload), "fetch")
+        except Exception:
+            # One browser failing to start leaves the others running, so this doesn't stop the pipeline
+            logging.error(f"{self.name}: fetch worker stopped: {traceback.format_exc()}")
+            # Keep draining so the producer never blocks on a queue nobody reads
+            if not ended:
+                while job_queue.get() is not END:
+                    pass
+
+    def parse_stage(self, parse_queue, write_queue):
+        try:
+            if self.parse_workers <= 0:
+                self.parse_inline(parse_queue, write_queue)
+            else:
+                self.parse_pool(parse_queue, write_queue)
+        except Exception as e:
+            # A pool that can't start or breaks mid-run
+            self.fail("parse", e, parse_queue, getattr(parse_queue, "ended", False))
+
+    def parse_pool(self, parse_queue, write_queue):
+        in_flight = deque()
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as executor:
+            while True:
+                item = self.take(parse_queue)
+                if item is END:
+                    break
+                job, payload = item
+                in_flight.append((job, executor.submit(timed_parse, self.parse, payload)))
+                # Keep every worker busy plus one queued task each, then pass results on in order
+                while in_flight and (len(in_flight) > self.parse_workers * 2 or in_flight[0][1].done()):
+                    self.forward(*in_flight.popleft(), write_queue)
+            while in_flight:
+                self.forward(*in_flight.popleft(), write_queue)
+
+    def forward(self, job, future, write_queue):
+        try:
+            result, seconds = future.result()
+            self.metrics["parse"].add(busy=seconds)
+            run_metrics.record("parse", seconds, self.name, self.job_id(job))
+        except Exception as e:
+            logging.error(f"{self.name}: parse failed for {job}: {e}")
+            self.metrics["parse"].add(errors=1)
+            return
+        self.put(write_queue, (job, result), "parse")
+
+    def parse_inline(self, parse_queue, write_queue):
+        while True:
+            item = self.take(parse_queue)
+            if item is END:
+                break
+            job, payload = item
+            try:
+                result, seconds = timed_parse(self.parse, payload)
+            except Exception:
+                logging.error(f"{self.name}: parse failed for {job}: {traceback.format_exc()}")
+                self.metrics["parse"].add(errors=1)
+                continue
+            self.metrics["parse"].add(busy=seconds)
+            run_metrics.record("parse", seconds, self.name, self.job_id(job))
+            self.put(write_queue, (job, result), "parse")
+
+    def write_stage(self, write_queue):
+        try:
+            self.write_batches(write_queue)
+        except Exception as e:
+            self.fail("write", e, write_queue, getattr(write_queue, "ended", False))
+
+    def write_batches(self, write_queue):
+        batch = []
+        finished = False
+        while not finished:
+            try:
+                # Flush a partial batch when the upstream stages go quiet
+                item = self.take(write_queue, timeout=1.0 if batch else None)
+            except queue.Empty:
+                item = None
+            if item is END:
+                finished = True
+            elif item is not None:
+                batch.append(item)
+            if batch and (finished or item is None or len(batch) >= self.batch_size):
+                start = time.monotonic()
+                try:
+                    with run_metrics.timer("commit", self.name, items=len(batch)):
+                        self.write(batch)
+                    self.metrics["write"].add(items=len(batch), busy=time.monotonic() - start)
+                except Exception:
+                    logging.error(f"{self.name}: writing {len(batch)} results failed: {traceback.format_exc()}")
+                    self.metrics["write"].add(busy=time.monotonic() - start, errors=len(batch))
+                batch = []
+
+    def report(self):
+        for metrics in self.metrics.values():
+            logging.info(f"{self.name} {metrics.summary(self.elapsed)}")
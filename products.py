@@ -1,8 +1,12 @@
-from sqlalchemy import create_engine, Column, String, Float, Integer, PrimaryKeyConstraint, Boolean
+from sqlalchemy import Column, String, Float, Integer, PrimaryKeyConstraint, Boolean, Index, select, true, update, bindparam
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from database import get_engine, get_session_factory
+from sqlalchemy.dialects.sqlite import insert
+from datetime import datetime, timedelta
 import sqlite3
 import csv
+import threading
+import os
 
 Base = declarative_base()
 
@@ -43,65 +47,75 @@ class Product(Base):
     orig_gpu = Column("orig. gpu", String, default="N/A")
     updated = Column("updated", String, default="N/A")
     discovered = Column("discovered", String, default="N/A")
-    error = Column("error", Boolean, default=False)
+    error = Column("error", Boolean, default=False, index=True)
     scanned = Column("scanned", Boolean, default=False)
+    # Lets the scan queue walk unscanned SKUs in order without sorting the table
+    __table_args__ = (Index("ix_products_scanned", "scanned", "SKU"),)
 
     def __repr__(self):
         return f"Product({self.sku}, {self.price}, {self.url}, {self.updated})"
 
 class ProductManager:
     def __init__(self, db_url):
-        self.engine = create_engine(db_url, echo=False)
+        self.engine = get_engine(db_url)
         Base.metadata.create_all(self.engine)
-        self.Session = sessionmaker(bind=self.engine)
+        # create_all skips indexes on tables that already exist
+        for index in Product.__table__.indexes:
+            index.create(self.engine, checkfirst=True)
+        self.Session = get_session_factory(db_url)
 
     def get_session(self):
         return self.Session()
 
     def add_cdw_product(self, sku, price, type, url, updated, discovered):
-        session = self.get_session()
-        try:
-            product = session.query(Product).filter_by(sku=sku).first()
-            if product:
-                product.price = price
-                product.type = type
-                product.url = url
-                product.updated = updated
-                product.discovered = discovered
-            else:
-                product = Product(sku=sku, price=price, type=type, url=url, updated=updated, discovered=discovered)
-                session.add(product)   
-            session.commit()
-        except Exception as e:
-            session.rollback()
-            print(f"Error adding/updating product: {e}")
-        finally:
-            session.close()
+        self.upsert_products([dict(sku=sku, price=price, type=type, url=url, updated=updated, discovered=discovered)])
 
     def add_direct_dial_product(self, sku, stock, price, msrp, rebate, sale, brand, type, url, updated, discovered):
-        session = self.get_session()
+        self.upsert_products([dict(sku=sku, price=price, stock=stock, msrp=msrp, rebate=rebate, sale=sale, brand=brand, type=type, url=url, updated=updated, discovered=discovered)])
+
+    def upsert_products(self, products):
+        """Inserts or updates listing rows keyed by SKU in a single transaction.
+
+        Each product is a dict of Product attribute names. Only the given
+        fields are overwritten on existing rows; all rows should share the
+        same keys.
+        """
+        columns = Product.__mapper__.columns
+        rows = [{columns[key].name: value for key, value in product.items()} for product in products]
+        if not rows:
+            return 0
+        table = Product.__table__
+        statement = insert(table)
+        updated_columns = [name for name in rows[0] if name != columns['sku'].name]
+        statement = statement.on_conflict_do_update(
+            index_elements=[columns['sku'].name],
+            set_={name: statement.excluded[name] for name in updated_columns})
         try:
-            product = session.query(Product).filter_by(sku=sku).first()
-            if product:
-                product.price = price
-                product.stock = stock
-                product.msrp = msrp
-                product.rebate = rebate
-                product.sale = sale
-                product.brand = brand
-                product.type = type
-                product.url = url
-                product.updated = updated
-                product.discovered = discovered
-            else:
-                product = Product(sku=sku, price=price, stock=stock, msrp=msrp, rebate=rebate, sale=sale, brand=brand,type=type, url=url, updated=updated, discovered=discovered)
-                session.add(product)  
-            session.commit()
+            with self.engine.begin() as connection:
+                connection.execute(statement, rows)
+            return len(rows)
         except Exception as e:
-            session.rollback()
-            print(f"Error adding/updating product: {e}")
-        finally:
-            session.close()
+            print(f"Error adding/updating products: {e}")
+            return 0
+
+    def update_products(self, products):
+        """Updates existing rows keyed by SKU in a single transaction.
+
+        Products are dicts of Product attribute names including 'sku'; rows
+        with the same set of keys go through one executemany update.
+        """
+        columns = Product.__mapper__.columns
+        groups = {}
+        for product in products:
+            groups.setdefault(tuple(sorted(product)), []).append(product)
+        with self.engine.begin() as connection:
+            for keys, group in groups.items():
+                # Bind names must differ from the column names in an executemany update
+                statement = (update(Product.__table__)
+                             .where(columns['sku'] == bindparam('b_sku'))
+                             .values({columns[key].name: bindparam(f'b_{key}') for key in keys if key != 'sku'}))
+                connection.execute(statement, [{f'b_{key}': value for key, value in product.items()} for product in group])
+        return len(products)
 
     def get_products(self):
         session = self.get_session()
@@ -109,45 +123,341 @@ class ProductManager:
         session.close()
         return products
     
-#class Price(Base):
-#    __tablename__ = 'prices'
-#    sku = Column("sku", String)
-#    date = Column("date", String)
-#    price = Column("price", Float)
-#    __table_args__ = (PrimaryKeyConstraint('sku', 'date'),)
-
-#    def __repr__(self):
-#        return f"PriceTracker(SKU: {self.sku}, Date: {self.date}, Price: {self.price})"
-    
-#class Stock(Base):
-#
-#    __tablename__ = 'stocks'
-#    sku = Column("sku", String)
-#    date = Column("date", String)
-#    stock = Column("stock", Float)
-#    __table_args__ = (PrimaryKeyConstraint('sku', 'date'),)#
+class ScanWorkList:
+    """Hands out unscanned products in SKU order, a batch at a time, to the threads of one process.
+
+    Claims only move this object's in-memory cursor and write nothing to the
+    table, so they are shared by the threads holding the same work list but
+    not by other work lists or processes: two scanners on one database would
+    both hand out every product. A claim is finished by passing `done` or
+    `failed` rows to `finish`, which sets the scanned flag, so a crashed run
+    picks up where it stopped.
+    """
+    def __init__(self, db_url):
+        self.product_manager = ProductManager(db_url)
+        self.lock = threading.Lock()
+        self.cursor = ''
+
+    def remaining(self):
+        session = self.product_manager.get_session()
+        try:
+            return session.query(Product).filter_by(scanned=False).count()
+        finally:
+            session.close()
+
+    def claim_next_batch(self, session, n):
+        with self.lock:
+            products = (session.query(Product)
+                        .filter(Product.scanned == False, Product.sku > self.cursor)
+                        .order_by(Product.sku)
+                        .limit(n)
+                        .all())
+            if products:
+                self.cursor = products[-1].sku
+            return products
+
+    def restart(self):
+        with self.lock:
+            self.cursor = ''
+
+    def jobs(self, batch_size=10):
+        """Yields (sku, url, type) for each unscanned product, claiming a batch at a time."""
+        session = self.product_manager.get_session()
+        try:
+            while True:
+                products = self.claim_next_batch(session, batch_size)
+                if not products:
+                    break
+                jobs = [(product.sku, product.url, product.type) for product in products]
+                # Results are written elsewhere, so don't hold on to the loaded rows
+                session.expunge_all()
+                yield from jobs
+        finally:
+            session.close()
+
+    @classmethod
+    def done(cls, sku, columns):
+        """The row finishing a scanned product: its scanned columns, marked scanned."""
+        return dict(columns, sku=sku, scanned=True)
+
+    @classmethod
+    def failed(cls, sku):
+        return {'sku': sku, 'scanned': True, 'error': True}
+
+    def finish(self, rows):
+        """Writes `done`/`failed` rows for claimed products in one update."""
+        return self.product_manager.update_products(rows)
+
+class CrawlState(Base):
+    """How far a listing crawl got: one row per listing URL and page.
+
+    fetched_at is stored as YYYY-MM-DD HH:MM:SS so it compares as text.
+    """
+    __tablename__ = 'crawl_state'
+    listing_url = Column("listing url", String)
+    page = Column("page", Integer)
+    status = Column("status", String)
+    item_count = Column("item count", Integer, default=0)
+    fetched_at = Column("fetched at", String)
+    __table_args__ = (PrimaryKeyConstraint('listing url', 'page'),)
+
+    def __repr__(self):
+        return f"CrawlState({self.listing_url}, page {self.page}, {self.status}, {self.item_count} items, {self.fetched_at})"
+
+class CrawlStateManager:
+    """Records which listing pages were fetched, so an interrupted crawl resumes instead of restarting."""
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, db_url):
+        self.engine = get_engine(db_url)
+        Base.metadata.create_all(self.engine, tables=[CrawlState.__table__])
 
-#    def __repr__(self):
-#        return f"PriceTracker(SKU: {self.sku}, Date: {self.date}, Stock: {self.stock})"
+    def mark(self, listing_url, page, status, item_count=0):
+        table = CrawlState.__table__
+        row = {"listing url": listing_url, "page": page, "status": status, "item count": item_count,
+               "fetched at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=["listing url", "page"],
+            set_={name: statement.excluded[name] for name in ("status", "item count", "fetched at")})
+        with self.engine.begin() as connection:
+            connection.execute(statement, row)
+
+    def fresh_pages(self, listing_url, max_age_hours):
+        """Pages of a listing fetched successfully within the last `max_age_hours`."""
+        table = CrawlState.__table__
+        cutoff = (datetime.now() - timedelta(hours=max_age_hours)).strftime("%Y-%m-%d %H:%M:%S")
+        with self.engine.connect() as connection:
+            rows = connection.execute(select(table.c.page).where(
+                table.c["listing url"] == listing_url, table.c.status == self.DONE, table.c["fetched at"] >= cutoff))
+            return {row[0] for row in rows}
+
+class PriceHistory(Base):
+    """One listing observation: a SKU's price and stock at a source on a date.
+
+    Dates are stored as YYYY-MM-DD so they sort and range-filter as text.
+    """
+    __tablename__ = 'price_history'
+    sku = Column("sku", String)
+    date = Column("date", String)
+    source = Column("source", String)
+    price = Column("price", Float)
+    stock = Column("stock", Integer)
+    __table_args__ = (PrimaryKeyConstraint('sku', 'date', 'source'), Index("ix_price_history_date", "date"))
+
+    def __repr__(self):
+        return f"PriceHistory(SKU: {self.sku}, Date: {self.date}, Price: {self.price}, Stock: {self.stock})"
+
+class PriceHistoryManager:
+    """Append-only price and stock history, with export to the old wide CSV layout."""
+    def __init__(self, db_url):
+        self.engine = get_engine(db_url)
+        Base.metadata.create_all(self.engine, tables=[PriceHistory.__table__])
+
+    def record(self, rows, source, date=None):
+        """Writes (sku, price, stock) rows for one day. Re-running a day replaces its rows."""
+        date = date or datetime.now().strftime("%Y-%m-%d")
+        rows = [{"sku": sku, "date": date, "source": source, "price": price, "stock": stock} for sku, price, stock in rows]
+        if not rows:
+            return 0
+        statement = insert(PriceHistory.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=["sku", "date", "source"],
+            set_={"price": statement.excluded.price, "stock": statement.excluded.stock})
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(statement, rows)
+            return len(rows)
+        except Exception as e:
+            print(f"Error recording price history: {e}")
+            return 0
+
+    def has_history(self, source):
+        with self.engine.connect() as connection:
+            table = PriceHistory.__table__
+            return connection.execute(select(table.c.sku).where(table.c.source == source).limit(1)).first() is not None
+
+    def import_wide_csv(self, price_csv, stock_csv, source):
+        """Loads the old wide price/stock CSVs (SKU, then one column per mm/dd/yyyy date).
+
+        Days where a SKU had neither a price nor stock are treated as not listed.
+        """
+        prices = self.read_wide_csv(price_csv)
+        stocks = self.read_wide_csv(stock_csv)
+        rows = {}
+        for key in prices.keys() | stocks.keys():
+            price = self.to_number(prices.get(key))
+            stock = self.to_number(stocks.get(key))
+            if price or stock:
+                rows.setdefault(key[1], []).append((key[0], price, int(stock)))
+        imported = 0
+        for date, day_rows in rows.items():
+            imported += self.record(day_rows, source, date)
+        return imported
+
+    @classmethod
+    def read_wide_csv(cls, path):
+        values = {}
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return values
+        with open(path, mode='r', newline='') as file:
+            reader = csv.reader(file)
+            header = next(reader)
+            dates = [datetime.strptime(date, "%m/%d/%Y").strftime("%Y-%m-%d") for date in header[1:]]
+            for row in reader:
+                for date, value in zip(dates, row[1:]):
+                    values[(row[0], date)] = value
+        return values
+
+    @classmethod
+    def to_number(cls, value):
+        try:
+            return float(str(value).replace('$', '').replace(',', ''))
+        except ValueError:
+            return 0
+
+    @classmethod
+    def format_number(cls, value):
+        if value is None:
+            return '0'
+        return str(int(value)) if float(value).is_integer() else str(value)
+
+    def export_wide_csv(self, path, field, source=None, missing='0'):
+        """Writes `field` ('price' or 'stock') as one row per SKU and one column per date, newest first."""
+        table = PriceHistory.__table__
+        condition = table.c.source == source if source else true()
+        with self.engine.connect() as connection:
+            dates = [row[0] for row in connection.execute(
+                select(table.c.date).where(condition).distinct().order_by(table.c.date.desc()))]
+            positions = {date: position for position, date in enumerate(dates)}
+            rows = connection.execute(select(table.c.sku, table.c.date, table.c[field])
+                                      .where(condition).order_by(table.c.sku))
+            with open(path, mode='w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(['SKU'] + [datetime.strptime(date, "%Y-%m-%d").strftime("%m/%d/%Y") for date in dates])
+                current_sku, values = None, []
+                for sku, date, value in rows:
+                    if sku != current_sku:
+                        if current_sku is not None:
+                            writer.writerow([current_sku] + values)
+                        current_sku, values = sku, [missing] * len(dates)
+                    values[positions[date]] = self.format_number(value)
+                if current_sku is not None:
+                    writer.writerow([current_sku] + values)
+        return len(dates)
 
 class DatabaseExporter:
-    def __init__(self, db_path):
+    """Streams a table (or part of it) out of a SQLite file in batches.
+
+    `columns` picks the columns to export, `where` is an SQL condition with
+    `params` for its placeholders (e.g. "scanned = 1 AND error = 0"), and
+    `updated_since` keeps rows whose mm/dd/yyyy "updated" date is on or after
+    the given date.
+    """
+    # SQLite declared types -> Arrow types for Parquet exports
+    ARROW_TYPES = {"INTEGER": "int64", "FLOAT": "double", "REAL": "double", "BOOLEAN": "bool"}
+
+    def __init__(self, db_path, batch_size=1000):
 
         self.db_path = db_path
-    def export_table_to_csv(self, table_name, csv_file_path):
+        self.batch_size = batch_size
+
+    @classmethod
+    def quote(cls, name):
+        return '"' + name.replace('"', '""') + '"'
+
+    def build_query(self, table_name, columns=None, where=None, params=(), updated_since=None):
+        selected = ", ".join(self.quote(column) for column in columns) if columns else "*"
+        conditions = [f"({where})"] if where else []
+        params = list(params)
+        if updated_since:
+            if isinstance(updated_since, str):
+                updated_since = datetime.strptime(updated_since, "%m/%d/%Y")
+            # "updated" is stored as mm/dd/yyyy, so compare it as yyyymmdd
+            conditions.append("substr(updated, 7, 4) || substr(updated, 1, 2) || substr(updated, 4, 2) >= ?")
+            params.append(updated_since.strftime("%Y%m%d"))
+        query = f"SELECT {selected} FROM {self.quote(table_name)}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return query, params
+
+    def iter_batches(self, cursor):
+        while True:
+            rows = cursor.fetchmany(self.batch_size)
+            if not rows:
+                break
+            yield rows
+
+    def export_table_to_csv(self, table_name, csv_file_path, columns=None, where=None, params=(), updated_since=None):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         try:
-            cursor.execute(f"SELECT * FROM {table_name}")
-            rows = cursor.fetchall()
+            cursor.execute(*self.build_query(table_name, columns, where, params, updated_since))
             column_names = [description[0] for description in cursor.description]
+            exported = 0
             with open(csv_file_path, mode='w', newline='', encoding='utf-8') as csv_file:
                 writer = csv.writer(csv_file)
                 writer.writerow(column_names)
-                writer.writerows(rows)
-            print(f"Data from table '{table_name}' has been exported to '{csv_file_path}'.")
+                for rows in self.iter_batches(cursor):
+                    writer.writerows(rows)
+                    exported += len(rows)
+            print(f"{exported} rows from table '{table_name}' have been exported to '{csv_file_path}'.")
+            return exported
         except Exception as e:
             print(f"Error exporting table '{table_name}': {e}")
+            return 0
         finally:
             conn.close()
 
+    def export_table_to_parquet(self, table_name, parquet_file_path, columns=None, where=None, params=(), updated_since=None):
+        """Same as export_table_to_csv but writes Parquet. Needs pyarrow."""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            print("Parquet export needs pyarrow: pip install pyarrow")
+            return 0
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        try:
+            declared = {row[1]: row[2].upper() for row in cursor.execute(f"PRAGMA table_info({self.quote(table_name)})")}
+            # SQLite keeps fractional values in INTEGER columns (ff score), export those as floats
+            for name, declared_type in declared.items():
+                if declared_type == "INTEGER" and cursor.execute(
+                        f"SELECT 1 FROM {self.quote(table_name)} WHERE typeof({self.quote(name)}) = 'real' LIMIT 1").fetchone():
+                    declared[name] = "REAL"
+            cursor.execute(*self.build_query(table_name, columns, where, params, updated_since))
+            column_names = [description[0] for description in cursor.description]
+            types = [self.ARROW_TYPES.get(declared.get(name), "string") for name in column_names]
+            schema = pa.schema([(name, pa.type_for_alias(arrow_type)) for name, arrow_type in zip(column_names, types)])
+            exported = 0
+            with pq.ParquetWriter(parquet_file_path, schema) as writer:
+                for rows in self.iter_batches(cursor):
+                    arrays = [pa.array([self.to_arrow(row[position], types[position]) for row in rows], type=field.type)
+                              for position, field in enumerate(schema)]
+                    writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+                    exported += len(rows)
+            print(f"{exported} rows from table '{table_name}' have been exported to '{parquet_file_path}'.")
+            return exported
+        except Exception as e:
+            print(f"Error exporting table '{table_name}': {e}")
+            return 0
+        finally:
+            conn.close()
+
+    @classmethod
+    def to_arrow(cls, value, arrow_type):
+        # SQLite doesn't enforce column types, so coerce stray values to the column's type
+        if value is None or value == "":
+            return None
+        try:
+            if arrow_type == "string":
+                return str(value)
+            if arrow_type == "bool":
+                return bool(value)
+            if arrow_type == "int64":
+                return int(value)
+            return float(value)
+        except (TypeError, ValueError):
+            return None
@@ -1,84 +1,172 @@
-from hardware import CPU, GPU, Hardware
-from products import ProductManager
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
-from products import ProductManager, Product
+from hardware import CPU, GPU, HardwareManager
+from database import get_engine, get_session_factory
+from products import Product
+from sqlalchemy import select, update, bindparam
 from sqlalchemy.exc import SQLAlchemyError
+import numpy as np
 import logging
 from fuzzywuzzy import process
-from fuzzywuzzy import fuzz
+from fuzzywuzzy import utils
+from collections import Counter, defaultdict
+import math
 import re
+import time
+from metrics import run_metrics
+
+# Intel-style model numbers (i7-1255U), written with a hyphen or a space
+MODEL_NUMBER = re.compile(r'\b([a-z]\d)[- ](\d{4,5}[a-z]*)\b')
+
+class HardwareNameIndex:
+    """Normalized CPU/GPU names with lookup structures, built once per scoring run.
+
+    A query is answered from an exact hash of the normalized name when
+    possible. Otherwise the names sharing its model number (i7-1255U, read
+    from the raw names since normalizing splits it), or failing that the
+    names sharing its rarest tokens, are shortlisted, and only that
+    shortlist is fuzzy scored.
+    """
+    def __init__(self, hardware_names, shortlist_size=15):
+        self.names = list(hardware_names)
+        self.shortlist_size = shortlist_size
+        self.cleaned = [Score.remove_brand(name) for name in self.names]
+        self.processed = [utils.full_process(name) for name in self.cleaned]
+        self.exact = {}
+        self.postings = defaultdict(list)
+        self.models = defaultdict(list)
+        for position, processed in enumerate(self.processed):
+            self.exact.setdefault(processed, position)
+            for token in self.tokens(processed):
+                self.postings[token].append(position)
+            for model in self.model_numbers(self.names[position]):
+                self.models[model].append(position)
+        total = max(len(self.names), 1)
+        self.weights = {token: math.log(total / len(positions)) for token, positions in self.postings.items()}
+        self.matches = {}
+
+    @classmethod
+    def tokens(cls, processed):
+        return set(processed.split())
+
+    @classmethod
+    def model_numbers(cls, name):
+        return {f"{series}-{number}" for series, number in MODEL_NUMBER.findall(str(name).lower())}
+
+    def model_shortlist(self, product_name):
+        return sorted({position for model in self.model_numbers(product_name) for position in self.models.get(model, ())})
+
+    def shortlist(self, processed):
+        scores = Counter()
+        for token in self.tokens(processed):
+            weight = self.weights.get(token)
+            # Tokens found in most names (core, graphics) don't narrow anything down
+            if weight is None or weight < 1:
+                continue
+            if any(character.isdigit() for character in token):
+                weight *= 2
+            for position in self.postings[token]:
+                scores[position] += weight
+        return [position for position, _ in scores.most_common(self.shortlist_size)]
+
+    def match(self, product_name):
+        """Returns (best matching name or None, score, cleaned product name)."""
+        if product_name in self.matches:
+            return self.matches[product_name]
+        cleaned_product_name = Score.remove_brand(product_name)
+        processed = utils.full_process(cleaned_product_name)
+        if processed in self.exact:
+            result = (self.names[self.exact[processed]], 100, cleaned_product_name)
+        else:
+            candidates = self.model_shortlist(product_name) or self.shortlist(processed) or range(len(self.names))
+            choices = {position: self.cleaned[position] for position in candidates}
+            best = process.extractOne(cleaned_product_name, choices) if choices else None
+            if best:
+                _, score, position = best
+                result = (self.names[position], score, cleaned_product_name)
+            else:
+                result = (None, 0, cleaned_product_name)
+        self.matches[product_name] = result
+        return result
 
 class Score:
+    # Bump when the matching rules change so cached matches are recomputed
+    MATCHER_VERSION = "index-2"
+
     def __init__(self, product_db, hardware_db):
         self.hardware_db = hardware_db
         self.product_db = product_db
         try:
-            self.engine_cdw = create_engine(self.product_db)
-            self.Session_cdw = sessionmaker(bind=self.engine_cdw)
-            self.engine_hardware = create_engine(self.hardware_db)
-            self.Session_hardware = sessionmaker(bind=self.engine_hardware)
+            self.engine_cdw = get_engine(self.product_db)
+            self.Session_cdw = get_session_factory(self.product_db)
+            self.engine_hardware = get_engine(self.hardware_db)
+            self.Session_hardware = get_session_factory(self.hardware_db)
+            self.hardware_manager = HardwareManager(self.hardware_db)
         except SQLAlchemyError as e:
             logging.error(f"Error initializing database connections: {e}")
             raise
 
 
     def calculate_scores(self):
+        """Scores scanned products one at a time, then writes every score in one bulk update."""
+        session_cdw = None
+        session_hardware = None
         try:
             session_cdw = self.Session_cdw()
             session_hardware = self.Session_hardware()
             products = session_cdw.query(Product).filter_by(scanned=True).yield_per(100)
-            cpus = {cpu.name: cpu for cpu in session_hardware.query(CPU).all()}
-            gpus = {gpu.name: gpu for gpu in session_hardware.query(GPU).all()}
-            cpu_names = list(cpus.keys())
-            gpu_names = list(gpus.keys())
-            try:
-                for product in products:
+            cpus, cpu_names, cpu_version, cpu_matches = self.load_hardware(session_hardware, CPU, 'cpu')
+            gpus, gpu_names, gpu_version, gpu_matches = self.load_hardware(session_hardware, GPU, 'gpu')
+            new_cpu_matches = {}
+            new_gpu_matches = {}
+            results = []
+            for product in products:
+                start = time.perf_counter()
+                try:
                     if product.cpu:
-                        if product.cpu in cpus:
-                            matched_cpu_name = product.cpu  # Exact match found
-                        else:
-                            matched_cpu_name = self.fuzzy_match_name(product.cpu, cpu_names)  # Fuzzy match if no exact match
+                        matched_cpu_name = self.cached_match(product.cpu, cpus, cpu_names, cpu_matches, new_cpu_matches)
                     else:
-                        logging.error(f"Product {product.id} has no CPU information.")
+                        logging.error(f"Product {product.sku} has no CPU information.")
                         matched_cpu_name = "N/A"
                     # Check for an exact GPU match first
                     if product.gpu:
-                        if product.gpu in gpus:
-                            matched_gpu_name = product.gpu  # Exact match found
-                        else:
-                            matched_gpu_name = self.fuzzy_match_name(product.gpu, gpu_names)  # Fuzzy match if no exact match
+                        matched_gpu_name = self.cached_match(product.gpu, gpus, gpu_names, gpu_matches, new_gpu_matches)
                     else:
-                        logging.error(f"Product {product.id} has no GPU information.")
+                        logging.error(f"Product {product.sku} has no GPU information.")
                         matched_gpu_name = "N/A"
-                    # Only score if a match is found
+                    # Only score if a match is found; otherwise the stored score is kept
+                    cpu_score = product.cpu_score
                     if matched_cpu_name:
-                        product.cpu_score = self.hardware_score(matched_cpu_name, cpus)
+                        cpu_score = self.hardware_score(matched_cpu_name, cpus)
                     else:
                         logging.warning(f"No suitable match found for CPU: {product.cpu}")
-
+                    gpu_score = product.gpu_score
                     if matched_gpu_name:
-                        product.gpu_score = self.hardware_score(matched_gpu_name, gpus)
+                        gpu_score = self.hardware_score(matched_gpu_name, gpus)
                     else:
                         logging.warning(f"No suitable match found for GPU: {product.gpu}")
-            
-                    product.storage_score = self.storage_score(product.storage)
-                    product.ram_score = self.ram_score(product.ram)
-                    product.ff_score = self.ff_score(product.form_factor)
-                    session_cdw.commit()
-                    print(f"Product {product.sku}, FF Score: {product.ff_score} CPU Score: {product.cpu_score}, GPU Score: {product.gpu_score}, Storage Score: {product.storage_score}, RAM Score: {product.ram_score}")
-           
-            except KeyError as e:
-                logging.warning(f"Hardware not found for product {product.sku}: {e}")
-                session_cdw.rollback()  # Rollback only if there's an issue with this product
-            except Exception as e:
-                logging.error(f"Error processing product {product.sku}: {e}")
-                session_cdw.rollback()  # Rollback for this product only and move to the next product
+
+                    storage_score = self.storage_score(product.storage)
+                    ram_score = self.ram_score(product.ram)
+                    ff_score = self.ff_score(product.form_factor)
+                except KeyError as e:
+                    logging.warning(f"Hardware not found for product {product.sku}: {e}")
+                    continue
+                except Exception as e:
+                    logging.error(f"Error processing product {product.sku}: {e}")
+                    continue
+                results.append({"b_sku": product.sku, "b_cpu": cpu_score, "b_gpu": gpu_score,
+                                "b_storage": storage_score, "b_ram": ram_score, "b_ff": ff_score})
+                run_metrics.record("score", time.perf_counter() - start, sku=product.sku)
+                print(f"Product {product.sku}, FF Score: {ff_score} CPU Score: {cpu_score}, GPU Score: {gpu_score}, Storage Score: {storage_score}, RAM Score: {ram_score}")
+            self.write_scores(results)
+            if new_cpu_matches:
+                self.hardware_manager.save_matches('cpu', self.MATCHER_VERSION, cpu_version, new_cpu_matches)
+            if new_gpu_matches:
+                self.hardware_manager.save_matches('gpu', self.MATCHER_VERSION, gpu_version, new_gpu_matches)
+            return len(results)
 
         except SQLAlchemyError as e:
             logging.error(f"Database query failed: {e}")
-            if session_cdw:
-                session_cdw.rollback()  # Rollback session-wide only for SQLAlchemy-related errors
+            return 0
 
         finally:
             if session_cdw:
@@ -86,6 +174,128 @@ class Score:
             if session_hardware:
                 session_hardware.close()
 
+    def calculate_scores_columnar(self):
+        """Scores every scanned product in one pass over column arrays.
+
+        Gives the same results as calculate_scores. Hardware strings are
+        matched once per distinct value, and all rows are written back in a
+        single bulk update.
+        """
+        session_hardware = self.Session_hardware()
+        start = time.perf_counter()
+        try:
+            cpus, cpu_names, cpu_version, cpu_matches = self.load_hardware(session_hardware, CPU, 'cpu')
+            gpus, gpu_names, gpu_version, gpu_matches = self.load_hardware(session_hardware, GPU, 'gpu')
+            table = Product.__table__
+            columns = [table.c[name] for name in ("SKU", "CPU", "GPU", "storage", "RAM", "form factor", "cpu score", "gpu score")]
+            with self.engine_cdw.connect() as connection:
+                rows = connection.execute(select(*columns).where(table.c.scanned == True)).all()
+            if not rows:
+                return 0
+            skus, cpu_column, gpu_column, storage, ram, form_factor, old_cpu, old_gpu = map(list, zip(*rows))
+
+            new_cpu_matches = {}
+            new_gpu_matches = {}
+            cpu_score = self.hardware_scores(cpu_column, old_cpu, cpus, cpu_names, cpu_matches, new_cpu_matches)
+            gpu_score = self.hardware_scores(gpu_column, old_gpu, gpus, gpu_names, gpu_matches, new_gpu_matches)
+            storage_score = self.amount_scores(storage)
+            ram_score = self.amount_scores(ram)
+            codes, values = self.factorize(form_factor)
+            ff_score = np.array([self.ff_score(value) for value in values], dtype=float)[codes]
+
+            results = [{"b_sku": sku, "b_cpu": cpu, "b_gpu": gpu, "b_storage": storage_value,
+                        "b_ram": ram_value, "b_ff": ff}
+                       for sku, cpu, gpu, storage_value, ram_value, ff in
+                       zip(skus, cpu_score.tolist(), gpu_score.tolist(), storage_score.tolist(),
+                           ram_score.tolist(), ff_score.tolist())]
+            self.write_scores(results)
+            self.hardware_manager.save_matches('cpu', self.MATCHER_VERSION, cpu_version, new_cpu_matches)
+            self.hardware_manager.save_matches('gpu', self.MATCHER_VERSION, gpu_version, new_gpu_matches)
+            run_metrics.record("score", time.perf_counter() - start, items=len(results))
+            logging.info(f"Scored {len(results)} products")
+            return len(results)
+        except SQLAlchemyError as e:
+            logging.error(f"Columnar scoring failed: {e}")
+            return 0
+        finally:
+            session_hardware.close()
+
+    def write_scores(self, results):
+        """Writes {b_sku, b_cpu, b_gpu, b_storage, b_ram, b_ff} rows in one executemany update."""
+        if not results:
+            return
+        table = Product.__table__
+        statement = update(table).where(table.c.SKU == bindparam("b_sku")).values({
+            "cpu score": bindparam("b_cpu"), "gpu score": bindparam("b_gpu"),
+            "storage score": bindparam("b_storage"), "ram score": bindparam("b_ram"),
+            "ff score": bindparam("b_ff")})
+        with self.engine_cdw.begin() as connection:
+            connection.execute(statement, results)
+
+    def load_hardware(self, session_hardware, hardware_class, kind):
+        """Returns the benchmark rows, their name index, list fingerprint and cached matches."""
+        hardwares = {hardware.name: hardware for hardware in session_hardware.query(hardware_class).all()}
+        hardware_names = HardwareNameIndex(hardwares.keys())
+        list_version = HardwareManager.list_version({name: hardware.score for name, hardware in hardwares.items()})
+        matches = self.hardware_manager.get_matches(kind, self.MATCHER_VERSION, list_version)
+        return hardwares, hardware_names, list_version, matches
+
+    @classmethod
+    def factorize(cls, values):
+        """Returns (codes, distinct values) so per-value work runs once per distinct value."""
+        positions = {}
+        codes = np.fromiter((positions.setdefault(value, len(positions)) for value in values), dtype=np.intp, count=len(values))
+        return codes, list(positions)
+
+    @classmethod
+    def hardware_scores(cls, names, old_scores, hardwares, hardware_names, matches, new_matches):
+        codes, values = cls.factorize(names)
+        scores = np.empty(len(values))
+        keep = np.zeros(len(values), dtype=bool)
+        for position, name in enumerate(values):
+            matched_name = cls.cached_match(name, hardwares, hardware_names, matches, new_matches) if name else "N/A"
+            if matched_name:
+                scores[position] = cls.hardware_score(matched_name, hardwares)
+            else:
+                # Like the row path, an unmatched name leaves the stored score as it was
+                keep[position] = True
+        result = scores[codes]
+        unmatched = keep[codes]
+        result[unmatched] = [old_scores[row] or 0 for row in np.flatnonzero(unmatched)]
+        return result
+
+    @classmethod
+    def amount_scores(cls, values):
+        # Converted one value at a time like storage_score/ram_score, so a bad value scores 0 instead of failing the run
+        codes, distinct = cls.factorize(values)
+        return np.array([cls.amount_score(value) for value in distinct], dtype=float)[codes]
+
+    @classmethod
+    def amount_score(cls, amount):
+        """A storage (GB) or RAM amount as a number; missing or unreadable amounts score 0."""
+        if amount == "N/A" or amount is None:
+            return 0
+        try:
+            return float(amount)
+        except (TypeError, ValueError) as e:
+            logging.error(f"Unreadable amount {amount!r}: {e}")
+            return 0
+
+    @classmethod
+    def cached_match(cls, product_name, hardwares, hardware_names, matches, new_matches):
+        """Resolves a product's CPU/GPU string, reusing matches saved by earlier runs."""
+        if product_name in matches:
+            return matches[product_name][0]
+        if product_name in hardwares:
+            matched_name, confidence = product_name, 100  # Exact match found
+        else:
+            matched_name = cls.fuzzy_match_name(product_name, hardware_names)  # Fuzzy match if no exact match
+            confidence = hardware_names.match(product_name)[1]
+        # Misses are cached too so unmatched names aren't fuzzy scored every run
+        score = hardwares[matched_name].score if matched_name else None
+        matches[product_name] = new_matches[product_name] = (matched_name, score, confidence)
+        return matched_name
+
     @classmethod
     def hardware_score(cls, hardware_name, hardwares):
         try:
@@ -107,29 +317,11 @@ class Score:
 
     @classmethod
     def storage_score(cls, storage):
-        try:
-            if storage == "N/A" or storage is None:
-                return 0
-            return storage
-        except TypeError as e:
-            logging.error(f"TypeError calculating storage score: {e}")
-            return 0
-        except Exception as e:
-            logging.error(f"Unexpected error calculating storage score: {e}")
-            return 0
+        return cls.amount_score(storage)
 
     @classmethod
     def ram_score(cls, ram):
-        try:
-            if ram == "N/A" or ram is None:
-                return 0
-            return ram 
-        except TypeError as e:
-            logging.error(f"TypeError calculating RAM score: {e}")
-            return 0
-        except Exception as e:
-            logging.error(f"Unexpected error calculating RAM score: {e}")
-            return 0
+        return cls.amount_score(ram)
 
     @classmethod
     def ff_score(cls, ff_value):
@@ -163,12 +355,9 @@ class Score:
 
     @classmethod 
     def fuzzy_match_name(cls, product_name, hardware_names, threshold=80):
-        original_hardware_names = hardware_names
-        cleaned_product_name = cls.remove_brand(product_name)
-        cleaned_hardware_names = [cls.remove_brand(name) for name in hardware_names]
-        best_match_cleaned, score = process.extractOne(cleaned_product_name, cleaned_hardware_names)
-        if best_match_cleaned:
-            best_match_original = original_hardware_names[cleaned_hardware_names.index(best_match_cleaned)]
+        if not isinstance(hardware_names, HardwareNameIndex):
+            hardware_names = HardwareNameIndex(hardware_names)
+        best_match_original, score, cleaned_product_name = hardware_names.match(product_name)
         logging.info(f"Attempting to match '{cleaned_product_name}' (original: '{product_name}') "
                     f"- Best match: '{best_match_original}' with score: {score}%")
         if score >= threshold:
@@ -178,22 +367,10 @@ class Score:
             logging.info(f"No suitable match for '{product_name}' (best score was {score}%)")
             return None
         
+    # Common CPU and GPU brand words, removed before matching names
+    BRAND_PATTERN = re.compile(r'\b(?:Intel|AMD|NVIDIA|GeForce|Radeon|Embedded|Ryzen)\b', re.IGNORECASE)
+
     @classmethod
     def remove_brand(cls, name):
-        # Define patterns for common CPU and GPU brands to remove
-        brand_patterns = [
-            r'\bIntel\b',
-            r'\bAMD\b',
-            r'\bNVIDIA\b',
-            r'\bGeForce\b',
-            r'\bRadeon\b',
-            r'\bEmbedded\b',
-            r'\bRyzen\b',
-        ]
-        
-        # Remove each brand pattern
-        for pattern in brand_patterns:
-            name = re.sub(pattern, '', name, flags=re.IGNORECASE)
-        
         # Strip extra spaces after removing brand names
-        return name.strip()
\ No newline at end of file
+        return cls.BRAND_PATTERN.sub('', name).strip()
\ No newline at end of file
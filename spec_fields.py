@@ -0,0 +1,114 @@
+import lxml.etree
+import lxml.html
+
+# A cell's text nodes, leaving out script and style contents as get_text does
+CELL_TEXT = lxml.etree.XPath(".//text()[not(ancestor::script or ancestor::style)]")
+
+class SpecFieldMap:
+    """A retailer's spec table rules from html_tags, compiled once per scraper class.
+
+    `rows` parses the spec HTML with lxml and pulls out the label/value pairs,
+    and `apply` turns them into the specs dict, field by field in the
+    configured order. Cell text is what BeautifulSoup's get_text(strip=True)
+    gives, without script and style contents. Rows differ from the old
+    BeautifulSoup pass in one way: only a row's outermost cells are counted,
+    so a value with spans nested inside its span is read instead of the row
+    being skipped as having more than two cells.
+    """
+    compiled = {}
+
+    def __init__(self, config, extractor):
+        self.row_xpath = config["row_xpath"]
+        self.cell_tag = config["cell_tag"]
+        self.label_strip = config.get("label_strip", "")
+        self.fields = [(name, self.compile_rule(rule, extractor)) for name, rule in config["fields"].items()]
+
+    @classmethod
+    def for_scraper(cls, extractor, config):
+        field_map = cls.compiled.get(extractor)
+        if field_map is None:
+            field_map = cls.compiled[extractor] = cls(config, extractor)
+        return field_map
+
+    @classmethod
+    def compile_rule(cls, rule, extractor):
+        if "method" in rule:
+            method = getattr(extractor, rule["method"])
+            args = rule.get("args", [])
+            return lambda data, context: method(data, *[context[arg] for arg in args])
+        labels = rule["labels"]
+        default = rule.get("default", "N/A")
+        skip_empty = rule.get("skip_empty", False)
+
+        def lookup(data):
+            for label in labels:
+                value = data.get(label)
+                if value is not None and (value or not skip_empty):
+                    return value
+            return None
+
+        if "yes_if_contains" in rule:
+            words = [word.lower() for word in rule["yes_if_contains"]]
+            def contains(data, context):
+                value = (lookup(data) or default).lower()
+                return "Yes" if any(word in value for word in words) else "No"
+            return contains
+        if rule.get("capacity"):
+            def capacity(data, context):
+                value = lookup(data)
+                if not value:
+                    return 0
+                value = value.upper()
+                if "GB" in value:
+                    return int(value.replace("GB", "").strip())
+                if "TB" in value:
+                    return int(value.replace("TB", "").strip()) * 1000
+                return value
+            return capacity
+
+        def passthrough(data, context):
+            value = lookup(data)
+            return default if value is None else value
+        return passthrough
+
+    def rows(self, specs_html):
+        """Returns {label: value} for every spec row with exactly two cells."""
+        data = {}
+        if not specs_html.strip():
+            return data
+        root = lxml.html.fragment_fromstring(specs_html, create_parent="div")
+        for row in root.xpath(self.row_xpath):
+            columns = self.cells(row)
+            if len(columns) == 2:
+                label = self.cell_text(columns[0])
+                if self.label_strip:
+                    label = label.replace(self.label_strip, "")
+                data[label] = self.cell_text(columns[1])
+        return data
+
+    def cells(self, row):
+        # Only the outermost cells: a span inside a value span is part of the value, not a third cell
+        return [cell for cell in row.iter(self.cell_tag)
+                if not any(ancestor.tag == self.cell_tag for ancestor in self.ancestors(cell, row))]
+
+    @classmethod
+    def ancestors(cls, element, row):
+        for ancestor in element.iterancestors():
+            if ancestor is row:
+                return
+            yield ancestor
+
+    @classmethod
+    def cell_text(cls, element):
+        # Text of the cell and everything in it, each piece stripped, like get_text(strip=True)
+        return "".join(part for part in (piece.strip() for piece in CELL_TEXT(element)) if part)
+
+    def apply(self, data, **context):
+        specs = {}
+        for name, rule in self.fields:
+            # Later rules can take earlier fields as arguments (CDW names drop the brand)
+            specs[name] = context[name] = rule(data, context)
+        return specs
+
+    def parse(self, specs_html, **context):
+        return self.apply(self.rows(specs_html), **context)
@@ -0,0 +1,8 @@
+import pytest
+
+from metrics import run_metrics
+
+@pytest.fixture(autouse=True)
+def metrics_file(tmp_path, monkeypatch):
+    # Steps timed during tests go to a scratch file, not the working directory's metrics.jsonl
+    monkeypatch.setattr(run_metrics, "path", str(tmp_path / "metrics.jsonl"))
@@ -0,0 +1,27 @@
+import pytest
+
+from database import dispose_all
+from hardware import CPU, HardwareManager
+
+CPUS = {f"CPU {index}": float(index) for index in range(20)}
+
+@pytest.fixture(autouse=True)
+def dispose_engines():
+    yield
+    dispose_all()
+
+@pytest.fixture
+def hardware_manager(tmp_path):
+    hardware_manager = HardwareManager(f"sqlite:///{tmp_path / 'hardware.db'}")
+    hardware_manager.sync_hardware(CPU, CPUS)
+    return hardware_manager
+
+def test_sync_removes_rows_missing_from_a_full_scrape(hardware_manager):
+    scores = {name: score + 1 for name, score in CPUS.items() if name != "CPU 0"}
+    assert hardware_manager.sync_hardware(CPU, scores) == {"added": 0, "changed": 19, "removed": 1}
+    assert hardware_manager.get_all_hardware_scores(CPU) == scores
+
+def test_sync_keeps_rows_when_the_scrape_shrinks(hardware_manager):
+    scores = {"CPU 0": 100.0, "CPU 1": 1.0, "New CPU": 5.0}
+    assert hardware_manager.sync_hardware(CPU, scores) == {"added": 1, "changed": 1, "removed": 0}
+    assert hardware_manager.get_all_hardware_scores(CPU) == dict(CPUS, **scores)
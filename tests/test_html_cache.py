@@ -0,0 +1,48 @@
+import os
+import time
+
+from html_cache import HtmlCache
+
+def test_nothing_is_created_until_a_page_is_cached(tmp_path):
+    cache = HtmlCache(tmp_path / "cache")
+    assert cache.get("https://example.com/a") is None
+    assert cache.pages() == []
+    assert cache.evict() == 0
+    assert not os.path.exists(tmp_path / "cache")
+    cache.put("https://example.com/a", "<p>a</p>")
+    assert os.path.exists(tmp_path / "cache" / "index.db")
+    cache.close()
+
+def test_latest_fetch_wins_and_identical_pages_share_a_blob(tmp_path):
+    cache = HtmlCache(tmp_path)
+    first = cache.put("https://example.com/a", "<p>old</p>", fetched_at=1000)
+    cache.put("https://example.com/a", "<p>new</p>", fetched_at=2000)
+    assert cache.put("https://example.com/b", "<p>old</p>", fetched_at=1500) == first
+    assert cache.get("https://example.com/a") == "<p>new</p>"
+    assert cache.get("https://example.com/b") == "<p>old</p>"
+    assert cache.pages() == [("https://example.com/a", "<p>new</p>"), ("https://example.com/b", "<p>old</p>")]
+    cache.close()
+
+def test_evict_drops_expired_then_oldest_pages(tmp_path):
+    cache = HtmlCache(tmp_path, max_age_days=1)
+    now = time.time()
+    cache.put("https://example.com/expired", "<p>expired</p>", fetched_at=now - 3 * 86400)
+    cache.put("https://example.com/old", "<p>old</p>" * 50, fetched_at=now - 60)
+    newest = cache.put("https://example.com/new", "<p>new</p>" * 50, fetched_at=now)
+    cache.max_bytes = os.path.getsize(cache.blob_path(newest))
+    assert cache.evict() == 2
+    assert cache.get("https://example.com/expired") is None
+    assert cache.get("https://example.com/old") is None
+    assert cache.get("https://example.com/new") == "<p>new</p>" * 50
+    cache.close()
+
+def test_a_missing_blob_is_a_miss(tmp_path):
+    cache = HtmlCache(tmp_path)
+    digest = cache.put("https://example.com/a", "<p>a</p>")
+    os.remove(cache.blob_path(digest))
+    assert cache.get("https://example.com/a") is None
+    # The index forgot the page, so the next fetch stores it again
+    assert cache.pages() == []
+    cache.put("https://example.com/a", "<p>a</p>")
+    assert cache.get("https://example.com/a") == "<p>a</p>"
+    cache.close()
@@ -0,0 +1,40 @@
+import json
+import logging
+
+from metrics import RunMetrics
+
+def test_percentile_is_nearest_rank():
+    ordered = list(range(1, 101))
+    assert RunMetrics.percentile(ordered, 50) == 50
+    assert RunMetrics.percentile(ordered, 95) == 95
+    assert RunMetrics.percentile(ordered, 99) == 99
+    assert RunMetrics.percentile([3.0], 99) == 3.0
+    assert RunMetrics.percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.0
+
+def test_records_are_tagged_and_flushed(tmp_path):
+    metrics = RunMetrics(path=tmp_path / "metrics.jsonl", flush_every=3)
+    with metrics.item("SKU1"):
+        metrics.record("parse", 0.5, "cdw")
+        with metrics.timer("commit", "cdw", items=25):
+            pass
+    metrics.record("get", 1.0, "cdw")
+    lines = [json.loads(line) for line in (tmp_path / "metrics.jsonl").read_text().splitlines()]
+    assert [(line["stage"], line["sku"], line["items"]) for line in lines] == [("parse", "SKU1", 1), ("commit", "SKU1", 25),
+                                                                                 ("get", None, 1)]
+    metrics.record("get", 2.0, "cdw")
+    metrics.flush()
+    assert len((tmp_path / "metrics.jsonl").read_text().splitlines()) == 4
+
+def test_report_lists_stages_in_order(tmp_path, caplog):
+    metrics = RunMetrics(path=tmp_path / "metrics.jsonl")
+    for seconds in (0.1, 0.2, 0.3, 0.4):
+        metrics.record("parse", seconds, "cdw")
+    metrics.record("get", 1.5, "cdw")
+    metrics.record("custom", 1.0)
+    with caplog.at_level(logging.INFO):
+        metrics.report()
+    stages = [message.split()[0] for message in caplog.messages if "steps" in message]
+    assert stages == ["get", "parse", "custom"]
+    parse_line = next(message for message in caplog.messages if message.startswith("parse"))
+    assert "p50 0.200s" in parse_line and "p99 0.400s" in parse_line
+    assert any(message.startswith("cdw: ") and "pages/min" in message for message in caplog.messages)
@@ -0,0 +1,34 @@
+import pytest
+
+import pacing
+from pacing import Pacer, get_pacer, set_pacing
+
+@pytest.fixture(autouse=True)
+def fresh_pacers(monkeypatch):
+    monkeypatch.setattr(pacing, "pacers", {})
+    monkeypatch.setattr(pacing, "RETAILER_PACING", {"cdw": {"rpm": 20, "jitter": 0.4}})
+
+def test_backoff_grows_on_trouble_and_recovers():
+    pacer = Pacer("test", rpm=60, slow_after=10.0, max_backoff=4.0)
+    pacer.record(1.0, challenged=True)
+    assert pacer.backoff == 2.0
+    pacer.record(12.0)
+    assert pacer.backoff == 3.0
+    pacer.record(1.0, challenged=True)
+    assert pacer.backoff == 4.0
+    assert pacer.interval == 4.0
+    for _ in range(50):
+        pacer.record(1.0)
+    assert pacer.backoff == 1.0
+
+def test_workers_share_one_budget():
+    assert get_pacer("cdw") is get_pacer("cdw")
+    assert get_pacer("cdw").rpm == 20
+
+def test_set_pacing_changes_current_and_later_pacers():
+    pacer = get_pacer("cdw")
+    set_pacing("cdw", rpm=40)
+    set_pacing("insight", rpm=15)
+    assert pacer.rpm == 40
+    assert pacer.jitter == 0.4
+    assert get_pacer("insight").rpm == 15
@@ -0,0 +1,63 @@
+from pfv import competitor_buckets, competitors, merge_listing, nearest_rows
+
+def row(sku, brand, score, category="Notebook"):
+    product = [""] * 42
+    product[0], product[5], product[25], product[30] = sku, brand, score, category
+    return product
+
+def brute_force_nearest(products, indexes, score, count):
+    # The reference rule: closest scores first, ties to the earlier row, unscored rows 0 away
+    def distance(index):
+        other = products[index][25]
+        try:
+            return 0.0 if score is None else abs(score - float(other))
+        except ValueError:
+            return 0.0
+    return sorted(indexes, key=lambda index: (distance(index), index))[:count]
+
+def test_nearest_rows_match_a_full_sort():
+    scores = ["10", "20", "20", "35", "n/a", "50", "50", "70", "", "90", "20"]
+    products = [row(f"D{index}", "Dell", score) for index, score in enumerate(scores)]
+    bucket = competitor_buckets(products)[("Notebook", "Dell")]
+    for score in (None, 0.0, 20.0, 27.5, 42.5, 50.0, 100.0):
+        for count in (1, 3, 5, 11, 20):
+            assert nearest_rows(bucket, score, count) == brute_force_nearest(products, range(len(products)), score, count)
+
+def test_competitors_fill_the_rival_columns_from_the_same_category():
+    products = [row("L1", "Lenovo", "50"),
+                row("D1", "Dell", "10"), row("D2", "Dell", "48"), row("D3", "Dell", "60"),
+                row("H1", "HP", "51"), row("H2", "HP", "49"),
+                row("D4", "Dell", "50", category="Desktop"),
+                row("A1", "Acer", "50")]
+    competitors(products)
+    # Lenovo gets up to 5 Dell then up to 5 HP rivals, nearest first
+    assert products[0][31:37] == ["D2", "D3", "D1", "H1", "H2", ""]
+    # Dell and HP are compared against Lenovo only
+    assert products[1][31:33] == ["L1", ""]
+    assert products[4][31] == "L1"
+    # No rivals in another category, and no rivals for brands without a rule
+    assert products[6][31] == ""
+    assert products[7][31:] == [""] * 11
+
+def listed(sku, stock, price, category="Notebook", updated="01/01/2024"):
+    product = row(sku, "Lenovo", "50", category)
+    product[1], product[2], product[26], product[27] = stock, price, f"https://example.com/{sku}", updated
+    return product
+
+def test_merge_refreshes_listing_fields_and_keeps_specs():
+    local = [listed("A", "5", "999"), listed("B", "1", "500"), listed("C", "2", "700"),
+             listed("Z", "3", "400", category="Desktop")]
+    local[0][8] = "Intel Core i7-1355U"
+    web = [listed("A", "4", "949"), listed("B", "1", "500"), listed("N", "9", "1200")]
+    merged, summary = merge_listing(web, local, "02/01/2024")
+    assert summary == {'new': 1, 'changed': 1, 'vanished': 1}
+    assert [product[0] for product in merged] == ["A", "B", "C", "Z", "N"]
+    assert (merged[0][1], merged[0][2], merged[0][8]) == ("4", "949", "Intel Core i7-1355U")
+    # Listed products get today's date; the vanished one and other categories keep theirs
+    assert [product[27] for product in merged] == ["02/01/2024", "02/01/2024", "01/01/2024", "01/01/2024", "02/01/2024"]
+
+def test_merge_uses_the_first_row_of_a_duplicated_sku():
+    local = [listed("A", "5", "999"), listed("A", "0", "1"), listed("B", "1", "500")]
+    merged, summary = merge_listing([listed("A", "6", "899")], local, "02/01/2024")
+    assert (merged[0][1], merged[1][1]) == ("6", "0")
+    assert summary['new'] == 0
@@ -0,0 +1,69 @@
+import threading
+from contextlib import contextmanager
+
+import pipeline
+from pipeline import Ready, ScanPipeline
+
+@contextmanager
+def fetcher():
+    def fetch(job):
+        sku, kind = job
+        if kind == "ready":
+            return Ready(f"{sku} ready")
+        if kind == "drop":
+            return None
+        if kind == "broken":
+            raise ValueError("page failed")
+        return sku
+    yield fetch
+
+def parse(payload):
+    if payload == "BAD":
+        raise ValueError("unparseable")
+    return payload.lower()
+
+def run_with_timeout(scan, jobs, timeout=20):
+    outcome = {}
+    def target():
+        try:
+            outcome["metrics"] = scan.run(jobs)
+        except Exception as e:
+            outcome["error"] = e
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "pipeline deadlocked"
+    return outcome
+
+def test_results_reach_the_writer_and_item_failures_are_skipped():
+    written = []
+    scan = ScanPipeline("test", fetcher, parse, written.extend, fetchers=3, parse_workers=0, batch_size=4)
+    jobs = [(f"SKU{index}", "page") for index in range(10)] + [("R", "ready"), ("D", "drop"), ("X", "broken"), ("BAD", "page")]
+    outcome = run_with_timeout(scan, jobs)
+    assert "error" not in outcome
+    assert sorted(written) == sorted([((f"SKU{index}", "page"), f"sku{index}") for index in range(10)]
+                                     + [(("R", "ready"), "R ready")])
+    assert scan.metrics["fetch"].errors == 1
+    assert scan.metrics["parse"].errors == 1
+
+def test_a_parse_pool_that_cannot_start_stops_the_run(monkeypatch):
+    def broken_pool(max_workers):
+        raise OSError("no processes")
+    monkeypatch.setattr(pipeline, "ProcessPoolExecutor", broken_pool)
+    written = []
+    scan = ScanPipeline("test", fetcher, parse, written.extend, fetchers=2, parse_workers=2, queue_size=2)
+    outcome = run_with_timeout(scan, [(f"SKU{index}", "page") for index in range(200)])
+    assert isinstance(outcome["error"], OSError)
+    assert scan.stop.is_set()
+
+def test_a_writer_that_dies_mid_run_stops_it_without_blocking_upstream():
+    scan = ScanPipeline("test", fetcher, parse, lambda batch: None, fetchers=2, parse_workers=0, queue_size=2)
+    # Per-batch errors are logged and skipped; this fails the stage itself after its first item
+    def write_batches(write_queue):
+        scan.take(write_queue)
+        raise RuntimeError("writer stage died")
+    scan.write_batches = write_batches
+    outcome = run_with_timeout(scan, [(f"SKU{index}", "page") for index in range(200)])
+    assert isinstance(outcome["error"], RuntimeError)
+    # Jobs still queued when the writer died were skipped, not fetched
+    assert scan.metrics["fetch"].items < 200
@@ -0,0 +1,138 @@
+import csv
+import sqlite3
+
+import pytest
+
+from database import dispose_all
+from products import CrawlStateManager, DatabaseExporter, PriceHistoryManager, Product, ProductManager, ScanWorkList
+
+@pytest.fixture(autouse=True)
+def dispose_engines():
+    yield
+    dispose_all()
+
+@pytest.fixture
+def db_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'products.db'}"
+
+def stored(db_url):
+    session = ProductManager(db_url).get_session()
+    try:
+        return {product.sku: product for product in session.query(Product).all()}
+    finally:
+        session.close()
+
+def seed_unscanned(db_url, count):
+    ProductManager(db_url).upsert_products([dict(sku=f"SKU{index}", url=f"https://example.com/{index}", type="notebook")
+                                            for index in range(count)])
+
+def test_work_list_hands_out_each_product_once_per_pass(db_url):
+    seed_unscanned(db_url, 5)
+    work_list = ScanWorkList(db_url)
+    jobs = list(work_list.jobs(batch_size=2))
+    assert [sku for sku, url, type in jobs] == ["SKU0", "SKU1", "SKU2", "SKU3", "SKU4"]
+    assert jobs[0] == ("SKU0", "https://example.com/0", "notebook")
+    assert list(work_list.jobs(batch_size=2)) == []
+    # Nothing was finished, so a restarted pass hands every product out again
+    work_list.restart()
+    assert len(list(work_list.jobs(batch_size=2))) == 5
+
+def test_finish_marks_done_and_failed_products_scanned(db_url):
+    seed_unscanned(db_url, 3)
+    work_list = ScanWorkList(db_url)
+    assert work_list.finish([ScanWorkList.done("SKU0", {"cpu": "Intel Core i7-1355U", "error": False}),
+                             ScanWorkList.failed("SKU1")]) == 2
+    assert work_list.remaining() == 1
+    work_list.restart()
+    assert [sku for sku, url, type in work_list.jobs()] == ["SKU2"]
+    products = stored(db_url)
+    assert (products["SKU0"].scanned, products["SKU0"].error, products["SKU0"].cpu) == (True, False, "Intel Core i7-1355U")
+    assert (products["SKU1"].scanned, products["SKU1"].error) == (True, True)
+
+def test_upsert_inserts_then_overwrites_only_the_given_fields(db_url):
+    manager = ProductManager(db_url)
+    assert manager.upsert_products([dict(sku="A", price=100.0, stock=3, url="https://example.com/a"),
+                                    dict(sku="B", price=200.0, stock=0, url="https://example.com/b")]) == 2
+    manager.update_products([dict(sku="A", cpu="Intel Core i7-1355U", scanned=True)])
+    assert manager.upsert_products([dict(sku="A", price=90.0, stock=5, url="https://example.com/a")]) == 1
+    products = stored(db_url)
+    assert (products["A"].price, products["A"].stock) == (90.0, 5)
+    # Scan results survive a listing upsert
+    assert (products["A"].cpu, products["A"].scanned) == ("Intel Core i7-1355U", True)
+    assert products["B"].price == 200.0
+    assert manager.upsert_products([]) == 0
+
+def test_update_groups_rows_with_different_columns(db_url):
+    seed_unscanned(db_url, 3)
+    manager = ProductManager(db_url)
+    assert manager.update_products([dict(sku="SKU0", ram=16, scanned=True), dict(sku="SKU1", storage=512),
+                                    dict(sku="SKU2", ram=8, scanned=True), dict(sku="MISSING", ram=4)]) == 4
+    products = stored(db_url)
+    assert (products["SKU0"].ram, products["SKU0"].scanned) == (16, True)
+    assert (products["SKU1"].storage, products["SKU1"].ram, products["SKU1"].scanned) == (512, 0, False)
+    assert products["SKU2"].ram == 8
+    # Updates never insert
+    assert "MISSING" not in products
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as file:
+        csv.writer(file).writerows(rows)
+
+def read_csv(path):
+    with open(path, newline="") as file:
+        return list(csv.reader(file))
+
+def test_price_history_round_trips_the_wide_csvs(tmp_path, db_url):
+    write_csv(tmp_path / "prices.csv", [["SKU", "02/01/2024", "01/31/2024"],
+                                        ["A", "$1,099.99", "1000"], ["B", "0", "250"]])
+    write_csv(tmp_path / "stock.csv", [["SKU", "02/01/2024", "01/31/2024"], ["A", "4", "0"], ["B", "0", "2"]])
+    history = PriceHistoryManager(db_url)
+    assert not history.has_history("directdial")
+    # B wasn't listed on 02/01 (no price, no stock), so it gets no row that day
+    assert history.import_wide_csv(tmp_path / "prices.csv", tmp_path / "stock.csv", "directdial") == 3
+    assert history.has_history("directdial")
+    assert history.export_wide_csv(tmp_path / "prices_out.csv", "price", source="directdial") == 2
+    assert read_csv(tmp_path / "prices_out.csv") == [["SKU", "02/01/2024", "01/31/2024"],
+                                                     ["A", "1099.99", "1000"], ["B", "0", "250"]]
+    history.export_wide_csv(tmp_path / "stock_out.csv", "stock", missing="")
+    assert read_csv(tmp_path / "stock_out.csv") == [["SKU", "02/01/2024", "01/31/2024"], ["A", "4", "0"], ["B", "", "2"]]
+
+def test_recording_a_day_again_replaces_its_rows(db_url):
+    history = PriceHistoryManager(db_url)
+    history.record([("A", 100.0, 1)], "cdw", date="2024-02-01")
+    history.record([("A", 95.0, 3)], "cdw", date="2024-02-01")
+    history.record([("A", 120.0, 0)], "directdial", date="2024-02-01")
+    assert history.record([], "cdw") == 0
+    with history.engine.connect() as connection:
+        rows = connection.exec_driver_sql("SELECT source, price, stock FROM price_history ORDER BY source").all()
+    assert [tuple(row) for row in rows] == [("cdw", 95.0, 3), ("directdial", 120.0, 0)]
+
+def test_fresh_pages_are_recent_successful_fetches_of_one_listing(db_url):
+    state = CrawlStateManager(db_url)
+    listing = "https://example.com/listing"
+    state.mark(listing, 1, CrawlStateManager.DONE, item_count=24)
+    state.mark(listing, 2, CrawlStateManager.FAILED)
+    state.mark(listing, 3, CrawlStateManager.DONE, item_count=24)
+    state.mark("https://example.com/other", 4, CrawlStateManager.DONE)
+    with state.engine.begin() as connection:
+        connection.exec_driver_sql('UPDATE crawl_state SET "fetched at" = \'2020-01-01 00:00:00\' WHERE page = 3')
+    assert state.fresh_pages(listing, max_age_hours=12) == {1}
+    # A page fetched again after failing counts once it succeeds
+    state.mark(listing, 2, CrawlStateManager.DONE, item_count=24)
+    assert state.fresh_pages(listing, max_age_hours=12) == {1, 2}
+
+def test_exporter_streams_filtered_rows_in_batches(tmp_path, db_url):
+    ProductManager(db_url).upsert_products([dict(sku=f"SKU{index}", price=float(index), updated=f"01/{index + 1:02d}/2024",
+                                                 scanned=index % 2 == 0) for index in range(7)])
+    exporter = DatabaseExporter(tmp_path / "products.db", batch_size=2)
+    query, params = exporter.build_query("products", ["SKU", "price"], where="scanned = ?", params=(1,),
+                                         updated_since="01/03/2024")
+    connection = sqlite3.connect(tmp_path / "products.db")
+    try:
+        batches = list(exporter.iter_batches(connection.execute(query, params)))
+    finally:
+        connection.close()
+    assert batches == [[("SKU2", 2.0), ("SKU4", 4.0)], [("SKU6", 6.0)]]
+    assert exporter.export_table_to_csv("products", tmp_path / "products.csv", ["SKU", "price"],
+                                        where="scanned = 1", updated_since="01/03/2024") == 3
+    assert read_csv(tmp_path / "products.csv") == [["SKU", "price"], ["SKU2", "2.0"], ["SKU4", "4.0"], ["SKU6", "6.0"]]
@@ -0,0 +1,82 @@
+import sqlite3
+
+import pytest
+
+from database import dispose_all
+from hardware import CPU, GPU, HardwareManager
+from products import Product, ProductManager
+from score import HardwareNameIndex, Score
+
+CPUS = {"Intel Core i7-1355U": 15500.0, "Intel Core i5-1335U": 13800.0, "AMD Ryzen 5 7530U": 16200.0}
+GPUS = {"NVIDIA GeForce RTX 4060 Laptop GPU": 19800.0, "Intel Iris Xe": 2600.0}
+
+# (cpu, gpu, storage, ram, form factor); unknown hardware keeps the stored cpu/gpu score of 7
+PRODUCTS = [
+    ("Intel Core i7-1355U", "Intel Iris Xe", 512, 16, "14"),
+    ("Core i5-1335U", "GeForce RTX 4060 Laptop GPU", 1000, 32, "16"),
+    ("AMD Ryzen 5 7530U", "Integrated", 256, 8, "Tiny"),
+    ("Intel Core i7-1355U", "Integrated", "N/A", "N/A", "SFF"),
+    ("Mystery CPU 9000", "Matrox G200eW", None, None, "N/A"),
+    ("N/A", "N/A", "512GB", "sixteen", None),
+    ("Intel Core i5-1335U", "Intel Iris Xe", 2000, 64, "Mini tower"),
+    ("", "", 128, 4, "all-in-one"),
+]
+
+SCORE_COLUMNS = ("cpu score", "gpu score", "storage score", "ram score", "ff score")
+
+def seed(directory):
+    product_db = f"sqlite:///{directory / 'products.db'}"
+    hardware_db = f"sqlite:///{directory / 'hardware.db'}"
+    hardware_manager = HardwareManager(hardware_db)
+    hardware_manager.sync_hardware(CPU, CPUS)
+    hardware_manager.sync_hardware(GPU, GPUS)
+    session = ProductManager(product_db).get_session()
+    for index, (cpu, gpu, storage, ram, form_factor) in enumerate(PRODUCTS):
+        session.add(Product(sku=f"SKU{index}", cpu=cpu, gpu=gpu, storage=storage, ram=ram, form_factor=form_factor,
+                            cpu_score=7, gpu_score=7, scanned=True))
+    # Unscanned products are never scored
+    session.add(Product(sku="UNSCANNED", cpu="Intel Core i7-1355U", gpu="Intel Iris Xe", scanned=False))
+    session.commit()
+    session.close()
+    return product_db, hardware_db
+
+def scores(directory):
+    connection = sqlite3.connect(directory / "products.db")
+    columns = ", ".join(f'"{column}"' for column in SCORE_COLUMNS)
+    rows = connection.execute(f"SELECT SKU, {columns} FROM products ORDER BY SKU").fetchall()
+    connection.close()
+    return {row[0]: row[1:] for row in rows}
+
+@pytest.fixture(autouse=True)
+def dispose_engines():
+    yield
+    dispose_all()
+
+def test_columnar_scores_match_row_scores(tmp_path):
+    row_directory, columnar_directory = tmp_path / "row", tmp_path / "columnar"
+    row_directory.mkdir()
+    columnar_directory.mkdir()
+    Score(*seed(row_directory)).calculate_scores()
+    assert Score(*seed(columnar_directory)).calculate_scores_columnar() == len(PRODUCTS)
+
+    row_scores, columnar_scores = scores(row_directory), scores(columnar_directory)
+    assert row_scores == columnar_scores
+    # The rows exercise the matched, unmatched and unreadable cases
+    assert row_scores["SKU0"] == (15500, 2600, 512, 16, 0.14)
+    assert row_scores["SKU4"][:4] == (7, 7, 0, 0)
+    assert row_scores["SKU5"] == (7, 7, 0, 0, 0)
+    assert row_scores["UNSCANNED"] == (0, 0, 0, 0, 0)
+
+def test_unreadable_amounts_score_zero():
+    assert Score.amount_score("512GB") == 0
+    assert Score.amount_score(None) == 0
+    assert Score.amount_score("N/A") == 0
+    assert Score.amount_score("16") == 16
+    assert list(Score.amount_scores([512, "bad", None, "N/A", 16])) == [512, 0, 0, 0, 16]
+
+def test_model_numbers_shortlist_the_same_model():
+    index = HardwareNameIndex(["Intel Core i7-1255U @ 1.70GHz", "Intel Core i7-1265U @ 1.80GHz", "AMD Ryzen 5 7530U"])
+    assert index.model_numbers("Core i7 1255U vPro") == {"i7-1255u"}
+    assert index.model_shortlist("Core i7 1255U vPro") == [0]
+    assert index.match("Core i7 1255U vPro")[0] == "Intel Core i7-1255U @ 1.70GHz"
+    assert index.model_shortlist("AMD Ryzen 5 7530U") == []
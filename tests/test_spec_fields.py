@@ -0,0 +1,54 @@
+from benchmarks import SPEC_VALUE_WRAPPERS, soup_rows, spec_pages
+from html_tags import CDW_SPECS, DIRECT_DIAL_SPECS
+from spec_fields import SpecFieldMap
+
+def row_map(config):
+    return SpecFieldMap(dict(config, fields={}), None)
+
+def test_block_markup_inside_a_cdw_value_keeps_the_row():
+    specs_html = ('<div class="panel"><div class="panel-row clearfix"><span class="label">Processor</span>'
+                  '<span><div>Intel</div> Core i7</span></div>'
+                  '<div class="panel-row"><span>RAM</span><span>16 GB</span></div></div>')
+    assert row_map(CDW_SPECS).rows(specs_html) == {"Processor": "IntelCore i7", "RAM": "16 GB"}
+
+def test_nested_value_spans_are_one_cell():
+    specs_html = ('<div class="panel-row"><span class="label">Processor Type</span>'
+                  '<span><span>Core</span> <span>i7</span></span></div>')
+    assert row_map(CDW_SPECS).rows(specs_html) == {"Processor Type": "Corei7"}
+
+def test_script_and_style_in_a_cell_are_not_text():
+    specs_html = ('<table><tr><td>Standard Memory:</td><td>16 GB<script>track("ram");</script>'
+                  '<style>.x { color: red }</style> DDR5</td></tr></table>')
+    field_map = row_map(DIRECT_DIAL_SPECS)
+    assert field_map.rows(specs_html) == {"Standard Memory": "16 GBDDR5"}
+    assert field_map.rows(specs_html) == soup_rows(field_map, "directdial", specs_html)
+
+def test_nested_span_rows_are_read_where_beautifulsoup_skipped_them():
+    specs_html = ('<div class="panel-row"><span class="label">Processor Type</span>'
+                  '<span><span>Core</span> <span>i7</span></span></div>'
+                  '<div class="panel-row"><span>RAM</span><span>16 GB</span></div>')
+    field_map = row_map(CDW_SPECS)
+    assert field_map.rows(specs_html) == {"Processor Type": "Corei7", "RAM": "16 GB"}
+    assert soup_rows(field_map, "cdw", specs_html) == {"RAM": "16 GB"}
+
+def test_directdial_rows_with_markup_in_cells():
+    specs_html = ('<table><tbody><tr><th colspan="2">Model</th></tr>'
+                  '<tr><td><b>Standard Memory</b>:</td><td> <span>16 GB<!-- note --></span> &nbsp;</td></tr>'
+                  '<tr><td>Keyboard Localization:</td><td><a href="#">English &amp; French</a></td></tr>'
+                  '<tr><td>Only one cell</td></tr></tbody></table>')
+    assert row_map(DIRECT_DIAL_SPECS).rows(specs_html) == {"Standard Memory": "16 GB",
+                                                            "Keyboard Localization": "English & French"}
+
+def test_irregular_pages_keep_every_row():
+    # Irregular values can carry trailing link text ("more"), so each must start with the plain value
+    for retailer, config in (("directdial", DIRECT_DIAL_SPECS), ("cdw", CDW_SPECS)):
+        field_map = row_map(config)
+        pages = len(SPEC_VALUE_WRAPPERS)
+        for regular, irregular in zip(spec_pages(pages, retailer), spec_pages(pages, retailer, irregular=True)):
+            expected, parsed = field_map.rows(regular), field_map.rows(irregular)
+            assert parsed.keys() == expected.keys()
+            assert all(parsed[label].startswith(value) for label, value in expected.items())
+
+def test_empty_specs():
+    assert row_map(CDW_SPECS).rows("") == {}
+    assert row_map(DIRECT_DIAL_SPECS).rows("  ") == {}